@@ -0,0 +1,290 @@
+"""
+User lookup for mentions and user tagging.
+
+Active users are indexed in memory under their lowercased username, full
+name and last name, in one sorted list of keys, so a prefix lookup is two
+bisections. Matches are ranked by how often the user has been tagged in
+images, and the top MAX_LIMIT for every one- and two-letter prefix are
+precomputed because those ranges are the widest.
+
+Ahead of that global ranking come the requesting user's own contacts: the
+people they tagged most recently and the people tagged in the same images
+as them. That list is small, so it is filtered by prefix directly; it is
+cached per user for USER_LOOKUP_AFFINITY_TTL seconds and dropped as soon as
+they tag someone.
+
+Like tags.autocomplete, each process rebuilds its index every
+USER_LOOKUP_TTL seconds and applies users saved locally right away. Users
+saved elsewhere (registered, activated by their OTP, renamed, deactivated)
+are picked up within USER_LOOKUP_POLL seconds from their Profile's
+updated_at, which moves on every User save; users deleted elsewhere drop
+out at the next rebuild. Only active users are indexed.
+"""
+import bisect
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, Max
+
+from tags.models import ImageUserTag
+from .models import Profile
+
+# Prefixes up to this length have their results precomputed.
+SHORT_PREFIX = 2
+
+# Most results a lookup returns.
+MAX_LIMIT = 20
+
+# Contacts considered per user, and the recent tags they are drawn from.
+AFFINITY_SIZE = 50
+AFFINITY_WINDOW = 200
+
+# Users whose contacts are cached per process.
+AFFINITY_CACHE_SIZE = 10000
+
+# Each poll goes back this far before the last updated_at it saw, so rows
+# committed late or stamped by a slower clock are not missed. Re-applying
+# an unchanged user is a no-op.
+POLL_OVERLAP = timedelta(seconds=30)
+
+_lock = threading.Lock()
+_index = None
+_affinity = OrderedDict()
+
+
+def _keys(username, first_name, last_name):
+    keys = {username.lower()}
+    full_name = f'{first_name} {last_name}'.strip().lower()
+    if full_name:
+        keys.add(full_name)
+    if last_name.strip():
+        keys.add(last_name.strip().lower())
+    return keys
+
+
+class UserIndex:
+    def __init__(self, rows):
+        """`rows` are (user id, username, first name, last name, times tagged)."""
+        self.users = {}
+        entries = []
+        for user_id, username, first_name, last_name, tagged in rows:
+            self.users[user_id] = (username, f'{first_name} {last_name}'.strip(), tagged)
+            entries.extend((key, user_id) for key in _keys(username, first_name, last_name))
+        entries.sort()
+
+        self.keys = [key for key, _ in entries]
+        self.user_ids = [user_id for _, user_id in entries]
+        self.keys_of = {}
+        for key, user_id in entries:
+            self.keys_of.setdefault(user_id, []).append(key)
+        self.watermark = None
+        self.built_at = self.polled_at = time.monotonic()
+
+        short = {}
+        for key, user_id in entries:
+            for length in range(1, min(len(key), SHORT_PREFIX) + 1):
+                short.setdefault(key[:length], set()).add(user_id)
+        self._short = {
+            prefix: heapq.nsmallest(MAX_LIMIT, user_ids, key=self._rank)
+            for prefix, user_ids in short.items()
+        }
+
+    def _rank(self, user_id):
+        username, _, tagged = self.users[user_id]
+        return -tagged, username
+
+    @classmethod
+    def build(cls):
+        # Read before the users, so a save in between is polled again.
+        watermark = Profile.objects.aggregate(latest=Max('updated_at'))['latest']
+        tagged = dict(
+            ImageUserTag.objects.order_by().values('user').annotate(n=Count('pk')).values_list('user', 'n')
+        )
+        index = cls(
+            (user_id, username, first_name, last_name, tagged.get(user_id, 0))
+            for user_id, username, first_name, last_name in User.objects.filter(
+                is_active=True
+            ).order_by().values_list('pk', 'username', 'first_name', 'last_name')
+        )
+        index.watermark = watermark
+        return index
+
+    def poll(self):
+        """Applies the users saved since the last build or poll."""
+        changed = Profile.objects.order_by('updated_at')
+        if self.watermark is not None:
+            changed = changed.filter(updated_at__gte=self.watermark - POLL_OVERLAP)
+        for row in changed.values_list(
+            'user_id', 'user__username', 'user__first_name', 'user__last_name', 'user__is_active',
+            'updated_at',
+        ):
+            self.update(*row[:5])
+            self.watermark = row[5]
+        self.polled_at = time.monotonic()
+
+    def update(self, user_id, username, first_name, last_name, is_active):
+        """Indexes an active user under their current names, or drops them."""
+        if is_active and self.users.get(user_id, (None, None))[:2] == (
+            username, f'{first_name} {last_name}'.strip()
+        ):
+            return
+        tagged = self.remove(user_id)
+        if is_active:
+            self.add(user_id, username, first_name, last_name, tagged)
+
+    def add(self, user_id, username, first_name, last_name, tagged=0):
+        if user_id in self.users:
+            return
+        self.users[user_id] = (username, f'{first_name} {last_name}'.strip(), tagged)
+        for key in _keys(username, first_name, last_name):
+            position = bisect.bisect_left(self.keys, key)
+            self.keys.insert(position, key)
+            self.user_ids.insert(position, user_id)
+            self.keys_of.setdefault(user_id, []).append(key)
+            for length in range(1, min(len(key), SHORT_PREFIX) + 1):
+                top = self._short.setdefault(key[:length], [])
+                if user_id not in top:
+                    top.append(user_id)
+                    top.sort(key=self._rank)
+                    del top[MAX_LIMIT:]
+
+    def remove(self, user_id):
+        """Drops `user_id` from the index; returns their times tagged."""
+        if user_id not in self.users:
+            return 0
+        keys = self.keys_of.pop(user_id)
+        for key in keys:
+            position = bisect.bisect_left(self.keys, key)
+            while self.user_ids[position] != user_id:
+                position += 1
+            del self.keys[position]
+            del self.user_ids[position]
+        _, _, tagged = self.users.pop(user_id)
+
+        # Refill the precomputed results the user was part of.
+        for prefix in {key[:length] for key in keys for length in range(1, min(len(key), SHORT_PREFIX) + 1)}:
+            if user_id not in self._short.get(prefix, ()):
+                continue
+            start = bisect.bisect_left(self.keys, prefix)
+            end = bisect.bisect_left(self.keys, prefix + '\uffff', start)
+            if start == end:
+                del self._short[prefix]
+            else:
+                self._short[prefix] = heapq.nsmallest(MAX_LIMIT, set(self.user_ids[start:end]), key=self._rank)
+        return tagged
+
+    def matches(self, user_id, prefix):
+        return any(key.startswith(prefix) for key in self.keys_of.get(user_id, ()))
+
+    def lookup(self, prefix, limit, contacts=()):
+        """
+        Up to `limit` user ids with a key starting with `prefix`: matching
+        `contacts` in their order, then everyone else by times tagged.
+        """
+        found = [user_id for user_id in contacts if self.matches(user_id, prefix)][:limit]
+        if len(found) == limit:
+            return found
+
+        wanted = limit + len(found)
+        if len(prefix) <= SHORT_PREFIX:
+            ranked = self._short.get(prefix, [])[:wanted]
+        else:
+            start = bisect.bisect_left(self.keys, prefix)
+            end = bisect.bisect_left(self.keys, prefix + '\uffff', start)
+            ranked = heapq.nsmallest(wanted, set(self.user_ids[start:end]), key=self._rank)
+
+        seen = set(found)
+        found.extend(user_id for user_id in ranked if user_id not in seen)
+        return found[:limit]
+
+
+def get_index():
+    """The process-wide UserIndex, rebuilt or topped up as configured."""
+    global _index
+    with _lock:
+        now = time.monotonic()
+        if _index is None or now - _index.built_at > settings.USER_LOOKUP_TTL:
+            _index = UserIndex.build()
+        elif now - _index.polled_at > settings.USER_LOOKUP_POLL:
+            _index.poll()
+        return _index
+
+
+def contacts(user_id):
+    """
+    Ids of the users `user_id` tagged most recently, then of the users most
+    often tagged alongside them, without duplicates.
+    """
+    now = time.monotonic()
+    with _lock:
+        cached = _affinity.get(user_id)
+        if cached is not None and cached[0] > now:
+            _affinity.move_to_end(user_id)
+            return cached[1]
+
+    recent = ImageUserTag.objects.filter(added_by_id=user_id).exclude(
+        user_id=user_id
+    ).order_by('-added_at').values_list('user_id', flat=True)[:AFFINITY_WINDOW]
+
+    own_images = ImageUserTag.objects.filter(user_id=user_id).order_by(
+        '-added_at'
+    ).values('image_id')[:AFFINITY_WINDOW]
+    co_tagged = ImageUserTag.objects.filter(image_id__in=own_images).exclude(
+        user_id=user_id
+    ).order_by().values('user_id').annotate(n=Count('pk')).order_by('-n').values_list(
+        'user_id', flat=True
+    )[:AFFINITY_SIZE]
+
+    ranking = list(OrderedDict.fromkeys([*recent, *co_tagged]))[:AFFINITY_SIZE]
+
+    with _lock:
+        _affinity[user_id] = (now + settings.USER_LOOKUP_AFFINITY_TTL, ranking)
+        _affinity.move_to_end(user_id)
+        while len(_affinity) > AFFINITY_CACHE_SIZE:
+            _affinity.popitem(last=False)
+    return ranking
+
+
+def search(user, query, limit=10):
+    """
+    [{id, username, name}] for `query`, the requesting `user`'s contacts
+    first. An empty query returns just the contacts.
+    """
+    query = query.strip().lower()
+    limit = max(1, min(limit, MAX_LIMIT))
+    index = get_index()
+    user_contacts = contacts(user.pk)
+
+    with _lock:
+        if query:
+            user_ids = index.lookup(query, limit, user_contacts)
+        else:
+            user_ids = [user_id for user_id in user_contacts if user_id in index.users][:limit]
+        return [
+            {'id': user_id, 'username': index.users[user_id][0], 'name': index.users[user_id][1]}
+            for user_id in user_ids
+        ]
+
+
+def user_saved(user):
+    """Applies a user saved in this process without waiting for the next poll."""
+    with _lock:
+        if _index is not None:
+            _index.update(user.pk, user.username, user.first_name, user.last_name, user.is_active)
+
+
+def user_deleted(user_id):
+    with _lock:
+        if _index is not None:
+            _index.remove(user_id)
+
+
+def tagged_someone(user_id):
+    """Drops the cached contacts of `user_id` after they tag someone."""
+    with _lock:
+        _affinity.pop(user_id, None)
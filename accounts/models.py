@@ -25,6 +25,8 @@ class Profile(models.Model):
 	otp = models.CharField(max_length=6, blank=True, null=True)
 	otp_created_at = models.DateTimeField(blank=True, null=True)
 	created_at = models.DateTimeField(auto_now_add=True)
+	# Saved along with the user on every User save; accounts.lookup polls it.
+	updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 	def is_otp_valid(self):
 		if not self.otp_created_at:
@@ -1,6 +1,9 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from tags.models import ImageUserTag
+from . import lookup
 from .models import Profile
 
 @receiver(post_save, sender=User)
@@ -10,4 +13,20 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+    instance.profile.save()
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, **kwargs):
+    # Every save: users register inactive and are activated (or later
+    # deactivated or renamed) by plain saves.
+    transaction.on_commit(lambda: lookup.user_saved(instance))
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: lookup.user_deleted(user_id))
+
+@receiver(post_save, sender=ImageUserTag)
+def refresh_contacts(sender, instance, created, **kwargs):
+    if created and instance.added_by_id:
+        transaction.on_commit(lambda: lookup.tagged_someone(instance.added_by_id))
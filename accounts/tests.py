@@ -1,3 +1,66 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from . import lookup
+
+
+class UserLookupTests(TestCase):
+    def setUp(self):
+        lookup._index = None
+        lookup._affinity.clear()
+        self.addCleanup(setattr, lookup, '_index', None)
+        self.searcher = User.objects.create_user('searcher', password='x')
+
+    def found(self, query, limit=10):
+        return [row['username'] for row in lookup.search(self.searcher, query, limit)]
+
+    def poll(self):
+        lookup._index.polled_at -= lookup.settings.USER_LOOKUP_POLL + 1
+        lookup.get_index()
+
+    def test_activation_and_deactivation_apply_locally(self):
+        self.found('a')
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user('alice', password='x', is_active=False)
+        self.assertEqual(self.found('ali'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.is_active = True
+            user.save()
+        self.assertEqual(self.found('ali'), ['alice'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.is_active = False
+            user.save()
+        self.assertEqual(self.found('ali'), [])
+        self.assertEqual(self.found('a'), [])
+
+    def test_saves_elsewhere_are_polled(self):
+        user = User.objects.create_user('bob', password='x', is_active=False)
+        self.found('b')
+
+        # on_commit hooks never run here, so as for a save made by another
+        # process, only the poll can see these.
+        user.is_active = True
+        user.first_name, user.last_name = 'Robert', 'Stone'
+        user.save()
+        self.poll()
+        self.assertEqual(self.found('robert s'), ['bob'])
+
+        user.is_active = False
+        user.save()
+        self.poll()
+        self.assertEqual(self.found('sto'), [])
+
+    def test_removal_refills_short_prefixes(self):
+        users = [User.objects.create_user(f'al{n:02}', password='x') for n in range(lookup.MAX_LIMIT + 1)]
+        self.assertEqual(len(self.found('a', lookup.MAX_LIMIT)), lookup.MAX_LIMIT)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            users[0].is_active = False
+            users[0].save()
+
+        found = self.found('a', lookup.MAX_LIMIT)
+        self.assertEqual(len(found), lookup.MAX_LIMIT)
+        self.assertNotIn('al00', found)
+        self.assertIn(f'al{lookup.MAX_LIMIT:02}', found)
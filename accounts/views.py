@@ -2,6 +2,7 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from . import lookup
 from .serializers import RegisterSerializer, VerifyOTPSerializer, OmniportOAuthSerializer
 from django.contrib.auth.models import User
 from rest_framework.pagination import PageNumberPagination
@@ -11,28 +12,12 @@ from django.conf import settings
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def users_search(request):
-    q = request.query_params.get('q', '').strip()
-    if not q:
-        return Response([])
+    try:
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        limit = 10
 
-    users = User.objects.filter(username__icontains=q)[:20]
-    results = [{'id': u.id, 'username': u.username, 'email': u.email} for u in users]
-    return Response(results)
-from django.contrib.auth.models import User
-from rest_framework import status
-
-
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def users_search(request):
-    q = request.query_params.get('q', '')
-    if q:
-        users = User.objects.filter(username__icontains=q)[:20]
-    else:
-        users = User.objects.all()[:20]
-
-    data = [{'id': u.id, 'username': u.username, 'email': u.email} for u in users]
-    return Response(data)
+    return Response(lookup.search(request.user, request.query_params.get('q', ''), limit))
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -29,3 +29,10 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'type': 'notification',
             'notification': notification,
         }))
+
+    # Bulk upload job progress (images.uploads.report)
+    async def upload_progress(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'upload_progress',
+            'progress': event.get('progress'),
+        }))
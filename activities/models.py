@@ -51,4 +51,20 @@ class Notification(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"Notification to {self.user.username}: {self.verb}"
\ No newline at end of file
+        return f"Notification to {self.user.username}: {self.verb}"
+
+class NotificationOutbox(models.Model):
+    # Pending notification written in the same transaction as the action
+    # that caused it; drained into Notification rows by a Celery task.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    verb = models.CharField(max_length=200)
+    image = models.ForeignKey(Image, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    comment = models.ForeignKey('Comment', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Pending notification to {self.user_id}: {self.verb}"
@@ -1,35 +1,85 @@
+import asyncio
+
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from .models import Notification
+from django.db import transaction
+from .models import Notification, NotificationOutbox
+
+# Outbox rows moved into Notification per drain.
+DRAIN_BATCH_SIZE = 500
 
 
 def notify_user(recipient, actor, verb, image=None, comment=None):
-    # Create notification record
-    notif = Notification.objects.create(
+    # Only records the notification in the outbox. It joins the caller's
+    # transaction, so it is dropped if the action rolls back, and it is
+    # delivered by drain_notification_outbox once the transaction commits.
+    entry = NotificationOutbox.objects.create(
         user=recipient,
         actor=actor,
         verb=verb,
         image=image,
         comment=comment,
     )
+    transaction.on_commit(_schedule_drain)
+    return entry
 
-    # Broadcast over channels to recipient group
-    channel_layer = get_channel_layer()
-    payload = {
-        'id': notif.id,
-        'actor': str(actor) if actor else None,
-        'verb': verb,
-        'image_id': image.id if image else None,
-        'comment_id': comment.id if comment else None,
-        'unread': notif.unread,
-        'created_at': notif.created_at.isoformat(),
-    }
-    async_to_sync(channel_layer.group_send)(
-        f'user_{recipient.id}',
-        {
+
+def _schedule_drain():
+    from .tasks import drain_notification_outbox
+
+    try:
+        drain_notification_outbox.delay()
+    except Exception:
+        # The periodic drain picks the rows up if the broker is unavailable.
+        pass
+
+
+def drain_outbox(batch_size=DRAIN_BATCH_SIZE):
+    """Moves one batch of outbox rows into Notification and pushes them."""
+    with transaction.atomic():
+        # actor is nullable, so select_related joins it with a LEFT OUTER
+        # JOIN; only the outbox rows are locked, which PostgreSQL requires.
+        pending = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('actor')[:batch_size]
+        )
+        if not pending:
+            return 0
+
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                user_id=entry.user_id,
+                actor=entry.actor,
+                verb=entry.verb,
+                image_id=entry.image_id,
+                comment_id=entry.comment_id,
+            )
+            for entry in pending
+        ])
+        NotificationOutbox.objects.filter(pk__in=[entry.pk for entry in pending]).delete()
+
+    messages = [
+        (f'user_{notif.user_id}', {
             'type': 'notify',
-            'notification': payload,
-        }
-    )
+            'notification': {
+                'id': notif.id,
+                'actor': str(notif.actor) if notif.actor else None,
+                'verb': notif.verb,
+                'image_id': notif.image_id,
+                'comment_id': notif.comment_id,
+                'unread': notif.unread,
+                'created_at': notif.created_at.isoformat(),
+            },
+        })
+        for notif in notifications
+    ]
+    async_to_sync(_broadcast)(messages)
 
-    return notif
+    return len(notifications)
+
+
+async def _broadcast(messages):
+    channel_layer = get_channel_layer()
+    await asyncio.gather(*(
+        channel_layer.group_send(group, message) for group, message in messages
+    ))
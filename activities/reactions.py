@@ -0,0 +1,109 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from images.models import Image
+from .models import Reaction
+
+# Image column kept in step with the number of reactions of each type.
+COUNTER_FIELDS = {
+    'LIKE': 'like_count',
+}
+
+_TOGGLE_SQL = """
+WITH deleted AS (
+    DELETE FROM {reaction}
+    WHERE user_id = %s AND image_id = %s AND reaction_type = %s
+    RETURNING 1
+), inserted AS (
+    INSERT INTO {reaction} (user_id, image_id, reaction_type, created_at)
+    SELECT %s, %s, %s, %s
+    WHERE NOT EXISTS (SELECT 1 FROM deleted)
+    ON CONFLICT (user_id, image_id, reaction_type) DO NOTHING
+    RETURNING 1
+){counter_cte}
+SELECT
+    (SELECT count(*) FROM deleted),
+    {counter_select}
+"""
+
+_COUNTER_CTE = """, updated AS (
+    UPDATE {image}
+    SET {field} = {field} + (SELECT count(*) FROM inserted) - (SELECT count(*) FROM deleted)
+    WHERE id = %s
+    RETURNING {field}
+)"""
+
+
+def toggle_reaction(user, image, reaction_type):
+    """
+    Adds the reaction if the user has not made it yet, otherwise removes it.
+
+    Returns (active, count) where `active` is whether the reaction exists
+    afterwards and `count` is the image's updated counter for that reaction
+    type (None for types without a counter). The unique_together constraint
+    on Reaction arbitrates concurrent toggles, so the counter always moves
+    in step with the rows.
+    """
+    if connection.vendor == 'postgresql':
+        return _toggle_postgresql(user, image, reaction_type)
+    return _toggle_orm(user, image, reaction_type)
+
+
+def _toggle_postgresql(user, image, reaction_type):
+    field = COUNTER_FIELDS.get(reaction_type)
+    params = [
+        user.pk, image.pk, reaction_type,
+        user.pk, image.pk, reaction_type, timezone.now(),
+    ]
+
+    if field:
+        counter_cte = _COUNTER_CTE.format(image=Image._meta.db_table, field=field)
+        counter_select = f'(SELECT {field} FROM updated)'
+        params.append(image.pk)
+    else:
+        counter_cte = ''
+        counter_select = 'NULL'
+
+    sql = _TOGGLE_SQL.format(
+        reaction=Reaction._meta.db_table,
+        counter_cte=counter_cte,
+        counter_select=counter_select,
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        deleted, count = cursor.fetchone()
+
+    return not deleted, count
+
+
+def _toggle_orm(user, image, reaction_type):
+    field = COUNTER_FIELDS.get(reaction_type)
+
+    with transaction.atomic():
+        deleted, _ = Reaction.objects.filter(
+            user=user,
+            image=image,
+            reaction_type=reaction_type
+        ).delete()
+
+        if deleted:
+            delta = -1
+        else:
+            try:
+                with transaction.atomic():
+                    Reaction.objects.create(user=user, image=image, reaction_type=reaction_type)
+                delta = 1
+            except IntegrityError:
+                # A concurrent toggle created it first.
+                delta = 0
+
+        if not field:
+            return not deleted, None
+
+        if delta:
+            Image.objects.filter(pk=image.pk).update(**{field: F(field) + delta})
+        count = Image.objects.filter(pk=image.pk).values_list(field, flat=True).first()
+
+    return not deleted, count
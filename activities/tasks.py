@@ -0,0 +1,13 @@
+from celery import shared_task
+
+from .notifications import drain_outbox
+
+
+@shared_task
+def drain_notification_outbox():
+    total = 0
+    while True:
+        drained = drain_outbox()
+        total += drained
+        if not drained:
+            return total
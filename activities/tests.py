@@ -1,3 +1,97 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from events.models import Event
+from images.models import Image
+from .models import Notification, NotificationOutbox, Reaction
+from .notifications import drain_outbox
+from .reactions import toggle_reaction
+
+
+class DrainOutboxTests(TestCase):
+    def setUp(self):
+        self.recipient = User.objects.create_user('recipient', password='x')
+
+    def test_drains_row_without_actor(self):
+        NotificationOutbox.objects.create(user=self.recipient, actor=None, verb='was mentioned')
+
+        self.assertEqual(drain_outbox(), 1)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.user, self.recipient)
+        self.assertIsNone(notification.actor)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_drains_row_with_actor(self):
+        actor = User.objects.create_user('actor', password='x')
+        NotificationOutbox.objects.create(user=self.recipient, actor=actor, verb='liked your image')
+
+        self.assertEqual(drain_outbox(), 1)
+        self.assertEqual(Notification.objects.get().actor, actor)
+
+
+class ToggleReactionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('viewer', password='x')
+        event = Event.objects.create(
+            name='Convocation', start_date=timezone.now(), end_date=timezone.now(), created_by=self.user,
+        )
+        self.image = Image.objects.create(event=event, original_image='images/original/a.jpg')
+
+    def test_like_toggles_on_and_off(self):
+        self.assertEqual(toggle_reaction(self.user, self.image, 'LIKE'), (True, 1))
+        self.assertEqual(toggle_reaction(self.user, self.image, 'LIKE'), (False, 0))
+        self.assertFalse(Reaction.objects.exists())
+
+    def test_favorite_has_no_counter(self):
+        self.assertEqual(toggle_reaction(self.user, self.image, 'FAVORITE'), (True, None))
+        self.assertTrue(Reaction.objects.filter(reaction_type='FAVORITE').exists())
+
+
+class ConcurrentToggleTests(TransactionTestCase):
+    users = 6
+    taps = 3
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("SQLite's shared in-memory test database rejects concurrent writers")
+        owner = User.objects.create_user('owner', password='x')
+        event = Event.objects.create(
+            name='Convocation', start_date=timezone.now(), end_date=timezone.now(), created_by=owner,
+        )
+        self.image = Image.objects.create(event=event, original_image='images/original/a.jpg')
+        self.people = [User.objects.create_user(f'person{n}', password='x') for n in range(self.users)]
+
+    def test_parallel_toggles_keep_like_count_in_step(self):
+        start = threading.Barrier(self.users * self.taps)
+        errors = []
+
+        def tap(user):
+            try:
+                start.wait()
+                toggle_reaction(user, self.image, 'LIKE')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=tap, args=(user,))
+            for user in self.people
+            for _ in range(self.taps)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.image.refresh_from_db()
+        self.assertEqual(
+            self.image.like_count,
+            Reaction.objects.filter(image=self.image, reaction_type='LIKE').count(),
+        )
@@ -214,6 +214,99 @@ CELERY_TASK_SERIALIZER = os.getenv('CELERY_TASK_SERIALIZER', 'json')
 CELERY_RESULT_SERIALIZER = os.getenv('CELERY_RESULT_SERIALIZER', 'json')
 CELERY_TIMEZONE = os.getenv('CELERY_TIMEZONE', 'UTC')
 
+# Image view/download counters are buffered in Redis and flushed in batches.
+IMAGE_COUNTER_REDIS_URL = os.getenv('IMAGE_COUNTER_REDIS_URL', CELERY_BROKER_URL)
+IMAGE_COUNTER_FLUSH_INTERVAL = float(os.getenv('IMAGE_COUNTER_FLUSH_INTERVAL', '10'))
+
+# Auto-tagging collects uploads for up to AUTO_TAG_BATCH_WINDOW seconds and
+# runs them through the model in batches of at most AUTO_TAG_BATCH_SIZE.
+AUTO_TAG_REDIS_URL = os.getenv('AUTO_TAG_REDIS_URL', CELERY_BROKER_URL)
+AUTO_TAG_BATCH_SIZE = int(os.getenv('AUTO_TAG_BATCH_SIZE', '16'))
+AUTO_TAG_BATCH_WINDOW = float(os.getenv('AUTO_TAG_BATCH_WINDOW', '2'))
+AUTO_TAG_PREPROCESS_THREADS = int(os.getenv('AUTO_TAG_PREPROCESS_THREADS', '4'))
+# One of images.ml.resnet.BACKENDS: eager, torchscript, int8-static
+AUTO_TAG_BACKEND = os.getenv('AUTO_TAG_BACKEND', 'eager')
+
+# Optional per-host inference server (`manage.py run_tagger_server`). Workers
+# use it whenever the socket exists and fall back to in-process inference.
+AUTO_TAG_SOCKET = os.getenv('AUTO_TAG_SOCKET', '/tmp/clixary-tagger.sock')
+AUTO_TAG_SERVER_TIMEOUT = float(os.getenv('AUTO_TAG_SERVER_TIMEOUT', '60'))
+
+# Auto-tagger embeddings for "similar images" (images.ml.embeddings). Above
+# EMBEDDING_IVF_THRESHOLD images, searches only scan the EMBEDDING_IVF_NPROBE
+# nearest clusters instead of every vector.
+EMBEDDING_STORE_DIR = os.getenv('EMBEDDING_STORE_DIR', str(BASE_DIR / 'embeddings'))
+EMBEDDING_IVF_THRESHOLD = int(os.getenv('EMBEDDING_IVF_THRESHOLD', '50000'))
+EMBEDDING_IVF_NPROBE = int(os.getenv('EMBEDDING_IVF_NPROBE', '16'))
+# How often the beat task checks whether the IVF index needs rebuilding.
+EMBEDDING_IVF_REBUILD_INTERVAL = float(os.getenv('EMBEDDING_IVF_REBUILD_INTERVAL', '600'))
+
+# Multi-tag image filters can intersect in-memory posting lists for the
+# TAG_INDEX_HOT_TAGS most used tags (0 disables it), rebuilt every
+# TAG_INDEX_TTL seconds. Intersections larger than TAG_INDEX_MAX_IDS images
+# are left to the database.
+TAG_INDEX_HOT_TAGS = int(os.getenv('TAG_INDEX_HOT_TAGS', '0'))
+TAG_INDEX_TTL = int(os.getenv('TAG_INDEX_TTL', '300'))
+TAG_INDEX_MAX_IDS = int(os.getenv('TAG_INDEX_MAX_IDS', '20000'))
+
+# Popular-tag leaderboards (global and per event) are Redis sorted sets
+# updated by deltas and reseeded from the database every
+# TAG_LEADERBOARD_TTL seconds.
+TAG_LEADERBOARD_REDIS_URL = os.getenv('TAG_LEADERBOARD_REDIS_URL', CELERY_BROKER_URL)
+TAG_LEADERBOARD_TTL = int(os.getenv('TAG_LEADERBOARD_TTL', str(24 * 3600)))
+
+# Tag autocomplete serves from a per-process prefix index, rebuilt with
+# fresh usage counts every TAG_AUTOCOMPLETE_TTL seconds; tags created by
+# other processes show up within TAG_AUTOCOMPLETE_POLL seconds.
+TAG_AUTOCOMPLETE_TTL = int(os.getenv('TAG_AUTOCOMPLETE_TTL', '600'))
+TAG_AUTOCOMPLETE_POLL = float(os.getenv('TAG_AUTOCOMPLETE_POLL', '5'))
+
+# User search (/api/auth/users/) serves from a per-process prefix index,
+# rebuilt every USER_LOOKUP_TTL seconds and topped up with users saved
+# elsewhere every USER_LOOKUP_POLL seconds. Each user's recent and co-tagged
+# contacts, which rank first, are cached for USER_LOOKUP_AFFINITY_TTL seconds.
+USER_LOOKUP_TTL = int(os.getenv('USER_LOOKUP_TTL', '600'))
+USER_LOOKUP_POLL = float(os.getenv('USER_LOOKUP_POLL', '5'))
+USER_LOOKUP_AFFINITY_TTL = int(os.getenv('USER_LOOKUP_AFFINITY_TTL', '60'))
+
+# Uploads whose perceptual hash is within DUPLICATE_HASH_RADIUS bits (of 64)
+# of an earlier image in the same event are marked as its duplicates.
+# DUPLICATE_PROCESSING picks what happens to them: 'process' (everything),
+# 'skip' (thumbnail and EXIF only) or 'defer' (watermark and auto-tags run
+# DUPLICATE_DEFER_SECONDS later). Uploads can override it per request.
+DUPLICATE_HASH_RADIUS = int(os.getenv('DUPLICATE_HASH_RADIUS', '6'))
+DUPLICATE_PROCESSING = os.getenv('DUPLICATE_PROCESSING', 'process')
+DUPLICATE_DEFER_SECONDS = int(os.getenv('DUPLICATE_DEFER_SECONDS', '600'))
+
+# Resumable uploads (/api/uploads/) keep partial files here until they are
+# finalized; sessions untouched for UPLOAD_SESSION_TTL seconds are removed.
+UPLOAD_SESSION_DIR = os.getenv('UPLOAD_SESSION_DIR', str(MEDIA_ROOT / 'uploads' / 'partial'))
+# Files of asynchronous bulk uploads wait here until a worker ingests them.
+UPLOAD_JOB_DIR = os.getenv('UPLOAD_JOB_DIR', str(MEDIA_ROOT / 'uploads' / 'jobs'))
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', str(2 * 1024 ** 3)))
+UPLOAD_CHUNK_MAX_SIZE = int(os.getenv('UPLOAD_CHUNK_MAX_SIZE', str(16 * 1024 ** 2)))
+UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', str(24 * 3600)))
+
+CELERY_BEAT_SCHEDULE = {
+    'flush-image-counters': {
+        'task': 'images.tasks.flush_image_counters',
+        'schedule': IMAGE_COUNTER_FLUSH_INTERVAL,
+    },
+    # Safety net for outbox rows whose on-commit drain was never queued.
+    'drain-notification-outbox': {
+        'task': 'activities.tasks.drain_notification_outbox',
+        'schedule': 30.0,
+    },
+    'expire-upload-sessions': {
+        'task': 'images.tasks.expire_upload_sessions',
+        'schedule': 3600.0,
+    },
+    'rebuild-similarity-index': {
+        'task': 'images.tasks.rebuild_similarity_index',
+        'schedule': EMBEDDING_IVF_REBUILD_INTERVAL,
+    },
+}
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -221,8 +314,20 @@ CORS_ALLOWED_ORIGINS = [
 
 ASGI_APPLICATION = 'core.asgi.application'
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+# Notifications are pushed from Celery workers, so anything beyond a single
+# dev process needs a shared (Redis) channel layer.
+CHANNEL_LAYER_REDIS_URL = os.getenv('CHANNEL_LAYER_REDIS_URL')
+
+if CHANNEL_LAYER_REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [CHANNEL_LAYER_REDIS_URL]},
+        }
     }
-}
\ No newline at end of file
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        }
+    }
\ No newline at end of file
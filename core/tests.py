@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+_CHECK_IMPORTS = """
+import sys
+import django
+django.setup()
+import core.urls
+print(','.join(sorted(name for name in ('torch', 'torchvision') if name in sys.modules)))
+"""
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_urlconf_does_not_import_torch(self):
+        # In a fresh interpreter: this one may have imported torch already.
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        result = subprocess.run(
+            [sys.executable, '-c', _CHECK_IMPORTS],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '', "Loading the URLconf imported " + result.stdout.strip())
@@ -22,7 +22,7 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 from events.views import EventViewSet
-from images.views import ImageViewSet
+from images.views import ImageViewSet, UploadJobViewSet, UploadSessionViewSet
 from activities.views import CommentViewSet
 from activities.views import NotificationViewSet
 from django.conf import settings
@@ -31,6 +31,8 @@ from django.conf.urls.static import static
 router = DefaultRouter();
 router.register(r'events', EventViewSet)
 router.register(r'images', ImageViewSet)
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
+router.register(r'upload-jobs', UploadJobViewSet, basename='upload-job')
 router.register(r'comments', CommentViewSet)
 router.register(r'notifications', NotificationViewSet, basename='notification')
 
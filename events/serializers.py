@@ -1,33 +1,100 @@
 from rest_framework import serializers
 from .models import Event, Album
 
+
+class EventListSerializer(serializers.ListSerializer):
+	def to_representation(self, data):
+		from django.db import models
+
+		iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+		events = list(iterable)
+		self.child.load_previews(events)
+		return super().to_representation(events)
+
+
 class EventSerializer(serializers.ModelSerializer):
-	images = serializers.SerializerMethodField()
+	# Events only carry a summary of their gallery; the images themselves are
+	# paged through `events/{id}/images/`.
+	image_count = serializers.SerializerMethodField()
+	cover_thumbnail = serializers.SerializerMethodField()
+	preview_images = serializers.SerializerMethodField()
+
+	preview_size = 4
+
 	class Meta:
 		model = Event
 		fields = "__all__"
 		read_only_fields = ["created_at", "created_by"]
+		list_serializer_class = EventListSerializer
+
+	def load_previews(self, events):
+		# Fetches the newest `preview_size` thumbnails of every event on the
+		# page in one windowed query. Cached by event id in the shared context.
+		from django.db.models import F, Window
+		from django.db.models.functions import RowNumber
+		from images.models import Image
+
+		previews = self.context.setdefault('event_previews', {})
+		missing = [event.pk for event in events if event.pk not in previews]
+		if not missing:
+			return previews
+
+		for event_id in missing:
+			previews[event_id] = []
+
+		request = self.context.get('request')
+		user = request.user if request else None
+
+		rows = Image.objects.visible_to(user).filter(
+			event_id__in=missing,
+			thumbnail__isnull=False,
+		).exclude(thumbnail='').annotate(
+			position=Window(
+				RowNumber(),
+				partition_by=F('event_id'),
+				order_by=[F('uploaded_at').desc(), F('id').desc()],
+			)
+		).filter(position__lte=self.preview_size).order_by('event_id', 'position').values_list(
+			'event_id', 'id', 'thumbnail'
+		)
 
-	def get_images(self, obj):
-	    from images.models import Image
-	    from images.serializers import ImageSerializer
-	    from django.db.models import Q
-
-	    request = self.context.get('request')
-	    
-	    query = Q(privacy='PUBLIC', is_deleted=False)
-	    
-	    if request and request.user.is_authenticated:
-	        query |= Q(uploaded_by=request.user, is_deleted=False)
-	    
-	    images = Image.objects.filter(
-	        event=obj
-	    ).filter(query).order_by('-uploaded_at')
-	    
-	    return ImageSerializer(images, many=True, context=self.context).data
+		for event_id, image_id, thumbnail in rows:
+			previews[event_id].append({
+				'id': image_id,
+				'thumbnail': self.build_media_url(thumbnail),
+			})
+
+		return previews
+
+	def build_media_url(self, name):
+		from django.core.files.storage import default_storage
+
+		url = default_storage.url(name)
+		request = self.context.get('request')
+		return request.build_absolute_uri(url) if request else url
+
+	def get_image_count(self, obj):
+		if hasattr(obj, 'image_count'):
+			return obj.image_count
+
+		from images.models import Image
+
+		request = self.context.get('request')
+		user = request.user if request else None
+		return Image.objects.visible_to(user).filter(event=obj).count()
+
+	def get_preview_images(self, obj):
+		return self.load_previews([obj]).get(obj.pk, [])
+
+	def get_cover_thumbnail(self, obj):
+		if obj.cover_photo:
+			return self.build_media_url(obj.cover_photo.name)
+
+		previews = self.get_preview_images(obj)
+		return previews[0]['thumbnail'] if previews else None
 
 class AlbumSerializer(serializers.ModelSerializer):
 	class Meta:
 		model = Album
 		fields = "__all__"
-		read_only_fields = ["created_at", "created_by"]
\ No newline at end of file
+		read_only_fields = ["created_at", "created_by"]
@@ -1,3 +1,127 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from images.models import Image
+from .models import Event
+
+
+class DuplicateGroupsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', password='x')
+        cls.event = Event.objects.create(
+            name='Convocation',
+            start_date=timezone.now(),
+            end_date=timezone.now(),
+            created_by=cls.user,
+        )
+        # Three pairs of identical hashes, far apart from each other.
+        for phash in (0, 0, 0xFFFF, 0xFFFF, 0xFFFF << 32, 0xFFFF << 32):
+            Image.objects.create(
+                event=cls.event, original_image='images/original/x.jpg', privacy='PUBLIC',
+                uploaded_by=cls.user, phash=phash,
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_groups_are_paginated(self):
+        url = f'/api/events/{self.event.pk}/duplicates/?page_size=2'
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([group['count'] for group in response.data['results']], [2, 2])
+        self.assertIn('radius', response.data)
+
+        response = self.client.get(response.data['next'])
+        self.assertIsNone(response.data['next'])
+        group, = response.data['results']
+        self.assertEqual(
+            {image['id'] for image in group['images']},
+            set(Image.objects.filter(phash=0xFFFF << 32).values_list('pk', flat=True)),
+        )
+
+
+class EventGalleryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', password='x')
+        cls.stranger = User.objects.create_user('stranger', password='x')
+        owner = User.objects.create_user('owner', password='x')
+        cls.event = Event.objects.create(
+            name='Convocation',
+            start_date=timezone.now(),
+            end_date=timezone.now(),
+            created_by=owner,
+        )
+        # Oldest first: four public images, then one deleted, one private to
+        # its owner and one private to the viewer.
+        fields = [
+            {}, {}, {}, {},
+            {'is_deleted': True},
+            {'privacy': 'PRIVATE'},
+            {'privacy': 'PRIVATE', 'uploaded_by': cls.user},
+        ]
+        start = timezone.now() - timedelta(hours=1)
+        cls.images = []
+        for n, extra in enumerate(fields):
+            image = Image.objects.create(**{
+                'event': cls.event,
+                'original_image': f'images/original/{n}.jpg',
+                'thumbnail': f'images/thumbnails/{n}.jpg',
+                'privacy': 'PUBLIC',
+                'uploaded_by': owner,
+                **extra,
+            })
+            Image.objects.filter(pk=image.pk).update(uploaded_at=start + timedelta(minutes=n))
+            cls.images.append(image)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def summary(self, user):
+        self.client.force_authenticate(user)
+        listed, = self.client.get('/api/events/').data['results']
+        detail = self.client.get(f'/api/events/{self.event.pk}/').data
+        self.assertEqual(listed, detail)
+        return detail
+
+    def ids(self, *positions):
+        return [self.images[n].pk for n in positions]
+
+    def test_summary_counts_and_previews_only_visible_images(self):
+        summary = self.summary(self.user)
+        self.assertEqual(summary['image_count'], 5)
+        self.assertEqual([image['id'] for image in summary['preview_images']], self.ids(6, 3, 2, 1))
+        self.assertTrue(summary['cover_thumbnail'].endswith('/images/thumbnails/6.jpg'))
+
+        summary = self.summary(self.stranger)
+        self.assertEqual(summary['image_count'], 4)
+        self.assertEqual([image['id'] for image in summary['preview_images']], self.ids(3, 2, 1, 0))
+        self.assertTrue(summary['cover_thumbnail'].endswith('/images/thumbnails/3.jpg'))
+
+    def test_images_are_cursor_paginated_newest_first(self):
+        self.client.force_authenticate(self.user)
+        url, seen = f'/api/events/{self.event.pk}/images/?page_size=2', []
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertLessEqual(len(response.data['results']), 2)
+                seen.extend(image['id'] for image in response.data['results'])
+                url = response.data['next']
+
+        self.assertEqual(seen, self.ids(6, 3, 2, 1, 0))
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
 
-# Create your tests here.
+        self.client.force_authenticate(self.stranger)
+        response = self.client.get(f'/api/events/{self.event.pk}/images/?page_size=10')
+        self.assertEqual([image['id'] for image in response.data['results']], self.ids(3, 2, 1, 0))
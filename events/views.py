@@ -1,5 +1,10 @@
+from django.conf import settings
 from django.shortcuts import render
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from .serializers import EventSerializer, AlbumSerializer
 from .models import Event, Album
 from .permissions import CanManageEvent, CanModifyEvent
@@ -17,9 +22,71 @@ class EventViewSet(viewsets.ModelViewSet):
 		else:
 			return [permissions.IsAuthenticated()]
 
+	def get_queryset(self):
+		from images.models import Image
+
+		visible_counts = Image.objects.visible_to(self.request.user).filter(
+			event=OuterRef('pk')
+		).order_by().values('event').annotate(c=Count('pk')).values('c')
+
+		return super().get_queryset().annotate(
+			image_count=Coalesce(Subquery(visible_counts), 0)
+		)
+
 	def perform_create(self, serializer):
 		serializer.save(created_by=self.request.user)
 
+	@action(detail=True, methods=['get'])
+	def images(self, request, pk=None):
+		from images.models import Image
+		from images.pagination import EventImageCursorPagination
+		from images.serializers import ImageSerializer
+
+		event = self.get_object()
+		images = ImageSerializer.setup_eager_loading(
+			Image.objects.visible_to(request.user).filter(event=event)
+		)
+
+		paginator = EventImageCursorPagination()
+		page = paginator.paginate_queryset(images, request, view=self)
+		serializer = ImageSerializer(page, many=True, context=self.get_serializer_context())
+		return paginator.get_paginated_response(serializer.data)
+
+	@action(detail=True, methods=['get'])
+	def duplicates(self, request, pk=None):
+		from images import duplicates
+		from images.models import Image
+		from images.pagination import DuplicateGroupPagination
+		from images.serializers import ImageSerializer
+
+		event = self.get_object()
+		try:
+			radius = max(0, min(int(request.query_params.get('radius', settings.DUPLICATE_HASH_RADIUS)), 16))
+		except ValueError:
+			radius = settings.DUPLICATE_HASH_RADIUS
+
+		visible = Image.objects.visible_to(request.user).filter(event=event, phash__isnull=False)
+		groups = duplicates.group(visible.values_list('id', 'phash'), radius=radius)
+
+		paginator = DuplicateGroupPagination()
+		page = paginator.paginate_queryset(groups, request, view=self)
+		images = ImageSerializer.setup_eager_loading(
+			Image.objects.filter(pk__in=[image_id for ids in page for image_id in ids])
+		).in_bulk()
+		serializer = ImageSerializer(
+			[images[image_id] for ids in page for image_id in ids],
+			many=True,
+			context=self.get_serializer_context(),
+		)
+
+		data, offset = [], 0
+		for ids in page:
+			data.append({'count': len(ids), 'images': serializer.data[offset:offset + len(ids)]})
+			offset += len(ids)
+		response = paginator.get_paginated_response(data)
+		response.data['radius'] = radius
+		return response
+
 class AlbumViewSet(viewsets.ModelViewSet):
 	queryset = Album.objects.all()
 	serializer_class = AlbumSerializer
@@ -11,7 +11,7 @@ import {
   CircularProgress,
   Alert,
   Chip,
-  Pagination,
+  Button,
 } from '@mui/material';
 import { CameraAlt, Visibility, ThumbUp } from '@mui/icons-material';
 import { imagesService } from '../services/images';
@@ -23,35 +23,20 @@ const BrowseImagesPage: React.FC = () => {
   const [images, setImages] = useState<Image[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
-  const [currentPage, setCurrentPage] = useState(1);
-  const [totalPages, setTotalPages] = useState(0);
-  const [totalCount, setTotalCount] = useState(0);
+  const [nextUrl, setNextUrl] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [filters, setFilters] = useState<SearchFilters>({});
 
   useEffect(() => {
-    loadImages({}, 1);
+    loadImages({});
   }, []);
 
-  const loadImages = async (filterParams: SearchFilters, page: number = 1) => {
+  const loadImages = async (filterParams: SearchFilters) => {
     try {
       setLoading(true);
-      const response = await imagesService.getAll({ ...filterParams, page });
-      
-      if (response && response.results && Array.isArray(response.results)) {
-        setImages(response.results);
-        setTotalCount(response.count || 0);
-        setTotalPages(Math.ceil((response.count || 0) / 20));
-        setCurrentPage(page);
-      } else if (Array.isArray(response)) {
-        setImages(response);
-        setTotalCount(response.length);
-        setTotalPages(1);
-        setCurrentPage(1);
-      } else {
-        setImages([]);
-        setTotalCount(0);
-        setTotalPages(0);
-      }
+      const response = await imagesService.getAll(filterParams);
+      setImages(response.results || []);
+      setNextUrl(response.next);
     } catch (err: any) {
       setError('Failed to load images');
     } finally {
@@ -59,14 +44,23 @@ const BrowseImagesPage: React.FC = () => {
     }
   };
 
-  const handleSearch = (newFilters: SearchFilters) => {
-    setFilters(newFilters);
-    setCurrentPage(1);
-    loadImages(newFilters, 1);
+  const loadMore = async () => {
+    if (!nextUrl) return;
+    try {
+      setLoadingMore(true);
+      const response = await imagesService.getAll(filters, nextUrl);
+      setImages((prev) => [...prev, ...response.results]);
+      setNextUrl(response.next);
+    } catch (err: any) {
+      setError('Failed to load images');
+    } finally {
+      setLoadingMore(false);
+    }
   };
 
-  const handlePageChange = (event: React.ChangeEvent<unknown>, page: number) => {
-    loadImages(filters, page);
+  const handleSearch = (newFilters: SearchFilters) => {
+    setFilters(newFilters);
+    loadImages(newFilters);
   };
 
   return (
@@ -92,7 +86,7 @@ const BrowseImagesPage: React.FC = () => {
       ) : (
         <>
           <Typography variant="body1" color="text.secondary" gutterBottom>
-            {totalCount} {totalCount === 1 ? 'photo' : 'photos'} found
+            Showing {images.length} {images.length === 1 ? 'photo' : 'photos'}
           </Typography>
 
           <Grid container spacing={2} sx={{ mt: 2 }}>
@@ -147,14 +141,11 @@ const BrowseImagesPage: React.FC = () => {
             ))}
           </Grid>
 
-          {totalPages > 1 && (
+          {nextUrl && (
             <Box display="flex" justifyContent="center" mt={4} mb={2}>
-              <Pagination
-                count={totalPages}
-                page={currentPage}
-                onChange={handlePageChange}
-                color="primary"
-              />
+              <Button variant="outlined" onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </Button>
             </Box>
           )}
         </>
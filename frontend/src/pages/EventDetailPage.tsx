@@ -12,7 +12,6 @@ import {
   CardMedia,
   Chip,
   ButtonGroup,
-  Pagination,
 } from '@mui/material';
 import { ArrowBack, CalendarToday, CameraAlt, CloudUpload } from '@mui/icons-material';
 import { useAppDispatch, useAppSelector } from '../store/hooks';
@@ -30,9 +29,8 @@ const EventDetailPage: React.FC = () => {
 
   const [displayedImages, setDisplayedImages] = useState<Image[]>([]);
   const [loadingImages, setLoadingImages] = useState(false);
-  const [currentPage, setCurrentPage] = useState(1);
-  const [totalPages, setTotalPages] = useState(0);
-  const [totalCount, setTotalCount] = useState(0);
+  const [nextUrl, setNextUrl] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [filters, setFilters] = useState<SearchFilters>({});
   
   const [viewMode, setViewMode] = useState<'grid' | 'cards'>(() => {
@@ -78,7 +76,7 @@ const EventDetailPage: React.FC = () => {
 
   useEffect(() => {
     if (currentEvent && id) {
-      loadEventImages(filters, 1);
+      loadEventImages(filters);
     }
   }, [currentEvent, id]);
 
@@ -105,7 +103,7 @@ const EventDetailPage: React.FC = () => {
     } catch (e) {}
   }, [viewMode, cardIndex, id]);
 
-  const loadEventImages = async (filterParams: SearchFilters, page: number = 1) => {
+  const loadEventImages = async (filterParams: SearchFilters) => {
     if (!id) return;
     
     setLoadingImages(true);
@@ -113,22 +111,10 @@ const EventDetailPage: React.FC = () => {
       const params = {
         ...filterParams,
         event: id,
-        page,
       };
       const response = await imagesService.getAll(params);
-      
-
-      if (response && response.results && Array.isArray(response.results)) {
-        setDisplayedImages(response.results);
-        setTotalCount(response.count || 0);
-        setTotalPages(Math.ceil((response.count || 0) / 20));
-        setCurrentPage(page);
-      } else if (Array.isArray(response)) {
-        setDisplayedImages(response);
-        setTotalCount(response.length);
-        setTotalPages(1);
-        setCurrentPage(1);
-      }
+      setDisplayedImages(response.results || []);
+      setNextUrl(response.next);
     } catch (err) {
       console.error('Failed to filter images:', err);
     } finally {
@@ -136,14 +122,24 @@ const EventDetailPage: React.FC = () => {
     }
   };
 
-  const handleSearch = async (newFilters: SearchFilters) => {
-    setFilters(newFilters);
-    setCurrentPage(1);
-    loadEventImages(newFilters, 1);
+  const loadMoreImages = async () => {
+    if (!nextUrl) return;
+
+    setLoadingMore(true);
+    try {
+      const response = await imagesService.getAll(undefined, nextUrl);
+      setDisplayedImages((prev) => [...prev, ...response.results]);
+      setNextUrl(response.next);
+    } catch (err) {
+      console.error('Failed to load more images:', err);
+    } finally {
+      setLoadingMore(false);
+    }
   };
 
-  const handlePageChange = (event: React.ChangeEvent<unknown>, page: number) => {
-    loadEventImages(filters, page);
+  const handleSearch = async (newFilters: SearchFilters) => {
+    setFilters(newFilters);
+    loadEventImages(newFilters);
   };
 
   const prevCard = () => {
@@ -216,7 +212,7 @@ const EventDetailPage: React.FC = () => {
           />
           <Chip
             icon={<CameraAlt />}
-            label={`${currentEvent.images?.length || 0} photos`}
+            label={`${currentEvent.image_count || 0} photos`}
           />
         </Box>
         {currentEvent.description && (
@@ -332,14 +328,11 @@ const EventDetailPage: React.FC = () => {
             </Box>
           )}
 
-          {totalPages > 1 && (
+          {nextUrl && (
             <Box display="flex" justifyContent="center" mt={4} mb={2}>
-              <Pagination
-                count={totalPages}
-                page={currentPage}
-                onChange={handlePageChange}
-                color="primary"
-              />
+              <Button variant="outlined" onClick={loadMoreImages} disabled={loadingMore}>
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </Button>
             </Box>
           )}
         </>
@@ -85,7 +85,7 @@ const EventsListPage: React.FC = () => {
                 <CardMedia
                   component="img"
                   height="200"
-                  image={event.cover_photo || 'https://via.placeholder.com/400x200?text=No+Image'}
+                  image={event.cover_thumbnail || 'https://via.placeholder.com/400x200?text=No+Image'}
                   alt={event.name}
                   sx={{ objectFit: 'cover' }}
                 />
@@ -102,11 +102,9 @@ const EventsListPage: React.FC = () => {
                       {new Date(event.start_date).toLocaleDateString()}
                     </Typography>
                   </Box>
-                  {event.images && (
-                    <Typography variant="body2" color="text.secondary" mt={1}>
-                      {event.images.length} photo{event.images.length !== 1 ? 's' : ''}
-                    </Typography>
-                  )}
+                  <Typography variant="body2" color="text.secondary" mt={1}>
+                    {event.image_count} photo{event.image_count !== 1 ? 's' : ''}
+                  </Typography>
                 </CardContent>
                 <CardActions>
                   <Button
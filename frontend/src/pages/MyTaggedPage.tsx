@@ -11,6 +11,7 @@ import {
   CircularProgress,
   Alert,
   Chip,
+  Button,
 } from '@mui/material';
 import { Label, CameraAlt } from '@mui/icons-material';
 import { imagesService } from '../services/images';
@@ -21,6 +22,8 @@ const MyTaggedPage: React.FC = () => {
   const [images, setImages] = useState<Image[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [nextUrl, setNextUrl] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     loadTagged();
@@ -30,7 +33,8 @@ const MyTaggedPage: React.FC = () => {
     try {
       setLoading(true);
       const data = await imagesService.getMyTagged();
-      setImages(data);
+      setImages(data.results);
+      setNextUrl(data.next);
     } catch (err: any) {
       setError('Failed to load tagged photos');
     } finally {
@@ -38,6 +42,20 @@ const MyTaggedPage: React.FC = () => {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextUrl) return;
+    try {
+      setLoadingMore(true);
+      const data = await imagesService.getMyTagged(nextUrl);
+      setImages((prev) => [...prev, ...data.results]);
+      setNextUrl(data.next);
+    } catch (err: any) {
+      setError('Failed to load tagged photos');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   if (loading) {
     return (
       <Box display="flex" justifyContent="center" alignItems="center" minHeight="80vh">
@@ -124,6 +142,14 @@ const MyTaggedPage: React.FC = () => {
               </Grid>
             ))}
           </Grid>
+
+          {nextUrl && (
+            <Box display="flex" justifyContent="center" mt={4} mb={2}>
+              <Button variant="outlined" onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </Button>
+            </Box>
+          )}
         </>
       )}
     </Container>
@@ -24,6 +24,8 @@ const MyUploadsPage: React.FC = () => {
   const [images, setImages] = useState<Image[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [nextUrl, setNextUrl] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const isPhotographer = user?.role === 'PHOTOGRAPHER' || user?.role === 'COORDINATOR' || user?.role === 'ADMIN';
 
@@ -39,7 +41,8 @@ const MyUploadsPage: React.FC = () => {
     try {
       setLoading(true);
       const data = await imagesService.getMyUploads();
-      setImages(data);
+      setImages(data.results);
+      setNextUrl(data.next);
     } catch (err: any) {
       setError('Failed to load uploads');
     } finally {
@@ -47,6 +50,20 @@ const MyUploadsPage: React.FC = () => {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextUrl) return;
+    try {
+      setLoadingMore(true);
+      const data = await imagesService.getMyUploads(nextUrl);
+      setImages((prev) => [...prev, ...data.results]);
+      setNextUrl(data.next);
+    } catch (err: any) {
+      setError('Failed to load uploads');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   if (loading) {
     return (
       <Box display="flex" justifyContent="center" alignItems="center" minHeight="80vh">
@@ -197,6 +214,14 @@ const MyUploadsPage: React.FC = () => {
               </Grid>
             ))}
           </Grid>
+
+          {nextUrl && (
+            <Box display="flex" justifyContent="center" mt={4} mb={2}>
+              <Button variant="outlined" onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </Button>
+            </Box>
+          )}
         </>
       )}
     </Container>
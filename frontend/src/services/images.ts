@@ -1,10 +1,22 @@
 import api from './api';
 import { Image } from '../types';
 
+export interface ImagePage {
+  next: string | null;
+  previous: string | null;
+  results: Image[];
+}
+
+// Image listings use cursor pagination; `next` is an absolute URL that
+// already carries the opaque cursor and the original filters.
+const getPage = async (url: string, params?: any): Promise<ImagePage> => {
+  const response = await api.get<ImagePage>(url, { params });
+  return response.data;
+};
+
 export const imagesService = {
-  getAll: async (params?: any): Promise<any> => {
-    const response = await api.get('/images/', { params });
-    return response.data;
+  getAll: async (params?: any, nextUrl?: string | null): Promise<ImagePage> => {
+    return nextUrl ? getPage(nextUrl) : getPage('/images/', params);
   },
 
   getById: async (id: number, countView: boolean = false) => {
@@ -14,19 +26,16 @@ export const imagesService = {
     return response.data;
   },
 
-  getMyFavorites: async (): Promise<any> => {
-    const response = await api.get('/images/my_favorites/');
-    return Array.isArray(response.data) ? response.data : response.data.results;
+  getMyFavorites: async (nextUrl?: string | null): Promise<ImagePage> => {
+    return getPage(nextUrl || '/images/my_favorites/');
   },
 
-  getMyUploads: async (): Promise<any> => {
-    const response = await api.get('/images/my_uploads/');
-    return Array.isArray(response.data) ? response.data : response.data.results;
+  getMyUploads: async (nextUrl?: string | null): Promise<ImagePage> => {
+    return getPage(nextUrl || '/images/my_uploads/');
   },
 
-  getMyTagged: async (): Promise<any> => {
-    const response = await api.get('/images/my_tagged/');
-    return Array.isArray(response.data) ? response.data : response.data.results;
+  getMyTagged: async (nextUrl?: string | null): Promise<ImagePage> => {
+    return getPage(nextUrl || '/images/my_tagged/');
   },
 
   upload: async (formData: FormData) => {
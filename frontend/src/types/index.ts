@@ -42,7 +42,9 @@ export interface Event {
   is_public: boolean;
   created_at: string;
   created_by: number;
-  images?: Image[];
+  image_count: number;
+  cover_thumbnail: string | null;
+  preview_images: { id: number; thumbnail: string }[];
 }
 
 export interface Tag {
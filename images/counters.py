@@ -0,0 +1,189 @@
+"""
+Write-behind buffer for Image.view_count and Image.download_count.
+
+Views and downloads are absorbed as HINCRBY calls on a single Redis hash
+instead of hitting the image row on every request. A periodic Celery task
+(`images.tasks.flush_image_counters`) drains the hash and applies all deltas
+in batched UPDATE ... CASE statements. Readers add the pending deltas on top of
+the stored values so counts still look live.
+
+Each flush holds a Redis lock and renames the pending hash to a batch key of
+its own. The batch id is recorded as a CounterFlush row in the transaction
+that applies the deltas, so a batch left behind by a crashed flush is
+applied at most once: the next flush applies it only if that row is
+missing, and otherwise just deletes it.
+
+If Redis is unreachable, increments fall back to a direct UPDATE.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.db.models import Case, F, IntegerField, Value, When
+
+logger = logging.getLogger(__name__)
+
+BUFFERED_FIELDS = ('view_count', 'download_count')
+
+PENDING_KEY = 'image_counters:pending'
+# Set of the batch keys taken by flushes and not yet deleted.
+BATCHES_KEY = 'image_counters:batches'
+BATCH_KEY = 'image_counters:batch:{}'
+LOCK_KEY = 'image_counters:lock'
+
+# Seconds a flush may hold the lock. Should it run longer, an overlapping
+# flush is still harmless: every batch is applied at most once.
+LOCK_TIMEOUT = 300
+
+# Rows per UPDATE ... CASE statement when flushing.
+FLUSH_BATCH_SIZE = 500
+
+# CounterFlush rows older than this are pruned.
+FLUSH_RECORD_RETENTION = timedelta(days=1)
+
+# Moves the pending hash to a new batch key and registers that key, or does
+# nothing when there is no pending hash.
+_TAKE_BATCH = """
+if redis.call('exists', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('rename', KEYS[1], KEYS[2])
+redis.call('sadd', KEYS[3], KEYS[2])
+return 1
+"""
+
+_client = None
+_take_batch = None
+
+
+def get_client():
+    global _client, _take_batch
+    if _client is None:
+        _client = redis.Redis.from_url(settings.IMAGE_COUNTER_REDIS_URL)
+        _take_batch = _client.register_script(_TAKE_BATCH)
+    return _client
+
+
+def _member(image_id, field):
+    return f'{image_id}:{field}'
+
+
+def increment(image_id, field, amount=1):
+    """
+    Buffers `amount` for the counter. Returns False if it was written
+    straight to the row instead, which pending_counts will not report.
+    """
+    if field not in BUFFERED_FIELDS:
+        raise ValueError(f'{field} is not a buffered counter')
+
+    try:
+        get_client().hincrby(PENDING_KEY, _member(image_id, field), amount)
+        return True
+    except redis.RedisError as e:
+        logger.warning(f"Counter buffer unavailable, writing through: {str(e)}")
+        from images.models import Image
+        Image.objects.filter(pk=image_id).update(**{field: F(field) + amount})
+        return False
+
+
+def pending_counts(image_ids):
+    """Returns {image_id: {field: delta}} for deltas not yet flushed."""
+    image_ids = list(image_ids)
+    if not image_ids:
+        return {}
+
+    members = [_member(pk, field) for pk in image_ids for field in BUFFERED_FIELDS]
+
+    try:
+        client = get_client()
+        pipe = client.pipeline(transaction=False)
+        pipe.smembers(BATCHES_KEY)
+        pipe.hmget(PENDING_KEY, members)
+        batch_keys, pending = pipe.execute()
+        # Usually no batch is in flight, at most one.
+        in_flight = [client.hmget(key, members) for key in batch_keys]
+    except redis.RedisError:
+        return {}
+
+    counts = {}
+    for member, *values in zip(members, pending, *in_flight):
+        delta = sum(int(value or 0) for value in values)
+        if delta:
+            pk, field = member.split(':', 1)
+            counts.setdefault(int(pk), {})[field] = delta
+    return counts
+
+
+def flush():
+    """Applies all buffered deltas. Returns rows updated."""
+    client = get_client()
+    lock = client.lock(LOCK_KEY, timeout=LOCK_TIMEOUT, blocking=False)
+    if not lock.acquire():
+        # Another flush is running; it will pick these deltas up.
+        return 0
+
+    try:
+        batch_key = BATCH_KEY.format(uuid.uuid4().hex)
+        _take_batch(keys=[PENDING_KEY, batch_key, BATCHES_KEY])
+
+        # Batches of earlier flushes that died before deleting theirs come
+        # first; _apply skips any that were already committed.
+        updated = 0
+        for key in sorted(client.smembers(BATCHES_KEY)):
+            key = key.decode()
+            updated += _apply(key)
+            pipe = client.pipeline()
+            pipe.delete(key)
+            pipe.srem(BATCHES_KEY, key)
+            pipe.execute()
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            logger.warning("Counter flush outlived its lock")
+
+    from images.models import CounterFlush
+    CounterFlush.objects.filter(flushed_at__lt=timezone.now() - FLUSH_RECORD_RETENTION).delete()
+
+    return updated
+
+
+def _apply(batch_key):
+    """Adds the deltas in `batch_key` to the images, unless already done."""
+    from images.models import CounterFlush, Image
+
+    deltas = {}
+    for member, value in get_client().hgetall(batch_key).items():
+        pk, field = member.decode().split(':', 1)
+        if field in BUFFERED_FIELDS and int(value):
+            deltas.setdefault(int(pk), {})[field] = int(value)
+
+    updated = 0
+    items = list(deltas.items())
+    try:
+        with transaction.atomic():
+            # Written first: a concurrent flush of the same batch waits on
+            # this row and then fails before touching any image.
+            CounterFlush.objects.create(batch=batch_key)
+
+            for start in range(0, len(items), FLUSH_BATCH_SIZE):
+                batch = dict(items[start:start + FLUSH_BATCH_SIZE])
+                updates = {}
+                for field in BUFFERED_FIELDS:
+                    whens = [
+                        When(pk=pk, then=Value(fields[field]))
+                        for pk, fields in batch.items() if field in fields
+                    ]
+                    if whens:
+                        updates[field] = F(field) + Case(*whens, default=Value(0), output_field=IntegerField())
+
+                updated += Image.objects.filter(pk__in=batch.keys()).update(**updates)
+    except IntegrityError:
+        logger.info(f"Counter batch {batch_key} was already applied")
+        return 0
+
+    return updated
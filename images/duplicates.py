@@ -0,0 +1,146 @@
+"""
+Near-duplicate detection from perceptual hashes.
+
+Every upload stores a 64-bit dHash (Image.phash, see processing.dhash).
+Two images are near-duplicates when their hashes are within
+DUPLICATE_HASH_RADIUS bits of each other. Lookups go through a multi-index
+hash table over the event's hashes, so a Hamming-radius query only
+compares against images that share a hash segment with it instead of
+every image in the event.
+"""
+from django.conf import settings
+
+from .models import Image
+
+_MASK = (1 << 64) - 1
+
+
+def hamming(a, b):
+    return ((a ^ b) & _MASK).bit_count()
+
+
+class HashIndex:
+    """
+    Multi-index hash table for Hamming-radius queries.
+
+    The 64 bits are split into radius + 1 segments, each with its own hash
+    table. Two hashes within `radius` bits of each other must agree exactly
+    on at least one segment (pigeonhole), so a query only compares against
+    the entries sharing a segment with it.
+    """
+
+    def __init__(self, radius=None):
+        self.radius = settings.DUPLICATE_HASH_RADIUS if radius is None else radius
+        count = self.radius + 1
+        bounds = [64 * i // count for i in range(count + 1)]
+        self.segments = [
+            (start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])
+        ]
+        self.tables = [{} for _ in self.segments]
+        self.entries = []
+
+    def add(self, phash, item):
+        phash &= _MASK
+        position = len(self.entries)
+        self.entries.append((phash, item))
+        for table, (shift, mask) in zip(self.tables, self.segments):
+            table.setdefault((phash >> shift) & mask, []).append(position)
+
+    def search(self, phash):
+        """Returns [(distance, item)] for every entry within the radius."""
+        phash &= _MASK
+        seen = set()
+        matches = []
+        for table, (shift, mask) in zip(self.tables, self.segments):
+            for position in table.get((phash >> shift) & mask, ()):
+                if position in seen:
+                    continue
+                seen.add(position)
+                entry_hash, item = self.entries[position]
+                distance = hamming(phash, entry_hash)
+                if distance <= self.radius:
+                    matches.append((distance, item))
+        return matches
+
+
+class EventIndex:
+    """
+    HashIndex of (image id, original id) over the hashed images of an event,
+    which `refresh` tops up with the images added since it was built.
+    """
+
+    def __init__(self, event_id):
+        self.event_id = event_id
+        self.index = HashIndex()
+        self.ids = set()
+        # Highest id read from the database. Only `refresh` moves it: an
+        # image added locally may have a higher id than one another worker
+        # has not committed yet.
+        self.watermark = 0
+        self.refresh()
+
+    def refresh(self):
+        rows = Image.objects.filter(
+            event_id=self.event_id, pk__gt=self.watermark, is_deleted=False, phash__isnull=False
+        ).order_by('pk').values_list('phash', 'id', 'duplicate_of_id')
+        for phash, image_id, duplicate_of_id in rows:
+            self.add(phash, (image_id, duplicate_of_id or image_id))
+            self.watermark = image_id
+
+    def add(self, phash, item):
+        if item[0] not in self.ids:
+            self.ids.add(item[0])
+            self.index.add(phash, item)
+
+    def search(self, phash):
+        return self.index.search(phash)
+
+
+def event_index(event_id):
+    """EventIndex over the hashed images of an event."""
+    return EventIndex(event_id)
+
+
+def find_original(index, phash):
+    """
+    Returns the id of the image `phash` duplicates, or None. Matches that are
+    themselves duplicates resolve to their original, so a burst collapses
+    onto its first shot.
+    """
+    matches = index.search(phash)
+    if not matches:
+        return None
+    _, (_, original_id) = min(matches, key=lambda match: (match[0], match[1][0]))
+    return original_id
+
+
+def group(images, radius=None):
+    """
+    Groups (id, phash) pairs into clusters of near-duplicates. Returns lists
+    of ids, largest cluster first; images without a duplicate are left out.
+    """
+    index = HashIndex(radius)
+    parent = {}
+
+    def find(image_id):
+        while parent[image_id] != image_id:
+            parent[image_id] = parent[parent[image_id]]
+            image_id = parent[image_id]
+        return image_id
+
+    for image_id, phash in images:
+        parent[image_id] = image_id
+        for _, match_id in index.search(phash):
+            root, match_root = find(image_id), find(match_id)
+            if root != match_root:
+                parent[max(root, match_root)] = min(root, match_root)
+        index.add(phash, image_id)
+
+    clusters = {}
+    for image_id in parent:
+        clusters.setdefault(find(image_id), []).append(image_id)
+
+    return sorted(
+        (sorted(ids) for ids in clusters.values() if len(ids) > 1),
+        key=lambda ids: (-len(ids), ids[0]),
+    )
@@ -0,0 +1,227 @@
+"""
+Header-only EXIF reader for JPEG uploads.
+
+Walks the JPEG marker segments up to the first APP1 "Exif" segment and
+parses its TIFF structure directly, so only the first few kilobytes of the
+file are read and no pixel data is decoded. This is cheap enough to run
+inside the upload request, which lets capture time, camera settings and
+GPS coordinates go into the initial INSERT.
+
+`image_fields` turns the raw IFDs (from this parser or from Pillow, see
+processing.extract_exif) into Image field values.
+"""
+import struct
+from datetime import datetime
+from decimal import Decimal
+from fractions import Fraction
+
+from PIL.ExifTags import TAGS
+
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+
+# TIFF field types: (struct format, size in bytes)
+_TYPES = {
+    1: ('B', 1),    # BYTE
+    2: ('s', 1),    # ASCII
+    3: ('H', 2),    # SHORT
+    4: ('L', 4),    # LONG
+    5: ('LL', 8),   # RATIONAL
+    7: ('s', 1),    # UNDEFINED
+    9: ('l', 4),    # SLONG
+    10: ('ll', 8),  # SRATIONAL
+}
+
+_SOI = b'\xff\xd8'
+_APP1 = 0xE1
+_SOS = 0xDA
+_EOI = 0xD9
+
+
+def _find_app1(fp):
+    """
+    Returns the Exif APP1 payload, b'' for a JPEG without one, or None if
+    the file is not a JPEG.
+    """
+    if fp.read(2) != _SOI:
+        return None
+
+    while True:
+        byte = fp.read(1)
+        if byte != b'\xff':
+            return b''
+        marker = fp.read(1)
+        while marker == b'\xff':
+            # Fill bytes may pad a marker.
+            marker = fp.read(1)
+        if not marker or marker[0] in (_SOS, _EOI):
+            # Pixel data starts here; EXIF always comes before it.
+            return b''
+
+        header = fp.read(2)
+        if len(header) != 2:
+            return b''
+        (length,) = struct.unpack('>H', header)
+
+        if marker[0] == _APP1:
+            payload = fp.read(length - 2)
+            if payload.startswith(b'Exif\x00\x00'):
+                return payload[6:]
+        else:
+            fp.seek(length - 2, 1)
+
+
+def _read_value(data, endian, field_type, count, value_offset, entry_offset):
+    fmt, size = _TYPES[field_type]
+    total = size * count
+    # Values of up to 4 bytes are stored inline in the entry.
+    start = entry_offset + 8 if total <= 4 else value_offset
+    raw = data[start:start + total]
+    if len(raw) != total:
+        raise ValueError("EXIF value out of bounds")
+
+    if field_type in (2, 7):
+        if field_type == 2:
+            return raw.split(b'\x00', 1)[0].decode('utf-8', 'replace').strip()
+        return raw
+
+    values = struct.unpack(f'{endian}{fmt * count}', raw)
+    if field_type in (5, 10):
+        values = tuple(
+            Fraction(num, den) if den else Fraction(0)
+            for num, den in zip(values[::2], values[1::2])
+        )
+    return values[0] if count == 1 else values
+
+
+def _read_ifd(data, endian, offset):
+    (count,) = struct.unpack(f'{endian}H', data[offset:offset + 2])
+    tags = {}
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        tag, field_type, value_count, value_offset = struct.unpack(
+            f'{endian}HHLL', data[entry:entry + 12]
+        )
+        if field_type not in _TYPES:
+            continue
+        try:
+            tags[tag] = _read_value(data, endian, field_type, value_count, value_offset, entry)
+        except (ValueError, struct.error):
+            continue
+    return tags
+
+
+def read_ifds(fp):
+    """
+    Returns (ifd0, exif_ifd, gps_ifd) as {tag id: value} dicts read from the
+    JPEG header of `fp` (empty when it has no usable EXIF), or None if `fp`
+    is not a JPEG.
+    """
+    data = _find_app1(fp)
+    if data is None:
+        return None
+    if len(data) < 8:
+        return {}, {}, {}
+
+    endian = {b'II': '<', b'MM': '>'}.get(data[:2])
+    if endian is None:
+        return {}, {}, {}
+    (ifd0_offset,) = struct.unpack(f'{endian}L', data[4:8])
+
+    try:
+        ifd0 = _read_ifd(data, endian, ifd0_offset)
+        exif_ifd = _read_ifd(data, endian, ifd0[EXIF_IFD]) if EXIF_IFD in ifd0 else {}
+        gps_ifd = _read_ifd(data, endian, ifd0[GPS_IFD]) if GPS_IFD in ifd0 else {}
+    except (struct.error, TypeError):
+        return {}, {}, {}
+
+    return ifd0, exif_ifd, gps_ifd
+
+
+def _to_str(value):
+    if isinstance(value, Fraction):
+        return str(float(value))
+    if isinstance(value, tuple):
+        return str(tuple(_to_str(item) if isinstance(item, Fraction) else item for item in value))
+    return str(value)
+
+
+def _coordinate(dms, ref, limit):
+    # Degrees, minutes, seconds as rationals, signed by the N/S or E/W ref.
+    try:
+        degrees, minutes, seconds = (float(part) for part in dms)
+    except (TypeError, ValueError):
+        return None
+    value = degrees + minutes / 60 + seconds / 3600
+    if isinstance(ref, bytes):
+        ref = ref.decode('ascii', 'ignore')
+    if str(ref).strip().upper() in ('S', 'W'):
+        value = -value
+    if not -limit <= value <= limit:
+        return None
+    return Decimal(f'{value:.6f}')
+
+
+def image_fields(ifd0, exif_ifd, gps_ifd):
+    """Image model field values from raw IFDs."""
+    tags = dict(ifd0)
+    tags.update(exif_ifd)
+    tags.pop(EXIF_IFD, None)
+    tags.pop(GPS_IFD, None)
+    if not tags and not gps_ifd:
+        return {}
+
+    exif_dict = {str(TAGS.get(tag_id, tag_id)): _to_str(value)[:100] for tag_id, value in tags.items()}
+    fields = {'exif': exif_dict}
+
+    if 'Model' in exif_dict:
+        fields['camera_model'] = exif_dict['Model']
+    if 'FNumber' in exif_dict:
+        fields['aperture'] = exif_dict['FNumber']
+    if 'ExposureTime' in exif_dict:
+        fields['shutter_speed'] = exif_dict['ExposureTime']
+
+    iso = tags.get(0x8827)
+    if isinstance(iso, tuple):
+        iso = iso[0] if iso else None
+    if isinstance(iso, int):
+        fields['iso'] = iso
+
+    focal_length = tags.get(0x920A)
+    if focal_length is not None:
+        try:
+            value = float(focal_length)
+            if 0 < value < 10000:
+                fields['focal_length'] = Decimal(f'{value:.2f}')
+        except (TypeError, ValueError):
+            pass
+
+    if 'DateTimeOriginal' in exif_dict:
+        try:
+            fields['capture_time'] = datetime.strptime(
+                exif_dict['DateTimeOriginal'],
+                '%Y:%m:%d %H:%M:%S'
+            )
+        except ValueError:
+            pass
+
+    if 2 in gps_ifd and 4 in gps_ifd:
+        latitude = _coordinate(gps_ifd[2], gps_ifd.get(1, 'N'), 90)
+        longitude = _coordinate(gps_ifd[4], gps_ifd.get(3, 'E'), 180)
+        if latitude is not None and longitude is not None:
+            fields['gps_latitude'] = latitude
+            fields['gps_longitude'] = longitude
+
+    return fields
+
+
+def read(fp):
+    """
+    Image field values from the EXIF header of an open JPEG file, or None
+    for other formats, which are left to processing.extract_exif.
+    Leaves the file position wherever parsing stopped.
+    """
+    ifds = read_ifds(fp)
+    if ifds is None:
+        return None
+    return image_fields(*ifds)
@@ -1,4 +1,9 @@
 import django_filters
+from django.conf import settings
+from rest_framework import filters
+
+from tags.models import ImageTag, Tag
+from . import search, tag_index
 from .models import Image
 
 
@@ -40,9 +45,29 @@ class ImageFilter(django_filters.FilterSet):
         if not tag_names:
             return queryset
 
-        for tag_name in tag_names:
-            queryset = queryset.filter(tags__name__iexact=tag_name)
+        ids = Tag.objects.ids_by_name(tag_names)
+        if len(ids) < len(set(tag_names)):
+            # No tag has one of the names, so no image can match.
+            return queryset.none()
+        tag_groups = list(ids.values())
+
+        index = tag_index.get_index()
+        if index is not None:
+            hot = [group for group in tag_groups if all(index.covers(pk) for pk in group)]
+            if hot:
+                image_ids = index.intersect(hot)
+                if len(image_ids) <= settings.TAG_INDEX_MAX_IDS:
+                    queryset = queryset.filter(pk__in=image_ids.tolist())
+                    tag_groups = [group for group in tag_groups if group not in hot]
+                    if not tag_groups:
+                        return queryset
+
+        return queryset.filter(pk__in=ImageTag.objects.images_with_all(tag_groups))
+
 
-        result = queryset.distinct()
+class ImageSearchFilter(filters.SearchFilter):
+    """`?search=` over the full-text index; see images.search."""
 
-        return result
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        return search.matching(queryset, text)
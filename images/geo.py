@@ -0,0 +1,108 @@
+"""
+Server-side clustering of geotagged images for the map view.
+
+The visible bounding box is cut into a grid whose cell size halves with
+every zoom level (CELLS_PER_TILE cells across each web-map tile), and the
+database groups the images by cell in one aggregate query: count, mean
+position, extent and a representative image per cell. Clients draw one
+marker per cluster instead of downloading every image's coordinates.
+The zoom is lowered when needed so a box is never cut into more than
+MAX_CELLS cells, whatever zoom the client asks for.
+"""
+import math
+
+from django.db.models import Avg, Count, FloatField, Max, Min, Q
+from django.db.models.functions import Cast, Floor
+
+MAX_ZOOM = 22
+
+# Grid cells per 256px map tile, i.e. clusters are roughly 64px apart.
+CELLS_PER_TILE = 4
+
+# Most grid cells one request may cut its bounding box into. A full-screen
+# map at its own zoom needs a few hundred.
+MAX_CELLS = 4096
+
+
+def cell_size(zoom):
+    """Cell edge in degrees at `zoom`."""
+    return 360 / (2 ** zoom * CELLS_PER_TILE)
+
+
+def parse_bbox(value):
+    """'west,south,east,north' in degrees -> tuple of floats, or None."""
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        return None
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        return None
+    return west, south, east, north
+
+
+def cell_count(bbox, zoom):
+    """Grid cells `bbox` spans at `zoom`."""
+    west, south, east, north = bbox
+    # A box crossing the antimeridian has west > east.
+    width = east - west if west <= east else 360 - (west - east)
+    size = cell_size(zoom)
+    return (math.floor(width / size) + 1) * (math.floor((north - south) / size) + 1)
+
+
+def fit_zoom(bbox, zoom):
+    """The highest zoom up to `zoom` at which `bbox` spans at most MAX_CELLS cells."""
+    while zoom > 0 and cell_count(bbox, zoom) > MAX_CELLS:
+        zoom -= 1
+    return zoom
+
+
+def in_bbox(queryset, bbox):
+    west, south, east, north = bbox
+    queryset = queryset.filter(gps_latitude__gte=south, gps_latitude__lte=north)
+    if west <= east:
+        return queryset.filter(gps_longitude__gte=west, gps_longitude__lte=east)
+    # The box crosses the antimeridian.
+    return queryset.filter(Q(gps_longitude__gte=west) | Q(gps_longitude__lte=east))
+
+
+def clusters(queryset, bbox, zoom):
+    """
+    Returns one dict per non-empty grid cell inside `bbox`, with the count,
+    centroid, extent and the id of a representative image (the newest one
+    that has a thumbnail), largest clusters first.
+    """
+    size = cell_size(zoom)
+    rows = (
+        in_bbox(queryset, bbox)
+        .annotate(
+            cell_x=Floor(Cast('gps_longitude', FloatField()) / size),
+            cell_y=Floor(Cast('gps_latitude', FloatField()) / size),
+        )
+        .order_by()
+        .values('cell_x', 'cell_y')
+        .annotate(
+            count=Count('id'),
+            latitude=Avg(Cast('gps_latitude', FloatField())),
+            longitude=Avg(Cast('gps_longitude', FloatField())),
+            south=Min('gps_latitude'),
+            north=Max('gps_latitude'),
+            west=Min('gps_longitude'),
+            east=Max('gps_longitude'),
+            representative=Max('id', filter=Q(thumbnail__gt='')),
+            newest=Max('id'),
+        )
+    )
+
+    return sorted(
+        (
+            {
+                'latitude': round(row['latitude'], 6),
+                'longitude': round(row['longitude'], 6),
+                'count': row['count'],
+                'bounds': [float(row['west']), float(row['south']), float(row['east']), float(row['north'])],
+                'image': row['representative'] or row['newest'],
+            }
+            for row in rows
+        ),
+        key=lambda cluster: -cluster['count'],
+    )
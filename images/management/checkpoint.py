@@ -0,0 +1,22 @@
+"""Last-processed-id checkpoints for resumable management commands."""
+import os
+
+
+def read(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return int(f.read().strip() or 0)
+
+
+def write(path, last_id):
+    # Write-then-rename so an interrupted run never leaves a torn file.
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(str(last_id))
+    os.replace(tmp, path)
+
+
+def clear(path):
+    if os.path.exists(path):
+        os.remove(path)
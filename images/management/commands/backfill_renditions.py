@@ -0,0 +1,140 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from images import processing
+from images.management import checkpoint as checkpoints
+from images.models import Image
+from images.tasks import process_image
+
+STEPS = ['thumbnail', 'watermark']
+
+
+def _render(image_id):
+    # Runs in a pool process; process_image raises on failure.
+    try:
+        process_image(image_id, steps=STEPS)
+    except Exception as e:
+        return image_id, str(e)
+    return image_id, None
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenerates missing or stale thumbnails and watermarked copies "
+        "(Image.rendition_version below processing.RENDITION_VERSION). Safe to "
+        "interrupt: rerunning resumes from the checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Local worker processes")
+        parser.add_argument('--celery', action='store_true',
+                            help="Fan out to Celery workers instead of a local pool")
+        parser.add_argument('--rate', type=float, default=None,
+                            help="With --celery, the most images queued per second")
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help="Images per chunk; a checkpoint is written after each")
+        parser.add_argument('--checkpoint', default='backfill_renditions.checkpoint',
+                            help="File recording the last processed image id")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore the checkpoint and scan from the first image")
+        parser.add_argument('--include-duplicates', action='store_true',
+                            help="Also render near-duplicates whose processing was skipped")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Stop after this many images")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only count the images that need renditions")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        # Served by the (rendition_version, id) index.
+        stale = Image.objects.filter(
+            rendition_version__lt=processing.RENDITION_VERSION, is_deleted=False
+        )
+        if not options['include_duplicates']:
+            stale = stale.filter(duplicate_of__isnull=True)
+
+        if options['dry_run']:
+            self.stdout.write(f"{stale.count()} images need renditions")
+            return
+
+        checkpoint = options['checkpoint']
+        last_id = 0 if options['restart'] else checkpoints.read(checkpoint)
+        if last_id:
+            self.stdout.write(f"Resuming after image {last_id}")
+
+        limit = options['limit']
+        processed = 0
+        failures = {}
+        start = time.perf_counter()
+
+        pool = None
+        if not options['celery']:
+            # Forked children must not share the parent's DB connection.
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup)
+
+        try:
+            while limit is None or processed < limit:
+                size = options['chunk_size'] if limit is None else min(options['chunk_size'], limit - processed)
+                ids = list(
+                    stale.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:size]
+                )
+                if not ids:
+                    break
+
+                if pool is not None:
+                    results = list(pool.map(_render, ids))
+                else:
+                    results = self._fan_out(ids, options['rate'])
+                failures.update((image_id, error) for image_id, error in results if error)
+
+                processed += len(ids)
+                last_id = ids[-1]
+                checkpoints.write(checkpoint, last_id)
+
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{processed} images ({len(failures)} failed), "
+                    f"{processed / elapsed:.1f} images/s, last id {last_id}"
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if limit is None or processed < limit:
+            checkpoints.clear(checkpoint)
+
+        for image_id, error in sorted(failures.items()):
+            self.stderr.write(f"Image {image_id}: {error}")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {processed - len(failures)} rendered, {len(failures)} failed "
+            f"in {elapsed:.1f}s"
+        ))
+
+    def _fan_out(self, ids, rate):
+        """Queues one task per image, at most `rate` per second, and waits."""
+        results = []
+        for image_id in ids:
+            started = time.perf_counter()
+            results.append((image_id, process_image.delay(image_id, steps=STEPS)))
+            if rate:
+                time.sleep(max(0, 1 / rate - (time.perf_counter() - started)))
+
+        rendered = []
+        for image_id, async_result in results:
+            try:
+                async_result.get()
+            except Exception as e:
+                rendered.append((image_id, str(e)))
+            else:
+                rendered.append((image_id, None))
+        return rendered
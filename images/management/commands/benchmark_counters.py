@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from events.models import Event
+from images import counters
+from images.models import Image
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares hot-image view counting: direct UPDATE vs the write-behind buffer. "
+        "Counts go to a scratch image that is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int, help="Event the scratch image is created in")
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        event = Event.objects.filter(pk=options['event_id']).first()
+        if event is None:
+            raise CommandError(f"Event {options['event_id']} does not exist")
+
+        # Soft-deleted, so it never shows up in a gallery while it exists.
+        image = Image.objects.create(
+            event=event, original_image='images/original/benchmark_counters.jpg',
+            privacy='PRIVATE', is_deleted=True,
+        )
+        try:
+            self.measure(image.pk, options)
+        finally:
+            image.delete()
+
+    def measure(self, image_id, options):
+        def direct(_):
+            # Mirrors the old retrieve path: UPDATE then refresh_from_db().
+            Image.objects.filter(pk=image_id).update(view_count=F('view_count') + 1)
+            Image.objects.only('view_count').get(pk=image_id)
+
+        def buffered(_):
+            counters.increment(image_id, 'view_count')
+            counters.pending_counts([image_id])
+
+        for label, fn in [('direct UPDATE', direct), ('buffered', buffered)]:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                list(pool.map(fn, range(options['requests'])))
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{label:>14}: {options['requests'] / elapsed:10.1f} views/s "
+                f"({elapsed:.2f}s, {options['threads']} threads)"
+            )
+
+        start = time.perf_counter()
+        counters.flush()
+        self.stdout.write(f"{'flush':>14}: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        view_count = Image.objects.get(pk=image_id).view_count
+        self.stdout.write(f"view_count {view_count} (expected {2 * options['requests']})")
@@ -0,0 +1,123 @@
+import io
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image as PILImage
+from PIL.ExifTags import TAGS
+from PIL.TiffImagePlugin import IFDRational
+
+from images import exif, processing
+
+
+class CountingFile(io.FileIO):
+    """Counts the bytes actually read from disk."""
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        CountingFile.bytes_read += len(data)
+        return data
+
+    def readinto(self, buffer):
+        count = super().readinto(buffer)
+        CountingFile.bytes_read += count or 0
+        return count
+
+
+def request_flow(path):
+    # The old in-request read: Pillow's private _getexif(), every tag
+    # stringified into the JSON field, GPS left unparsed.
+    with CountingFile(path) as f, PILImage.open(f) as img:
+        exif_data = img._getexif() or {}
+        return {str(TAGS.get(tag_id, tag_id)): str(value)[:100] for tag_id, value in exif_data.items()}
+
+
+def pillow_flow(path):
+    with CountingFile(path) as f, PILImage.open(f) as img:
+        return processing.extract_exif(img)
+
+
+def header_flow(path):
+    with CountingFile(path) as f:
+        return exif.read(f)
+
+
+FLOWS = {
+    'request': request_flow,
+    'pillow': pillow_flow,
+    'header': header_flow,
+}
+
+
+class Command(BaseCommand):
+    help = "Compares the per-file cost of EXIF extraction strategies."
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="JPEG files or directories of JPEGs")
+        parser.add_argument('--generate', type=int, default=200,
+                            help="Synthetic JPEGs with EXIF and GPS to create when no paths are given")
+        parser.add_argument('--rounds', type=int, default=3,
+                            help="Passes over the sample per strategy; the fastest is reported")
+
+    def handle(self, *args, **options):
+        paths = []
+        for path in options['paths']:
+            if os.path.isdir(path):
+                paths.extend(
+                    os.path.join(path, name) for name in sorted(os.listdir(path))
+                    if name.lower().endswith(('.jpg', '.jpeg'))
+                )
+            else:
+                paths.append(path)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            if not options['paths']:
+                paths = self.generate(tmp, options['generate'])
+            if not paths:
+                raise CommandError("No JPEG files found")
+
+            total_size = sum(os.path.getsize(path) for path in paths)
+            self.stdout.write(f"{len(paths)} files, {total_size / len(paths) / 1024:.0f} KiB average")
+
+            for name, flow in FLOWS.items():
+                best = None
+                for _ in range(options['rounds']):
+                    CountingFile.bytes_read = 0
+                    start = time.perf_counter()
+                    gps = 0
+                    for path in paths:
+                        fields = flow(path) or {}
+                        gps += 'gps_latitude' in fields
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+
+                self.stdout.write(
+                    f"{name:>8}: {best / len(paths) * 1e6:8.1f} us/file, "
+                    f"{CountingFile.bytes_read / len(paths) / 1024:8.1f} KiB read/file, "
+                    f"GPS in {gps}/{len(paths)}"
+                )
+
+    def generate(self, directory, count):
+        exif_data = PILImage.Exif()
+        exif_data[0x010F] = 'Canon'
+        exif_data[0x0110] = 'Canon EOS R5'
+        sub_ifd = exif_data.get_ifd(exif.EXIF_IFD)
+        sub_ifd[0x829A] = IFDRational(1, 250)
+        sub_ifd[0x829D] = IFDRational(28, 10)
+        sub_ifd[0x8827] = 400
+        sub_ifd[0x9003] = '2025:06:01 12:34:56'
+        gps_ifd = exif_data.get_ifd(exif.GPS_IFD)
+        gps_ifd[1] = 'N'
+        gps_ifd[2] = (IFDRational(29, 1), IFDRational(51, 1), IFDRational(4, 1))
+        gps_ifd[3] = 'E'
+        gps_ifd[4] = (IFDRational(77, 1), IFDRational(53, 1), IFDRational(43, 1))
+
+        noise = PILImage.effect_noise((2000, 1500), 64).convert('RGB')
+        paths = []
+        for i in range(count):
+            path = os.path.join(directory, f'bench_{i}.jpg')
+            noise.save(path, format='JPEG', quality=90, exif=exif_data.tobytes())
+            paths.append(path)
+        return paths
@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image as PILImage
+from PIL import ImageDraw, ImageFont
+
+from images import processing
+
+
+def legacy_flow(path):
+    # The pixel work of the old request-time EXIF read plus the separate
+    # generate_thumbnail, apply_watermark and auto_tag_image tasks, each of
+    # which reopened and fully decoded the original.
+    img = PILImage.open(path)
+    img._getexif()
+
+    img = PILImage.open(path)
+    img.thumbnail((400, 400), PILImage.Resampling.LANCZOS)
+    img.save(BytesIO(), format='JPEG', quality=85)
+
+    img = PILImage.open(path).convert('RGBA')
+    overlay = PILImage.new('RGBA', img.size, (255, 255, 255, 0))
+    draw = ImageDraw.Draw(overlay)
+    draw.text((img.size[0] - 300, img.size[1] - 60), processing.WATERMARK_TEXT,
+              fill=(255, 255, 255, 128), font=ImageFont.load_default())
+    watermarked = PILImage.alpha_composite(img, overlay).convert('RGB')
+    watermarked.save(BytesIO(), format='JPEG', quality=95)
+
+    img = PILImage.open(path).convert('RGB')
+    width, height = img.size
+    scale = 256 / min(width, height)
+    img.resize((round(width * scale), round(height * scale)), PILImage.Resampling.BILINEAR)
+
+
+def pipeline_flow(path):
+    processing.run(path)
+
+
+FLOWS = {
+    'three-task': legacy_flow,
+    'pipeline': pipeline_flow,
+}
+
+
+def _measure(flow, paths, queue):
+    start = time.perf_counter()
+    for path in paths:
+        FLOWS[flow](path)
+    elapsed = time.perf_counter() - start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is reported in KiB on Linux.
+    queue.put((elapsed, usage.ru_utime + usage.ru_stime, usage.ru_maxrss / 1024))
+
+
+class Command(BaseCommand):
+    help = "Compares CPU time and peak RSS of the old three-task flow and the single-decode pipeline."
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="JPEG files or directories of JPEGs")
+        parser.add_argument('--generate', type=int, default=4,
+                            help="Synthetic 24MP JPEGs to create when no paths are given")
+
+    def handle(self, *args, **options):
+        paths = []
+        for path in options['paths']:
+            if os.path.isdir(path):
+                paths.extend(
+                    os.path.join(path, name) for name in sorted(os.listdir(path))
+                    if name.lower().endswith(('.jpg', '.jpeg'))
+                )
+            else:
+                paths.append(path)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            if not options['paths']:
+                paths = self.generate(tmp, options['generate'])
+            if not paths:
+                raise CommandError("No JPEG files found")
+
+            self.stdout.write(f"{len(paths)} files")
+
+            # Each flow runs in a fresh process so peak RSS is not shared.
+            ctx = multiprocessing.get_context('spawn')
+            for flow in FLOWS:
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_measure, args=(flow, paths, queue))
+                proc.start()
+                elapsed, cpu, rss = queue.get()
+                proc.join()
+                self.stdout.write(
+                    f"{flow:>10}: {elapsed / len(paths) * 1000:8.1f} ms/file wall, "
+                    f"{cpu / len(paths) * 1000:8.1f} ms/file CPU, peak RSS {rss:7.1f} MiB"
+                )
+
+    def generate(self, directory, count):
+        paths = []
+        for i in range(count):
+            path = os.path.join(directory, f'bench_{i}.jpg')
+            noise = PILImage.effect_noise((6000, 4000), 64).convert('RGB')
+            noise.save(path, format='JPEG', quality=90)
+            paths.append(path)
+        return paths
@@ -0,0 +1,134 @@
+import importlib
+import itertools
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from images import search
+
+TABLE = 'bench_search_documents'
+
+# The index is created exactly as the migration creates it, on the scratch table.
+_index_migration = importlib.import_module('images.migrations.0009_imagesearchdocument')
+INDEX_SQL = {
+    'postgresql': _index_migration.POSTGRES_INDEX,
+    'sqlite': _index_migration.SQLITE_INDEX,
+}
+
+
+def _word(rng):
+    syllables = ['ka', 'ri', 'to', 'ne', 'su', 'mo', 'la', 'vi', 'pe', 'do', 'gra', 'shi', 'tan', 'bel', 'or']
+    return ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares icontains search with the full-text index over synthetic search "
+        "documents, in a scratch table that is dropped afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=1_000_000,
+                            help="Synthetic image documents to index")
+        parser.add_argument('--queries', type=int, default=20,
+                            help="Search texts per strategy")
+        parser.add_argument('--limit', type=int, default=20,
+                            help="Results fetched per search")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f"No full-text index for {vendor}")
+
+        rng = random.Random(options['seed'])
+        vocabulary = sorted({_word(rng) for _ in range(20000)})
+        # Zipf-like popularity, so some words are in most documents and some in few.
+        weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+        try:
+            start = time.perf_counter()
+            self.create(vendor)
+            self.fill(rng, vocabulary, weights, options['documents'])
+            self.stdout.write(f"{options['documents']} documents indexed in {time.perf_counter() - start:.0f}s")
+
+            texts = []
+            for _ in range(options['queries']):
+                words = rng.sample(vocabulary, rng.randint(1, 3))
+                # The last word is still being typed.
+                words[-1] = words[-1][:max(3, len(words[-1]) - 2)]
+                texts.append(' '.join(words))
+
+            for name, flow in (('icontains', self.icontains), ('fulltext', self.fulltext)):
+                timings = []
+                found = 0
+                for text in texts:
+                    started = time.perf_counter()
+                    found += len(flow(vendor, text, options['limit']))
+                    timings.append(time.perf_counter() - started)
+                timings.sort()
+                self.stdout.write(
+                    f"{name:>10}: p50 {timings[len(timings) // 2] * 1000:8.1f} ms, "
+                    f"p95 {timings[int(len(timings) * 0.95)] * 1000:8.1f} ms, "
+                    f"{found} results"
+                )
+        finally:
+            self.drop(vendor)
+
+    def create(self, vendor):
+        self.drop(vendor)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE {TABLE} (image_id bigint PRIMARY KEY, title text, description text, "
+                f"event text, tags text, photographer text)"
+            )
+            for statement in INDEX_SQL[vendor]:
+                cursor.execute(statement.replace(search.DOCUMENT_TABLE, TABLE))
+
+    def drop(self, vendor):
+        with connection.cursor() as cursor:
+            if vendor == 'sqlite':
+                cursor.execute(f"DROP TABLE IF EXISTS {TABLE}_fts")
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    def fill(self, rng, vocabulary, weights, count):
+        events = [' '.join(rng.choices(vocabulary, cum_weights=weights, k=3)) for _ in range(500)]
+        photographers = [' '.join(rng.choices(vocabulary, k=3)) for _ in range(2000)]
+
+        batch = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            for image_id in range(1, count + 1):
+                batch.append((
+                    image_id,
+                    ' '.join(rng.choices(vocabulary, cum_weights=weights, k=rng.randint(0, 4))),
+                    ' '.join(rng.choices(vocabulary, cum_weights=weights, k=rng.randint(0, 20))),
+                    rng.choice(events),
+                    ' '.join(rng.choices(vocabulary, cum_weights=weights, k=rng.randint(0, 8))),
+                    rng.choice(photographers),
+                ))
+                if len(batch) == 10000 or image_id == count:
+                    cursor.executemany(f"INSERT INTO {TABLE} VALUES (%s, %s, %s, %s, %s, %s)", batch)
+                    batch = []
+
+    def icontains(self, vendor, text, limit):
+        # What SearchFilter did: every word somewhere in any field, newest first.
+        like = 'ILIKE' if vendor == 'postgresql' else 'LIKE'
+        words = search.terms(text)
+        clause = ' AND '.join(
+            '(' + ' OR '.join(
+                f"{column} {like} %s" for column in ('title', 'description', 'event', 'tags', 'photographer')
+            ) + ')'
+            for _ in words
+        )
+        params = [f'%{word}%' for word in words for _ in range(5)]
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT image_id FROM {TABLE} WHERE {clause} ORDER BY image_id DESC LIMIT {limit}", params)
+            return cursor.fetchall()
+
+    def fulltext(self, vendor, text, limit):
+        sql, params = search.ranked_sql(vendor, search.terms(text), TABLE)
+        with connection.cursor() as cursor:
+            cursor.execute(f"{sql} LIMIT {limit}", params)
+            return cursor.fetchall()
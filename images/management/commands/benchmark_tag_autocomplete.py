@@ -0,0 +1,80 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from tags.autocomplete import PrefixIndex
+from tags.models import Tag
+from tags.serializers import TagSerializer
+
+
+def _name(rng):
+    words = [
+        ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+        for _ in range(rng.choice((1, 1, 1, 2, 2, 3)))
+    ]
+    return ' '.join(words)
+
+
+def _percentiles(timings):
+    timings = sorted(timings)
+    return timings[len(timings) // 2] * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+
+
+class Command(BaseCommand):
+    help = "Measures tag autocomplete latency on a synthetic prefix index and the old search path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tags', type=int, default=100_000,
+                            help="Synthetic tags in the prefix index")
+        parser.add_argument('--queries', type=int, default=2000,
+                            help="Prefixes looked up")
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        names = {_name(rng) for _ in range(options['tags'])}
+        rows = [(tag_id, name, int(rng.paretovariate(1.2))) for tag_id, name in enumerate(sorted(names), 1)]
+
+        start = time.perf_counter()
+        index = PrefixIndex(rows)
+        self.stdout.write(
+            f"{len(rows)} tags, {len(index.keys)} keys, built in {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+
+        # What a user types: every prefix of a few tag names, one keystroke at a time.
+        prefixes = []
+        while len(prefixes) < options['queries']:
+            _, name, _ = rng.choice(rows)
+            prefixes.extend(name[:length] for length in range(1, min(len(name), 6) + 1))
+        prefixes = prefixes[:options['queries']]
+
+        for label, lookup_prefixes in (
+            ('1-2 chars', [prefix for prefix in prefixes if len(prefix) <= 2]),
+            ('3+ chars', [prefix for prefix in prefixes if len(prefix) > 2]),
+        ):
+            timings = []
+            for prefix in lookup_prefixes:
+                started = time.perf_counter()
+                index.lookup(prefix, options['limit'])
+                timings.append(time.perf_counter() - started)
+            p50, p99 = _percentiles(timings)
+            self.stdout.write(f"{label:>10}: p50 {p50:7.1f} us, p99 {p99:7.1f} us")
+
+        if not Tag.objects.exists():
+            return
+
+        # The old endpoint: icontains, then one COUNT per returned tag.
+        db_names = list(Tag.objects.values_list('name', flat=True)[:200])
+        timings = []
+        for name in db_names:
+            prefix = name[:3]
+            started = time.perf_counter()
+            TagSerializer(Tag.objects.filter(name__icontains=prefix)[:options['limit']], many=True).data
+            timings.append(time.perf_counter() - started)
+        p50, p99 = _percentiles(timings)
+        self.stdout.write(
+            f"icontains search on {Tag.objects.count()} database tags: p50 {p50:7.1f} us, p99 {p99:7.1f} us"
+        )
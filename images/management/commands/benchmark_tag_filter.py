@@ -0,0 +1,102 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from images import tag_index
+from images.models import Image
+from tags.models import ImageTag, Tag
+
+
+def chain_flow(names):
+    # The old filter: one join through ImageTag -> Tag per name, then DISTINCT.
+    queryset = Image.objects.all()
+    for name in names:
+        queryset = queryset.filter(tags__name__iexact=name)
+    return list(queryset.distinct().values_list('pk', flat=True))
+
+
+def grouped_flow(names):
+    ids = Tag.objects.ids_by_name(names)
+    if len(ids) < len(names):
+        return []
+    return list(
+        Image.objects.filter(pk__in=ImageTag.objects.images_with_all(ids.values()))
+        .values_list('pk', flat=True)
+    )
+
+
+def inverted_flow(index):
+    def flow(names):
+        ids = Tag.objects.ids_by_name(names)
+        if len(ids) < len(names):
+            return []
+        return index.intersect(list(ids.values())).tolist()
+    return flow
+
+
+class Command(BaseCommand):
+    help = "Compares multi-tag image filter strategies on the current database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tags', action='append', default=[],
+                            help="Comma-separated tag names to AND together; repeatable")
+        parser.add_argument('--hot', type=int, default=100,
+                            help="Tags held by the inverted index")
+        parser.add_argument('--rounds', type=int, default=5,
+                            help="Runs per query and strategy; the fastest is reported")
+
+    def handle(self, *args, **options):
+        queries = [
+            sorted({name.strip().lower() for name in value.split(',') if name.strip()})
+            for value in options['tags']
+        ]
+        if not queries:
+            queries = self.default_queries()
+        if not queries:
+            raise CommandError("No tagged images to benchmark against")
+
+        start = time.perf_counter()
+        index = tag_index.HotTagIndex.build(options['hot'])
+        self.stdout.write(
+            f"Inverted index: {len(index.postings)} tags, "
+            f"{sum(len(ids) for ids in index.postings.values())} postings, "
+            f"built in {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+
+        flows = {
+            'chain': chain_flow,
+            'grouped': grouped_flow,
+            'inverted': inverted_flow(index),
+        }
+        for names in queries:
+            self.stdout.write(f"{' & '.join(names)}:")
+            expected = None
+            for name, flow in flows.items():
+                if name == 'inverted' and not all(
+                    index.covers(pk) for pks in Tag.objects.ids_by_name(names).values() for pk in pks
+                ):
+                    self.stdout.write(f"{name:>10}: skipped, not every tag is hot")
+                    continue
+
+                best = None
+                for _ in range(options['rounds']):
+                    start = time.perf_counter()
+                    result = flow(names)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+
+                result = sorted(result)
+                if expected is None:
+                    expected = result
+                mismatch = "" if result == expected else "  MISMATCH"
+                self.stdout.write(f"{name:>10}: {best * 1000:8.2f} ms, {len(result)} images{mismatch}")
+
+    def default_queries(self):
+        """Two, three and four of the most used tags."""
+        names = list(
+            Tag.objects.annotate(n=Count('image_tags')).order_by('-n')
+            .values_list('name', flat=True)[:4]
+        )
+        names = [name.lower() for name in names]
+        return [names[:size] for size in (2, 3, 4) if len(names) >= size]
@@ -0,0 +1,75 @@
+import os
+import resource
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from images.ml import batching
+from images.ml import resnet
+
+
+class Command(BaseCommand):
+    help = "Reports latency, throughput, memory and top-5 agreement of each auto-tag backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help="Directory holding the fixed comparison image set")
+        parser.add_argument('--backends', default=','.join(resnet.BACKENDS))
+        parser.add_argument('--batch-size', type=int, default=16)
+        parser.add_argument('--reference', default='eager',
+                            help="Backend whose top-5 labels the others are compared with")
+
+    def handle(self, *args, **options):
+        import torch
+
+        directory = options['directory']
+        paths = [
+            os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.lower().endswith(('.jpg', '.jpeg', '.png'))
+        ]
+        inputs = [image for image in batching.preprocess(paths) if image is not None]
+        if not inputs:
+            raise CommandError(f"No readable images in {directory}")
+
+        backends = options['backends'].split(',')
+        reference = options['reference']
+        if reference not in backends:
+            backends.insert(0, reference)
+
+        batch_size = options['batch_size']
+        predictions = {}
+
+        self.stdout.write(f"{len(inputs)} images, {torch.get_num_threads()} torch threads")
+        for backend in backends:
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.perf_counter()
+            resnet.get_model(backend)
+            load_time = time.perf_counter() - start
+            rss_growth = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+
+            resnet.predict_tags_local(inputs[:1], backend=backend)
+
+            latencies = []
+            for image in inputs:
+                start = time.perf_counter()
+                resnet.predict_tags_local([image], backend=backend)
+                latencies.append(time.perf_counter() - start)
+
+            tags = []
+            start = time.perf_counter()
+            for i in range(0, len(inputs), batch_size):
+                tags.extend(resnet.predict_tags_local(inputs[i:i + batch_size], backend=backend))
+            throughput = len(inputs) / (time.perf_counter() - start)
+            predictions[backend] = tags
+
+            overlap = statistics.mean(
+                len(set(a) & set(b)) / 5
+                for a, b in zip(tags, predictions[reference])
+            )
+
+            self.stdout.write(
+                f"{backend:>13}: p50 {statistics.median(latencies) * 1000:7.1f} ms/image, "
+                f"{throughput:7.2f} images/s @ batch {batch_size}, "
+                f"load {load_time:5.1f}s, peak RSS +{rss_growth:6.1f} MiB, "
+                f"top-5 overlap vs {reference} {overlap:.1%}"
+            )
@@ -0,0 +1,43 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from images.ml import batching
+
+
+class Command(BaseCommand):
+    help = "Reports auto-tagger throughput (images/second) at different batch sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help="Directory of sample images")
+        parser.add_argument('--batch-sizes', default='1,4,8,16,32')
+        parser.add_argument('--threads', type=int, default=None,
+                            help="Preprocessing threads (defaults to AUTO_TAG_PREPROCESS_THREADS)")
+
+    def handle(self, *args, **options):
+        from images.ml.resnet import predict_tags_batch
+
+        directory = options['directory']
+        paths = [
+            os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.lower().endswith(('.jpg', '.jpeg', '.png'))
+        ]
+        if not paths:
+            raise CommandError(f"No images found in {directory}")
+
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',')]
+
+        # Warm-up so lazy initialisation is not billed to the first size.
+        predict_tags_batch([image for image in batching.preprocess(paths[:1]) if image])
+
+        self.stdout.write(f"{len(paths)} images")
+        for batch_size in batch_sizes:
+            start = time.perf_counter()
+            for i in range(0, len(paths), batch_size):
+                inputs = batching.preprocess(paths[i:i + batch_size], options['threads'])
+                predict_tags_batch([image for image in inputs if image is not None])
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"batch {batch_size:>3}: {len(paths) / elapsed:8.2f} images/s ({elapsed:.2f}s)"
+            )
@@ -0,0 +1,85 @@
+import random
+import string
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from accounts.lookup import UserIndex
+
+
+def _word(rng, low, high):
+    return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(low, high)))
+
+
+def _percentiles(timings):
+    timings = sorted(timings)
+    return timings[len(timings) // 2] * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+
+
+class Command(BaseCommand):
+    help = "Measures user search latency on a synthetic user index and the old icontains path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000,
+                            help="Synthetic users in the index")
+        parser.add_argument('--contacts', type=int, default=50,
+                            help="Contacts of the searching user")
+        parser.add_argument('--queries', type=int, default=2000,
+                            help="Prefixes looked up")
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        rows = [
+            (user_id, f'{_word(rng, 3, 8)}{rng.randint(0, 99)}', _word(rng, 3, 8).title(),
+             _word(rng, 4, 10).title(), int(rng.paretovariate(1.5)) - 1)
+            for user_id in range(1, options['users'] + 1)
+        ]
+
+        start = time.perf_counter()
+        index = UserIndex(rows)
+        self.stdout.write(
+            f"{len(rows)} users, {len(index.keys)} keys, built in {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+
+        contacts = [row[0] for row in rng.sample(rows, options['contacts'])]
+
+        # Keystrokes: every prefix of a username, full name or last name.
+        prefixes = []
+        while len(prefixes) < options['queries']:
+            _, username, first_name, last_name, _ = rng.choice(rows)
+            text = rng.choice((username, f'{first_name} {last_name}', last_name)).lower()
+            prefixes.extend(text[:length] for length in range(1, min(len(text), 6) + 1))
+        prefixes = prefixes[:options['queries']]
+
+        for label, lookup_prefixes in (
+            ('1-2 chars', [prefix for prefix in prefixes if len(prefix) <= 2]),
+            ('3+ chars', [prefix for prefix in prefixes if len(prefix) > 2]),
+        ):
+            timings = []
+            for prefix in lookup_prefixes:
+                started = time.perf_counter()
+                index.lookup(prefix, options['limit'], contacts)
+                timings.append(time.perf_counter() - started)
+            p50, p99 = _percentiles(timings)
+            self.stdout.write(f"{label:>10}: p50 {p50:7.1f} us, p99 {p99:7.1f} us")
+
+        if not User.objects.exists():
+            return
+
+        # The old endpoint: username__icontains over the whole table.
+        usernames = list(User.objects.values_list('username', flat=True)[:200])
+        timings = []
+        for username in usernames:
+            started = time.perf_counter()
+            [
+                {'id': u.id, 'username': u.username, 'email': u.email}
+                for u in User.objects.filter(username__icontains=username[:3])[:20]
+            ]
+            timings.append(time.perf_counter() - started)
+        p50, p99 = _percentiles(timings)
+        self.stdout.write(
+            f"icontains on {User.objects.count()} database users: p50 {p50:7.1f} us, p99 {p99:7.1f} us"
+        )
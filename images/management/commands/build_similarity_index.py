@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from images.ml import embeddings
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the IVF index for similar-image search and saves it next to the "
+        "embedding store. The rebuild_similarity_index beat task does the same once "
+        "the store passes EMBEDDING_IVF_THRESHOLD images."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--if-needed', action='store_true',
+                            help="Skip the build below the threshold or while the saved index is current")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rows = embeddings.rebuild(force=not options['if_needed'])
+        if rows is None:
+            self.stdout.write("No build needed, or another build is running")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {rows} rows in {time.perf_counter() - start:.1f}s"
+        ))
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from images import search
+from images.management import checkpoint as checkpoints
+from images.models import Image
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the full-text search document of every image. Needed once for "
+        "images uploaded before search existed; signals keep it current after that. "
+        "Safe to interrupt: rerunning resumes from the checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=search.REFRESH_BATCH_SIZE,
+                            help="Images per upsert; a checkpoint is written after each")
+        parser.add_argument('--checkpoint', default='rebuild_search_index.checkpoint',
+                            help="File recording the last processed image id")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore the checkpoint and scan from the first image")
+        parser.add_argument('--missing', action='store_true',
+                            help="Only images without a search document")
+
+    def handle(self, *args, **options):
+        images = Image.objects.all()
+        if options['missing']:
+            images = images.filter(search_document__isnull=True)
+
+        checkpoint = options['checkpoint']
+        last_id = 0 if options['restart'] else checkpoints.read(checkpoint)
+        if last_id:
+            self.stdout.write(f"Resuming after image {last_id}")
+
+        start = time.perf_counter()
+        processed = 0
+        while True:
+            ids = list(
+                images.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:options['chunk_size']]
+            )
+            if not ids:
+                break
+
+            search.refresh(ids)
+            processed += len(ids)
+            last_id = ids[-1]
+            checkpoints.write(checkpoint, last_id)
+
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{processed} documents, {processed / elapsed:.0f}/s, last id {last_id}")
+
+        checkpoints.clear(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {processed} documents in {time.perf_counter() - start:.1f}s"
+        ))
@@ -0,0 +1,84 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from images.management import checkpoint as checkpoints
+from images.ml import batching
+from images.ml.resnet import model_version
+from images.models import Image
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-runs the auto-tagger over images whose tags were produced by another "
+        "model version. Safe to interrupt: rerunning resumes from the checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=512,
+                            help="Image ids fetched per query")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Images per forward pass (defaults to AUTO_TAG_BATCH_SIZE)")
+        parser.add_argument('--checkpoint', default=None,
+                            help="File recording the last processed image id "
+                                 "(defaults to one per model version)")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore the checkpoint and scan from the first image")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Stop after this many images")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only count the stale images")
+
+    def handle(self, *args, **options):
+        version = model_version()
+        batch_size = options['batch_size'] or settings.AUTO_TAG_BATCH_SIZE
+        # A checkpoint left by a run with another model says nothing about
+        # which images this one has reached.
+        checkpoint = options['checkpoint'] or f"retag_images.{version.replace('/', '_')}.checkpoint"
+
+        stale = Image.objects.filter(is_deleted=False).exclude(auto_tag_version=version)
+
+        if options['dry_run']:
+            self.stdout.write(f"{stale.count()} images not tagged by {version}")
+            return
+
+        last_id = 0 if options['restart'] else checkpoints.read(checkpoint)
+        if last_id:
+            self.stdout.write(f"Resuming after image {last_id}")
+
+        self.stdout.write(f"Re-tagging with {version}")
+        start = time.perf_counter()
+        processed = tagged = 0
+        limit = options['limit']
+
+        while limit is None or processed < limit:
+            size = options['chunk_size'] if limit is None else min(options['chunk_size'], limit - processed)
+            # Keyset pagination on the primary key: each chunk is an index
+            # range scan no matter how far into the archive we are.
+            ids = list(
+                stale.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:size]
+            )
+            if not ids:
+                break
+
+            for i in range(0, len(ids), batch_size):
+                tagged += len(batching.tag_images(ids[i:i + batch_size]))
+
+            processed += len(ids)
+            last_id = ids[-1]
+            checkpoints.write(checkpoint, last_id)
+
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{processed} images ({tagged} tagged, {processed - tagged} failed), "
+                f"{processed / elapsed:.1f} images/s, last id {last_id}"
+            )
+
+        if limit is None or processed < limit:
+            # A full pass is done; the next model version starts from scratch.
+            checkpoints.clear(checkpoint)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {tagged} re-tagged, {processed - tagged} failed"
+        ))
@@ -0,0 +1,25 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from images.ml import server
+
+
+class Command(BaseCommand):
+    help = "Runs the shared auto-tagger inference server on a Unix socket."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.AUTO_TAG_SOCKET)
+        parser.add_argument('--max-batch', type=int, default=settings.AUTO_TAG_BATCH_SIZE * 2)
+        parser.add_argument('--window', type=float, default=0.01,
+                            help="Seconds to wait for more requests before a forward pass")
+        parser.add_argument('--threads', type=int, default=os.cpu_count() or 1,
+                            help="torch intra-op threads; one pool for the whole host")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Serving tagger on {options['socket']} "
+            f"(max batch {options['max_batch']}, {options['threads']} threads)"
+        )
+        server.serve(options['socket'], options['max_batch'], options['window'], options['threads'])
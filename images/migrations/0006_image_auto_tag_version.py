@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0005_uploadjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='auto_tag_version',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
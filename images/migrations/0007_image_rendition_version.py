@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-17 23:58
+
+from django.db import migrations, models
+
+
+def mark_existing_renditions(apps, schema_editor):
+    # Images that already have both renditions are current; the rest are
+    # left at 0 for backfill_renditions.
+    Image = apps.get_model('images', 'Image')
+    Image.objects.exclude(thumbnail='').exclude(thumbnail__isnull=True).exclude(
+        watermarked_image=''
+    ).exclude(watermarked_image__isnull=True).update(rendition_version=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0006_image_auto_tag_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='rendition_version',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['rendition_version', 'id'], name='image_rendition_idx'),
+        ),
+        migrations.RunPython(mark_existing_renditions, migrations.RunPython.noop),
+    ]
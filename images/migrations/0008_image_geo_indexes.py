@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0007_image_rendition_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['gps_latitude', 'gps_longitude'], name='image_geo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['event', 'gps_latitude', 'gps_longitude'], name='image_event_geo_idx'),
+        ),
+    ]
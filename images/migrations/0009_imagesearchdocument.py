@@ -0,0 +1,94 @@
+# Generated by Django 6.0 on 2026-10-18 00:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+POSTGRES_INDEX = [
+    """
+    ALTER TABLE images_imagesearchdocument ADD COLUMN vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(tags, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(event, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(photographer, '')), 'C') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'D')
+    ) STORED
+    """,
+    "CREATE INDEX images_imagesearchdocument_vector_idx ON images_imagesearchdocument USING GIN (vector)",
+]
+
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE images_imagesearchdocument_fts USING fts5(
+        title, tags, event, photographer, description,
+        content='images_imagesearchdocument', content_rowid='image_id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER images_imagesearchdocument_ai AFTER INSERT ON images_imagesearchdocument BEGIN
+        INSERT INTO images_imagesearchdocument_fts(rowid, title, tags, event, photographer, description)
+        VALUES (new.image_id, new.title, new.tags, new.event, new.photographer, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER images_imagesearchdocument_ad AFTER DELETE ON images_imagesearchdocument BEGIN
+        INSERT INTO images_imagesearchdocument_fts(images_imagesearchdocument_fts, rowid, title, tags, event, photographer, description)
+        VALUES ('delete', old.image_id, old.title, old.tags, old.event, old.photographer, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER images_imagesearchdocument_au AFTER UPDATE ON images_imagesearchdocument BEGIN
+        INSERT INTO images_imagesearchdocument_fts(images_imagesearchdocument_fts, rowid, title, tags, event, photographer, description)
+        VALUES ('delete', old.image_id, old.title, old.tags, old.event, old.photographer, old.description);
+        INSERT INTO images_imagesearchdocument_fts(rowid, title, tags, event, photographer, description)
+        VALUES (new.image_id, new.title, new.tags, new.event, new.photographer, new.description);
+    END
+    """,
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS images_imagesearchdocument_vector_idx",
+    "ALTER TABLE images_imagesearchdocument DROP COLUMN IF EXISTS vector",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS images_imagesearchdocument_ai",
+    "DROP TRIGGER IF EXISTS images_imagesearchdocument_ad",
+    "DROP TRIGGER IF EXISTS images_imagesearchdocument_au",
+    "DROP TABLE IF EXISTS images_imagesearchdocument_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # The full-text index is backend-specific and invisible to the ORM;
+        # other backends search the document columns with icontains.
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0008_image_geo_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageSearchDocument',
+            fields=[
+                ('image', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='images.image')),
+                ('title', models.TextField(blank=True, default='')),
+                ('description', models.TextField(blank=True, default='')),
+                ('event', models.TextField(blank=True, default='')),
+                ('tags', models.TextField(blank=True, default='')),
+                ('photographer', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_INDEX, 'sqlite': SQLITE_INDEX}),
+            _run({'postgresql': POSTGRES_DROP, 'sqlite': SQLITE_DROP}),
+        ),
+    ]
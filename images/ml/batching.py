@@ -0,0 +1,186 @@
+"""
+Micro-batching for the auto-tagger.
+
+Instead of one batch-size-1 forward pass per upload, image ids are pushed
+onto a Redis list. The first id to arrive schedules `auto_tag_batch` after
+a short window; that task drains the list in chunks of up to
+AUTO_TAG_BATCH_SIZE, runs a single batched forward pass and writes every
+ImageTag row with one bulk_create. The same pass yields each image's
+embedding, which is appended to the similarity store (images.ml.embeddings).
+
+process_image already decodes the original once for its renditions, so it
+hands over the tagger input it derived from that decode: the raw RGB pixels
+are stored next to the id for up to INPUT_TTL seconds. Only images queued
+without one (retag_images, or inputs that expired) are decoded again, on a
+thread pool.
+"""
+import logging
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'auto_tag:pending'
+SCHEDULED_KEY = 'auto_tag:scheduled'
+INPUT_KEY = 'auto_tag:input:{}'
+
+# Seconds a handed-over tagger input waits for its batch before the image
+# has to be decoded again.
+INPUT_TTL = 3600
+
+# Width and height ahead of the RGB bytes of a stored tagger input.
+_SIZE = struct.Struct('>HH')
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.AUTO_TAG_REDIS_URL)
+    return _client
+
+
+def _pack(image):
+    return _SIZE.pack(*image.size) + image.tobytes()
+
+
+def _unpack(data):
+    from PIL import Image as PILImage
+
+    size = _SIZE.unpack_from(data)
+    return PILImage.frombytes('RGB', size, data[_SIZE.size:])
+
+
+def enqueue(image_id, ml_input=None):
+    """
+    Queues an image for the next batch, or tags it inline without Redis.
+    `ml_input` is the tagger input if the caller already decoded the image.
+    """
+    from images.tasks import auto_tag_batch
+
+    try:
+        client = get_client()
+        pipe = client.pipeline()
+        if ml_input is not None:
+            pipe.set(INPUT_KEY.format(image_id), _pack(ml_input), ex=INPUT_TTL)
+        pipe.rpush(PENDING_KEY, image_id)
+        pipe.execute()
+        # Only the first id in a window schedules the drain.
+        window = settings.AUTO_TAG_BATCH_WINDOW
+        if client.set(SCHEDULED_KEY, 1, nx=True, ex=max(1, int(window * 4))):
+            auto_tag_batch.apply_async(countdown=window)
+    except redis.RedisError as e:
+        logger.warning(f"Auto-tag batch queue unavailable, tagging inline: {str(e)}")
+        tag_images([image_id], {image_id: ml_input} if ml_input is not None else None)
+
+
+def drain():
+    """Tags every queued image, one batch at a time. Returns images tagged."""
+    client = get_client()
+    client.delete(SCHEDULED_KEY)
+
+    total = 0
+    while True:
+        ids = client.lpop(PENDING_KEY, settings.AUTO_TAG_BATCH_SIZE)
+        if not ids:
+            return total
+        ids = [int(image_id) for image_id in ids]
+        keys = [INPUT_KEY.format(image_id) for image_id in ids]
+        inputs = {
+            image_id: _unpack(data)
+            for image_id, data in zip(ids, client.mget(keys))
+            if data is not None
+        }
+        total += len(tag_images(ids, inputs))
+        client.delete(*keys)
+
+
+def _load(path):
+    from images import processing
+
+    try:
+        return processing.run(path, steps=('tags',))['tags']
+    except Exception:
+        return None
+
+
+def preprocess(paths, workers=None):
+    """Decodes `paths` into tagger inputs; None marks files that failed."""
+    # PIL releases the GIL while decoding, so threads scale across cores.
+    workers = workers or settings.AUTO_TAG_PREPROCESS_THREADS
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_load, paths))
+
+
+def tag_images(image_ids, inputs=None):
+    """
+    Runs one batched inference over `image_ids` and stores the tags.
+    `inputs` maps image ids to tagger inputs already decoded; the other
+    images are read from disk.
+    """
+    from images import search
+    from images.models import Image
+    from images.ml import embeddings
+    from images.ml.resnet import infer, model_version
+    from tags.models import Tag, ImageTag
+
+    images = list(
+        Image.objects.filter(pk__in=image_ids).only('id', 'original_image')
+    )
+    if not images:
+        return {}
+
+    inputs = dict(inputs or {})
+    missing = [image for image in images if image.pk not in inputs]
+    if missing:
+        inputs.update(zip(
+            (image.pk for image in missing),
+            preprocess([image.original_image.path for image in missing]),
+        ))
+
+    loaded, failed = [], []
+    for image in images:
+        ml_input = inputs[image.pk]
+        if ml_input is None:
+            failed.append(image.pk)
+        else:
+            loaded.append((image, ml_input))
+
+    if failed:
+        logger.warning(f"Auto-tag could not decode images {failed}")
+    if not loaded:
+        return {}
+
+    predictions, vectors = infer([ml_input for _, ml_input in loaded])
+    results = {image.pk: names for (image, _), names in zip(loaded, predictions)}
+
+    tags = Tag.objects.resolve(name for names in predictions for name in names)
+
+    with transaction.atomic():
+        # Whatever an earlier run (of any model version) produced is
+        # replaced; tags people added are never touched.
+        ImageTag.objects.filter(image_id__in=results, source='AUTO').delete()
+        ImageTag.objects.bulk_create(
+            [
+                ImageTag(image_id=image_id, tag=tags[name], added_by=None, source='AUTO')
+                for image_id, names in results.items()
+                for name in names
+            ],
+            ignore_conflicts=True,
+        )
+        Image.objects.filter(pk__in=results).update(auto_tag_version=model_version())
+        # bulk_create sends no post_save signals.
+        search.refresh(results)
+
+    try:
+        embeddings.append([image.pk for image, _ in loaded], vectors)
+    except OSError as e:
+        logger.warning(f"Could not store embeddings for {list(results)}: {str(e)}")
+
+    return results
+
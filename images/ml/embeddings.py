@@ -0,0 +1,349 @@
+"""
+Image embeddings and similarity search.
+
+The auto-tagger already computes a 2048-d penultimate-layer feature vector
+for every image; instead of throwing it away, it is appended to a flat store
+under EMBEDDING_STORE_DIR:
+
+    vectors.f16   float16 rows, L2-normalised, so cosine similarity is a dot
+                  product (4 KiB per image)
+    ids.i64       the image id of each row
+
+Both files are append-only and read through np.memmap, so opening the store
+costs nothing and only the pages a search touches are read. Re-tagging an
+image appends a new row; the last row for an id wins.
+
+Search is an exact, chunked matrix-vector product up to
+EMBEDDING_IVF_THRESHOLD rows. Above that, an inverted-file index (spherical
+k-means over the vectors) lets a search scan only the EMBEDDING_IVF_NPROBE
+closest lists. The IVF index is built outside the web process, by the
+`rebuild_similarity_index` task on a beat schedule or the
+`build_similarity_index` command, and saved next to the store:
+
+    ivf.npz       centroids, and the indexed rows grouped by list
+
+Web processes load the saved index and scan rows appended after it was
+built exactly; until one is saved, every search is exact.
+"""
+import fcntl
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+DIM = 2048
+
+VECTORS_FILE = 'vectors.f16'
+IDS_FILE = 'ids.i64'
+IVF_FILE = 'ivf.npz'
+LOCK_FILE = '.lock'
+BUILD_LOCK_FILE = '.build.lock'
+
+# Rows converted to float32 at a time while scanning.
+SCAN_CHUNK = 65536
+
+# Rows assigned to centroids at a time while building the IVF index, which
+# bounds the float32 copies and the (chunk, lists) score matrix to a few
+# tens of MB.
+KMEANS_CHUNK = 4096
+
+# Rows appended since the IVF index was built are scanned exactly; rebuild
+# once they reach this fraction of the indexed rows.
+REBUILD_FRACTION = 0.1
+
+_lock = threading.Lock()
+_index = None
+# os.stat of the IVF file behind _index, to notice a new build.
+_ivf_stamp = None
+
+
+def _path(name):
+    return os.path.join(settings.EMBEDDING_STORE_DIR, name)
+
+
+def append(image_ids, vectors):
+    """Appends one row per image id. `vectors` is an (n, DIM) array."""
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, DIM)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = (vectors / np.maximum(norms, 1e-12)).astype(np.float16)
+    ids = np.asarray(image_ids, dtype=np.int64)
+
+    os.makedirs(settings.EMBEDDING_STORE_DIR, exist_ok=True)
+    with open(_path(LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # Vectors first: readers size the store by the ids file, so a row is
+        # only visible once both halves are on disk.
+        with open(_path(VECTORS_FILE), 'ab') as f:
+            f.write(vectors.tobytes())
+        with open(_path(IDS_FILE), 'ab') as f:
+            f.write(ids.tobytes())
+
+
+def load():
+    """Returns (ids, vectors) for the current store, memory-mapped."""
+    try:
+        ids = np.memmap(_path(IDS_FILE), dtype=np.int64, mode='r')
+        rows = min(len(ids), os.path.getsize(_path(VECTORS_FILE)) // (DIM * 2))
+    except (FileNotFoundError, ValueError):
+        # ValueError: the ids file exists but is still empty.
+        return np.empty(0, dtype=np.int64), np.empty((0, DIM), dtype=np.float16)
+
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((0, DIM), dtype=np.float16)
+
+    vectors = np.memmap(_path(VECTORS_FILE), dtype=np.float16, mode='r', shape=(rows, DIM))
+    return ids[:rows], vectors
+
+
+def _latest_rows(ids):
+    """Row number of the last occurrence of each id."""
+    unique, first_from_end = np.unique(ids[::-1], return_index=True)
+    return unique, len(ids) - 1 - first_from_end
+
+
+def _top_k(scores, rows, k):
+    if len(scores) > k:
+        best = np.argpartition(-scores, k)[:k]
+        scores, rows = scores[best], rows[best]
+    order = np.argsort(-scores)
+    return scores[order], rows[order]
+
+
+def _scan(vectors, rows, query, k):
+    """Exact top-k over `rows` of `vectors`, converting one chunk at a time."""
+    best_scores = np.empty(0, dtype=np.float32)
+    best_rows = np.empty(0, dtype=np.int64)
+    for start in range(0, len(rows), SCAN_CHUNK):
+        chunk = rows[start:start + SCAN_CHUNK]
+        scores = vectors[chunk].astype(np.float32) @ query
+        best_scores, best_rows = _top_k(
+            np.concatenate([best_scores, scores]),
+            np.concatenate([best_rows, chunk]),
+            k,
+        )
+    return best_scores, best_rows
+
+
+def _assign(vectors, centroids, rows=None):
+    """
+    Index of the closest centroid for each row of `vectors` (or for each of
+    `rows`), converting KMEANS_CHUNK rows to float32 at a time. Yields
+    (start, float32 chunk, assignment) per chunk.
+    """
+    count = len(vectors) if rows is None else len(rows)
+    for start in range(0, count, KMEANS_CHUNK):
+        if rows is None:
+            chunk = vectors[start:start + KMEANS_CHUNK]
+        else:
+            chunk = vectors[rows[start:start + KMEANS_CHUNK]]
+        chunk = np.asarray(chunk, dtype=np.float32)
+        yield start, chunk, np.argmax(chunk @ centroids.T, axis=1)
+
+
+def _kmeans(sample, n_lists, iterations=10, seed=0):
+    """
+    Spherical k-means over `sample` (float16 rows); returns unit-length
+    float32 centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        sums = np.zeros_like(centroids)
+        sizes = np.zeros(n_lists, dtype=np.int64)
+        for _, chunk, assignment in _assign(sample, centroids):
+            np.add.at(sums, assignment, chunk)
+            sizes += np.bincount(assignment, minlength=n_lists)
+        empty = sizes == 0
+        # Re-seed empty lists so every centroid keeps pulling its weight.
+        sums[empty] = sample[rng.choice(len(sample), empty.sum(), replace=False)]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+def build_ivf(ids, vectors):
+    """
+    Clusters the live rows of the store into sqrt(n) lists. Returns
+    (centroids, list_rows, list_bounds): list i holds the rows
+    list_rows[list_bounds[i]:list_bounds[i + 1]].
+    """
+    _, rows = _latest_rows(ids)
+    live = np.sort(rows)
+
+    n_lists = int(np.sqrt(len(live)))
+    rng = np.random.default_rng(0)
+    sample_rows = np.sort(rng.choice(live, min(len(live), n_lists * 64), replace=False))
+    centroids = _kmeans(np.asarray(vectors[sample_rows]), n_lists)
+
+    assignment = np.empty(len(live), dtype=np.int64)
+    for start, chunk, chunk_assignment in _assign(vectors, centroids, live):
+        assignment[start:start + len(chunk)] = chunk_assignment
+
+    order = np.argsort(assignment, kind='stable')
+    return centroids, live[order], np.searchsorted(assignment[order], np.arange(n_lists + 1))
+
+
+def save_ivf(size, ivf):
+    """Saves an IVF index over the first `size` rows of the store."""
+    centroids, list_rows, list_bounds = ivf
+    path = _path(IVF_FILE)
+    partial = f'{path}.{os.getpid()}.partial'
+    with open(partial, 'wb') as f:
+        np.savez(f, size=size, centroids=centroids, list_rows=list_rows, list_bounds=list_bounds)
+    os.replace(partial, path)
+
+
+def load_ivf():
+    """Returns (size, (centroids, list_rows, list_bounds)) or None."""
+    try:
+        with np.load(_path(IVF_FILE)) as saved:
+            return int(saved['size']), (saved['centroids'], saved['list_rows'], saved['list_bounds'])
+    except FileNotFoundError:
+        return None
+
+
+def rebuild(force=False):
+    """
+    Builds and saves the IVF index if the store has reached
+    EMBEDDING_IVF_THRESHOLD images and the saved index is missing or has
+    fallen REBUILD_FRACTION behind. Returns the rows indexed, or None if no
+    build was needed.
+    """
+    os.makedirs(settings.EMBEDDING_STORE_DIR, exist_ok=True)
+    with open(_path(BUILD_LOCK_FILE), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another build is running.
+            return None
+
+        ids, vectors = load()
+        if not force:
+            if len(np.unique(ids)) < settings.EMBEDDING_IVF_THRESHOLD:
+                return None
+            saved = load_ivf()
+            if saved is not None and saved[0] <= len(ids) < saved[0] * (1 + REBUILD_FRACTION):
+                return None
+
+        if not len(ids):
+            return None
+        save_ivf(len(ids), build_ivf(ids, vectors))
+        return len(ids)
+
+
+class SimilarityIndex:
+    """
+    Snapshot of the store's first len(ids) rows: scanned exactly, or through
+    `ivf` (as returned by build_ivf) when one covers those rows.
+    """
+
+    def __init__(self, ids, vectors, ivf=None, nprobe=None):
+        self.ids = ids
+        self.vectors = vectors
+        self.size = len(ids)
+        self.nprobe = nprobe or settings.EMBEDDING_IVF_NPROBE
+
+        unique, rows = _latest_rows(ids)
+        self.row_of = dict(zip(unique.tolist(), rows.tolist()))
+        self.live = np.sort(rows)
+
+        self.centroids = None
+        if ivf is not None:
+            self.centroids, self.list_rows, self.list_bounds = ivf
+
+    def vector(self, image_id):
+        row = self.row_of.get(image_id)
+        if row is None:
+            return None
+        return self.vectors[row].astype(np.float32)
+
+    def search(self, query, k):
+        """Returns [(image_id, score)] for the k rows most similar to `query`."""
+        if self.centroids is None:
+            rows = self.live
+        else:
+            probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+            rows = np.concatenate([
+                self.list_rows[self.list_bounds[i]:self.list_bounds[i + 1]] for i in probes
+            ])
+        scores, rows = _scan(self.vectors, rows, query, k)
+        return list(zip(self.ids[rows].tolist(), scores.tolist()))
+
+
+def _stamp():
+    try:
+        stat = os.stat(_path(IVF_FILE))
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_index():
+    """
+    Returns a process-wide SimilarityIndex. It is reloaded whenever a new
+    IVF index has been saved; without one, it is rebuilt as an exact index
+    once the store has grown by REBUILD_FRACTION. Never builds an IVF index
+    itself: that is left to `rebuild`.
+    """
+    global _index, _ivf_stamp
+    ids, vectors = load()
+
+    with _lock:
+        stamp = _stamp()
+        if stamp != _ivf_stamp:
+            _ivf_stamp = stamp
+            saved = load_ivf() if stamp is not None else None
+            if saved is not None and saved[0] <= len(ids):
+                size, ivf = saved
+                _index = SimilarityIndex(ids[:size], vectors[:size], ivf)
+            else:
+                _index = None
+
+        # Rows past index.size are scanned exactly by `similar`, so an exact
+        # index only needs rebuilding once that tail has grown.
+        if _index is None or _index.size > len(ids) or (
+            _index.centroids is None
+            and len(ids) != _index.size
+            and len(ids) - _index.size >= _index.size * REBUILD_FRACTION
+        ):
+            _index = SimilarityIndex(ids, vectors)
+        index = _index
+
+    return index, ids, vectors
+
+
+def similar(image_id, k):
+    """
+    Returns [(image_id, score)] for up to k images most similar to
+    `image_id`, best first, excluding the image itself. Returns None if the
+    image has no stored embedding.
+    """
+    index, ids, vectors = get_index()
+
+    tail_row_of = {}
+    if len(ids) > index.size:
+        tail_ids, tail_rows = _latest_rows(ids[index.size:])
+        tail_row_of = dict(zip(tail_ids.tolist(), (tail_rows + index.size).tolist()))
+
+    if image_id in tail_row_of:
+        query = vectors[tail_row_of[image_id]].astype(np.float32)
+    else:
+        query = index.vector(image_id)
+    if query is None:
+        return None
+
+    # Rows appended since the index was built supersede indexed ones.
+    matches = [
+        (match_id, score) for match_id, score in index.search(query, k + 1)
+        if match_id not in tail_row_of
+    ]
+    if tail_row_of:
+        tail_scores, found = _scan(vectors, np.array(sorted(tail_row_of.values())), query, k + 1)
+        matches += list(zip(ids[found].tolist(), tail_scores.tolist()))
+
+    seen, results = {image_id}, []
+    for match_id, score in sorted(matches, key=lambda match: -match[1]):
+        if match_id not in seen:
+            seen.add(match_id)
+            results.append((match_id, score))
+    return results[:k]
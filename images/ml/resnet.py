@@ -1,33 +1,195 @@
-import torch
-from torchvision import models, transforms
-from torchvision.models import ResNet50_Weights
+"""
+ResNet50 auto-tagger.
+
+AUTO_TAG_BACKEND selects how the network runs: 'eager' (FP32), 'torchscript'
+(traced, frozen and optimized for inference) or 'int8-static' (torchvision's
+statically quantized FBGEMM ResNet50, the only int8 path: dynamic
+quantization would only reach the final fc layer and leave every
+convolution in FP32). `manage.py benchmark_tagger_backends` compares
+them on a fixed image set.
+
+Every tagged image records model_version() in Image.auto_tag_version, so
+`manage.py retag_images` can find the images tagged by an older model.
+
+torch and the model weights (~100 MB) are only loaded on first use, behind a
+lock, so importing this module is cheap. Web processes and management
+commands never pay for them; only Celery workers that actually tag do, and
+only when no per-host inference server (images.ml.server) is running.
+"""
+import threading
+
+from django.conf import settings
 from PIL import Image
 
-weights = ResNet50_Weights.IMAGENET1K_V1
-model = models.resnet50(weights=weights)
-model.eval()
+_lock = threading.Lock()
+_models = {}
+
+# Bump when the tagging pipeline changes in a way that alters its output
+# (preprocessing, top_k, label post-processing) so old tags count as stale.
+TAGGER_REVISION = 1
+
+# Weights behind each backend. Backends sharing weights produce the same
+# tags, so switching between them does not make the archive stale.
+BACKEND_WEIGHTS = {
+    'eager': 'imagenet1k-v1',
+    'torchscript': 'imagenet1k-v1',
+    'int8-static': 'fbgemm-v2-int8',
+}
+
+
+def _with_features(net):
+    """
+    Wraps a torchvision ResNet so forward() returns (logits, features), where
+    features is the 2048-d penultimate (pooled) activation.
+    """
+    import torch
+
+    class ResNetWithFeatures(torch.nn.Module):
+        def __init__(self, net):
+            super().__init__()
+            self.net = net
+
+        def forward(self, x):
+            net = self.net
+            # Statically quantized models wrap the network in quant stubs.
+            if hasattr(net, 'quant'):
+                x = net.quant(x)
+            x = net.maxpool(net.relu(net.bn1(net.conv1(x))))
+            x = net.layer4(net.layer3(net.layer2(net.layer1(x))))
+            features = torch.flatten(net.avgpool(x), 1)
+            logits = net.fc(features)
+            if hasattr(net, 'dequant'):
+                logits, features = net.dequant(logits), net.dequant(features)
+            return logits, features
+
+    return ResNetWithFeatures(net).eval()
+
+
+def _build_eager():
+    from torchvision import models
+    from torchvision.models import ResNet50_Weights
+
+    weights = ResNet50_Weights.IMAGENET1K_V1
+    net = models.resnet50(weights=weights)
+    return _with_features(net), weights.meta["categories"]
+
+
+def _build_torchscript():
+    import torch
+
+    model, labels = _build_eager()
+    with torch.no_grad():
+        traced = torch.jit.trace(model, torch.randn(1, 3, 224, 224))
+    return torch.jit.optimize_for_inference(torch.jit.freeze(traced)), labels
+
+
+def _build_int8_static():
+    from torchvision.models.quantization import resnet50, ResNet50_QuantizedWeights
+
+    weights = ResNet50_QuantizedWeights.IMAGENET1K_FBGEMM_V2
+    net = resnet50(weights=weights, quantize=True)
+    return _with_features(net), weights.meta["categories"]
+
+
+BACKENDS = {
+    'eager': _build_eager,
+    'torchscript': _build_torchscript,
+    'int8-static': _build_int8_static,
+}
 
-IMAGENET_LABELS = weights.meta["categories"]
 
-transform = transforms.Compose([
-    transforms.Resize(256),
-    transforms.CenterCrop(224),
-    transforms.ToTensor(),
-    transforms.Normalize(
-        mean=[0.485, 0.456, 0.406],
-        std=[0.229, 0.224, 0.225],
-    )
-])
+def _build_transform():
+    from torchvision import transforms
+
+    return transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(
+            mean=[0.485, 0.456, 0.406],
+            std=[0.229, 0.224, 0.225],
+        )
+    ])
+
+
+def model_version(backend=None):
+    """Marker stored on each image tagged with `backend`."""
+    backend = backend or settings.AUTO_TAG_BACKEND
+    return f"resnet50/{BACKEND_WEIGHTS[backend]}/r{TAGGER_REVISION}"
+
+
+def get_model(backend=None):
+    """
+    Returns (model, labels, transform) for `backend` (AUTO_TAG_BACKEND by
+    default), loading it once per process.
+    """
+    backend = backend or settings.AUTO_TAG_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown auto-tag backend '{backend}'")
+
+    if backend not in _models:
+        with _lock:
+            if backend not in _models:
+                model, labels = BACKENDS[backend]()
+                _models[backend] = (model, labels, _build_transform())
+
+    return _models[backend]
+
 
 def predict_tags(image_path, top_k=5):
     image = Image.open(image_path).convert("RGB")
-    tensor = transform(image).unsqueeze(0)
+    return predict_tags_for_image(image, top_k=top_k)
+
+
+def predict_tags_for_image(image, top_k=5):
+    return predict_tags_batch([image], top_k=top_k)[0]
+
+
+def predict_tags_batch(images, top_k=5):
+    return infer(images, top_k=top_k)[0]
+
+
+def predict_tags_local(images, top_k=5, backend=None):
+    return infer_local(images, top_k=top_k, backend=backend)[0]
+
+
+def infer(images, top_k=5):
+    """
+    Runs one batched forward pass over a list of RGB PIL images, through the
+    per-host inference server when one is running. Returns (tags,
+    embeddings): the top_k labels per image and an (n, 2048) float32 array
+    of L2-normalised penultimate-layer features.
+    """
+    if not images:
+        return [], None
+
+    from images.ml import server
+
+    result = server.infer(images, top_k=top_k)
+    if result is not None:
+        return result
+    return infer_local(images, top_k=top_k)
+
+
+def infer_local(images, top_k=5, backend=None):
+    """In-process inference; loads the model into this process if needed."""
+    if not images:
+        return [], None
+
+    import torch
+
+    model, labels, transform = get_model(backend)
+    tensor = torch.stack([transform(image) for image in images])
 
     with torch.no_grad():
-        outputs = model(tensor)
-        probs = torch.nn.functional.softmax(outputs[0], dim=0)
+        outputs, features = model(tensor)
+        probs = torch.nn.functional.softmax(outputs, dim=1)
+        embeddings = torch.nn.functional.normalize(features.float(), dim=1)
 
-    top_probs, top_idxs = torch.topk(probs, top_k)
+    top_probs, top_idxs = torch.topk(probs, top_k, dim=1)
 
-    tags = [IMAGENET_LABELS[idx.item()] for idx in top_idxs]
-    return tags
+    tags = [
+        [labels[idx] for idx in row]
+        for row in top_idxs.tolist()
+    ]
+    return tags, embeddings.numpy()
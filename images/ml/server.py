@@ -0,0 +1,191 @@
+"""
+Per-host inference server for the auto-tagger.
+
+Every prefork Celery process would otherwise load its own ResNet50 and its
+own torch thread pool. `manage.py run_tagger_server` starts one process that
+holds a single model and listens on a Unix socket; requests from all
+workers are merged into shared batches by a single inference thread.
+
+Wire format, both directions: a 4-byte big-endian length followed by that
+many bytes of JSON header. Requests follow it with one length-prefixed raw
+RGB buffer per image listed in the header; successful responses with one
+frame of float16 embeddings, row-major, `dim` values per image.
+"""
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct('>I')
+
+
+def _send_frame(sock, payload):
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("Connection closed mid-frame")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv_frame(sock):
+    (size,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    return _recv_exact(sock, size)
+
+
+def infer(images, top_k=5):
+    """
+    Runs `images` through the local server and returns (tags, embeddings).
+    Returns None when no server is running so callers can fall back to
+    in-process inference.
+    """
+    path = settings.AUTO_TAG_SOCKET
+    if not path or not os.path.exists(path):
+        return None
+
+    from images.processing import ml_input
+
+    # The model only looks at a 256px short side, so don't ship more.
+    images = [ml_input(image.convert('RGB')) for image in images]
+    header = {'top_k': top_k, 'sizes': [image.size for image in images]}
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(settings.AUTO_TAG_SERVER_TIMEOUT)
+            sock.connect(path)
+            _send_frame(sock, json.dumps(header).encode())
+            for image in images:
+                _send_frame(sock, image.tobytes())
+            response = json.loads(_recv_frame(sock))
+            if 'error' not in response:
+                vectors = _recv_frame(sock)
+    except OSError as e:
+        logger.warning(f"Tagger server unavailable, using in-process model: {str(e)}")
+        return None
+
+    if 'error' in response:
+        logger.warning(f"Tagger server failed: {response['error']}")
+        return None
+
+    import numpy as np
+
+    embeddings = np.frombuffer(vectors, dtype=np.float16).reshape(-1, response['dim'])
+    return response['tags'], embeddings.astype(np.float32)
+
+
+class InferenceBatcher:
+    """Merges concurrent requests into batches of at most `max_batch` images."""
+
+    def __init__(self, max_batch, window):
+        self.max_batch = max_batch
+        self.window = window
+        self.requests = queue.Queue()
+
+    def submit(self, images, top_k):
+        future = Future()
+        self.requests.put((images, top_k, future))
+        return future.result()
+
+    def run(self):
+        from images.ml.resnet import infer_local
+
+        while True:
+            batch = [self.requests.get()]
+            size = len(batch[0][0])
+            # Wait briefly for other workers' requests to share the pass.
+            # The window runs from the first request, so a steady trickle
+            # cannot hold the batch open.
+            deadline = time.monotonic() + self.window
+            while size < self.max_batch:
+                try:
+                    item = self.requests.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            top_k = max(item[1] for item in batch)
+            try:
+                tags, embeddings = infer_local(
+                    [image for images, _, _ in batch for image in images],
+                    top_k=top_k,
+                )
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for images, k, future in batch:
+                end = offset + len(images)
+                future.set_result((
+                    [row[:k] for row in tags[offset:end]],
+                    embeddings[offset:end],
+                ))
+                offset = end
+
+
+class TaggerRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            header = json.loads(_recv_frame(self.request))
+            images = [
+                Image.frombytes('RGB', tuple(size), _recv_frame(self.request))
+                for size in header['sizes']
+            ]
+            tags, embeddings = self.server.batcher.submit(images, header.get('top_k', 5))
+            response = {'tags': tags, 'dim': embeddings.shape[1]}
+        except Exception as e:
+            response, embeddings = {'error': str(e)}, None
+
+        try:
+            _send_frame(self.request, json.dumps(response).encode())
+            if embeddings is not None:
+                _send_frame(self.request, embeddings.astype('float16').tobytes())
+        except OSError:
+            pass
+
+
+class TaggerServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, batcher):
+        self.batcher = batcher
+        super().__init__(path, TaggerRequestHandler)
+
+
+def serve(path, max_batch, window, num_threads):
+    import torch
+    from images.ml.resnet import get_model
+
+    torch.set_num_threads(num_threads)
+    get_model()
+
+    if os.path.exists(path):
+        os.unlink(path)
+
+    batcher = InferenceBatcher(max_batch, window)
+    threading.Thread(target=batcher.run, daemon=True).start()
+
+    with TaggerServer(path, batcher) as server:
+        os.chmod(path, 0o660)
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(path)
@@ -1,7 +1,19 @@
+import os
+import uuid
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 
 
+class ImageQuerySet(models.QuerySet):
+	def visible_to(self, user):
+		query = models.Q(privacy="PUBLIC")
+		if user is not None and user.is_authenticated:
+			query |= models.Q(uploaded_by=user)
+		return self.filter(query, is_deleted=False)
+
+
 # Create your models here.
 class Image(models.Model):
 
@@ -34,8 +46,131 @@ class Image(models.Model):
 	uploaded_at = models.DateTimeField(auto_now_add=True)
 	uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 	is_deleted = models.BooleanField(default=False)
+	# 64-bit dHash of the original; see images.duplicates.
+	phash = models.BigIntegerField(null=True, blank=True, db_index=True)
+	duplicate_of = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, related_name="duplicates")
+	# images.ml.resnet.model_version() of the model behind the auto-tags.
+	auto_tag_version = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+	# images.processing.RENDITION_VERSION of the current thumbnail and
+	# watermarked copy; lower means missing or stale.
+	rendition_version = models.PositiveSmallIntegerField(default=0)
+
+	objects = ImageQuerySet.as_manager()
+
+	class Meta:
+		indexes = [
+			# Keyset pagination; see images.pagination.
+			models.Index(fields=["uploaded_at", "id"], name="image_uploaded_idx"),
+			models.Index(fields=["like_count", "id"], name="image_like_count_idx"),
+			models.Index(fields=["view_count", "id"], name="image_view_count_idx"),
+			models.Index(fields=["event", "uploaded_at", "id"], name="image_event_uploaded_idx"),
+			# backfill_renditions walks stale images in id order.
+			models.Index(fields=["rendition_version", "id"], name="image_rendition_idx"),
+			# Bounding-box scans for the map, globally and within an event.
+			models.Index(fields=["gps_latitude", "gps_longitude"], name="image_geo_idx"),
+			models.Index(fields=["event", "gps_latitude", "gps_longitude"], name="image_event_geo_idx"),
+		]
 
 	def __str__(self):
 		return self.title or f"Image {self.pk}"
 
 
+class UploadSession(models.Model):
+	"""
+	A resumable upload of one original. Chunks are appended to a partial file
+	under UPLOAD_SESSION_DIR; `received` is the next offset the server expects
+	and `checksum` the running hash chain over the chunks received so far.
+	"""
+
+	id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="upload_sessions")
+	event = models.ForeignKey("events.Event", on_delete=models.CASCADE)
+	privacy = models.CharField(max_length=10, choices=Image.PRIV_CHOICES, default="PUBLIC")
+	filename = models.CharField(max_length=255)
+	size = models.BigIntegerField()
+	received = models.BigIntegerField(default=0)
+	checksum = models.CharField(max_length=64, blank=True, default="")
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	@property
+	def path(self):
+		return os.path.join(settings.UPLOAD_SESSION_DIR, f"{self.id}.part")
+
+	def __str__(self):
+		return f"{self.filename} ({self.received}/{self.size})"
+
+
+class UploadJob(models.Model):
+	"""A bulk upload whose files are ingested in parallel by Celery."""
+
+	STATUS_CHOICES = [
+		("PENDING", "Pending"),
+		("RUNNING", "Running"),
+		("DONE", "Done"),
+	]
+
+	id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="upload_jobs")
+	event = models.ForeignKey("events.Event", on_delete=models.CASCADE)
+	privacy = models.CharField(max_length=10, choices=Image.PRIV_CHOICES, default="PUBLIC")
+	duplicates = models.CharField(max_length=10, blank=True, default="")
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+	created_at = models.DateTimeField(auto_now_add=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	def __str__(self):
+		return f"Upload job {self.id} ({self.status})"
+
+
+class UploadJobFile(models.Model):
+	STATUS_CHOICES = [
+		("PENDING", "Pending"),
+		("SUCCESS", "Success"),
+		("FAILED", "Failed"),
+	]
+
+	job = models.ForeignKey(UploadJob, on_delete=models.CASCADE, related_name="files")
+	filename = models.CharField(max_length=255)
+	path = models.CharField(max_length=500)
+	size = models.BigIntegerField()
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+	image = models.ForeignKey(Image, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+	error = models.TextField(blank=True, default="")
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		ordering = ['id']
+
+	def __str__(self):
+		return f"{self.filename} ({self.status})"
+
+
+class CounterFlush(models.Model):
+	"""A batch of buffered counter deltas that has been applied; see images.counters."""
+
+	batch = models.CharField(max_length=64, unique=True)
+	flushed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+	def __str__(self):
+		return self.batch
+
+
+class ImageSearchDocument(models.Model):
+	"""
+	The searchable text of one image, kept current by images.signals. The
+	full-text index over it (a tsvector column with a GIN index on
+	PostgreSQL, an FTS5 table on SQLite) lives outside the ORM; see
+	images.search.
+	"""
+
+	image = models.OneToOneField(Image, on_delete=models.CASCADE, primary_key=True, related_name="search_document")
+	title = models.TextField(blank=True, default="")
+	description = models.TextField(blank=True, default="")
+	event = models.TextField(blank=True, default="")
+	tags = models.TextField(blank=True, default="")
+	photographer = models.TextField(blank=True, default="")
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return f"Search document for image {self.image_id}"
@@ -0,0 +1,139 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class ImageCursorPagination(CursorPagination):
+    """
+    Keyset pagination for image listings.
+
+    Rows are ordered by the requested field and then by `id`, and the cursor
+    holds both values of the row it points at. The next page is every row
+    after `(value, id)` in that order, one range scan over the matching
+    `(field, id)` index however deep the page, with no OFFSET and no
+    COUNT(*). DRF's stock cursor only keeps the first field and breaks ties
+    with an offset, which on `like_count` and `view_count` (mostly zero, and
+    changing while people page) means OFFSET scans and skipped or repeated
+    rows.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('uploaded_at', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        field = super().get_ordering(request, queryset, view)[0]
+        if field.lstrip('-') in ('id', 'pk'):
+            return (field,)
+        return (field, '-id' if field.startswith('-') else 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Mirrors CursorPagination.paginate_queryset with a composite
+        # position. Every position is unique, so cursors never carry an
+        # offset and the parent's link building can be reused as is.
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = self.cursor.reverse, self.cursor.position
+
+        if reverse:
+            queryset = queryset.order_by(*(
+                field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering
+            ))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            try:
+                queryset = queryset.filter(self._after(self._decode_position(current_position), reverse))
+            except (ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _after(self, values, reverse):
+        """Rows strictly after `values` in the (possibly reversed) ordering."""
+        condition = None
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            step = Q(**equal, **{f'{name}__{lookup}': value})
+            condition = step if condition is None else condition | step
+            equal[name] = value
+
+        # Bounds the index range on the leading field; the OR above alone
+        # is not always planned as a range scan.
+        name = self.ordering[0].lstrip('-')
+        bound = 'lte' if self.ordering[0].startswith('-') != reverse else 'gte'
+        return Q(**{f'{name}__{bound}': values[0]}) & condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [
+            instance[field.lstrip('-')] if isinstance(instance, dict) else getattr(instance, field.lstrip('-'))
+            for field in ordering
+        ]
+        return json.dumps([str(value) for value in values], separators=(',', ':'))
+
+    def _decode_position(self, position):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+
+class EventImageCursorPagination(ImageCursorPagination):
+    """Newest-first pages for `events/{id}/images/`; the ordering is fixed."""
+    ordering = ('-uploaded_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+
+class DuplicateGroupPagination(PageNumberPagination):
+    """
+    Pages of near-duplicate groups for `events/{id}/duplicates/`. The groups
+    are clustered in memory, so plain page numbers over the list are enough;
+    only the images of the requested page are loaded and serialized.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,176 @@
+"""
+Single-decode processing pipeline for uploaded originals.
+
+The original is opened once. EXIF comes from the file header, and the
+thumbnail, the ML input and the watermarked rendition are all derived from
+the same decoded pixel buffer. When the full resolution is not needed (no
+watermark requested) JPEGs are decoded in draft mode, which lets libjpeg
+scale by 1/2, 1/4 or 1/8 while decoding.
+"""
+from io import BytesIO
+
+from PIL import Image as PILImage
+from PIL import ImageDraw, ImageFont
+
+from . import exif
+
+THUMBNAIL_SIZE = (400, 400)
+ML_INPUT_SIZE = 256
+WATERMARK_TEXT = "Watermarked image"
+
+ALL_STEPS = ('exif', 'thumbnail', 'watermark', 'tags')
+
+# Stored on Image.rendition_version once both renditions exist. Bump when
+# the thumbnail or watermark output changes so `manage.py
+# backfill_renditions` regenerates them.
+RENDITION_VERSION = 1
+
+# dHash compares horizontally adjacent pixels of a (HASH_SIZE + 1) x
+# HASH_SIZE greyscale thumbnail, giving a HASH_SIZE ** 2 = 64 bit hash.
+HASH_SIZE = 8
+
+
+def decode(path, steps=ALL_STEPS):
+    img = PILImage.open(path)
+    if 'watermark' not in steps:
+        # Both the thumbnail and the ML input fit inside 400x400, so let the
+        # JPEG decoder skip most of the pixels.
+        img.draft('RGB', THUMBNAIL_SIZE)
+    return img
+
+
+def extract_exif(img):
+    """
+    Reads camera and GPS fields from the already opened image's header.
+    Used for formats images.exif.read cannot parse without Pillow.
+    """
+    exif_data = img.getexif()
+    if not exif_data:
+        return {}
+
+    # Exposure fields live in the Exif sub-IFD, coordinates in the GPS IFD.
+    return exif.image_fields(
+        dict(exif_data), exif_data.get_ifd(exif.EXIF_IFD), exif_data.get_ifd(exif.GPS_IFD)
+    )
+
+
+def dhash(img):
+    """
+    64-bit difference hash of `img`, as a signed integer so it fits a
+    BigIntegerField. Near-identical images differ in only a few bits.
+    """
+    small = img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), PILImage.Resampling.BOX)
+    pixels = small.tobytes()
+
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def perceptual_hash(fp):
+    """dHash of an image file, decoded at the smallest JPEG draft scale."""
+    with PILImage.open(fp) as img:
+        img.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+        return dhash(img)
+
+
+def _fit(img, max_size):
+    # Like Image.thumbnail but returns a new image and leaves `img` intact.
+    width, height = img.size
+    scale = min(max_size[0] / width, max_size[1] / height, 1)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return img.resize(size, PILImage.Resampling.LANCZOS, reducing_gap=2.0)
+
+
+def _flatten(img):
+    # Convert RGBA/LA/P to RGB (for JPEG compatibility) on a white background
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        rgb_img = PILImage.new('RGB', img.size, (255, 255, 255))
+        rgb_img.paste(img, mask=img.split()[3])
+        return rgb_img
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def _encode(img, quality):
+    out = BytesIO()
+    img.save(out, format='JPEG', quality=quality)
+    return out.getvalue()
+
+
+def render_thumbnail(img):
+    return _encode(_fit(img, THUMBNAIL_SIZE), quality=85)
+
+
+def ml_input(img):
+    """Downscaled RGB copy with a short side of ML_INPUT_SIZE for the tagger."""
+    width, height = img.size
+    scale = min(ML_INPUT_SIZE / min(width, height), 1)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return img.resize(size, PILImage.Resampling.BILINEAR, reducing_gap=2.0)
+
+
+def render_watermark(img, watermark_text=WATERMARK_TEXT):
+    """
+    Draws the watermark onto `img` in place and returns the encoded JPEG.
+
+    Only a patch the size of the text is composited, instead of building two
+    full-resolution RGBA layers.
+    """
+    # Try to use a font, fallback to default
+    try:
+        font = ImageFont.truetype("arial.ttf", 40)
+    except OSError:
+        font = ImageFont.load_default()
+
+    bbox = ImageDraw.Draw(img).textbbox((0, 0), watermark_text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+
+    # Position: 20px from bottom-right
+    width, height = img.size
+    x = max(0, width - text_width - 20)
+    y = max(0, height - text_height - 20)
+
+    box = (x, y, min(width, x + bbox[2]), min(height, y + bbox[3]))
+    patch = img.crop(box).convert('RGBA')
+    overlay = PILImage.new('RGBA', patch.size, (255, 255, 255, 0))
+    ImageDraw.Draw(overlay).text((0, 0), watermark_text, fill=(255, 255, 255, 128), font=font)
+    img.paste(PILImage.alpha_composite(patch, overlay).convert(img.mode), box[:2])
+
+    return _encode(img, quality=95)
+
+
+def run(path, steps=ALL_STEPS, watermark_text=WATERMARK_TEXT):
+    """
+    Decodes `path` once and returns a dict with the outputs of each step:
+    `exif` (model field values), `thumbnail` and `watermark` (JPEG bytes) and
+    `tags` (an RGB PIL image sized for the tagger).
+    """
+    result = {}
+
+    with decode(path, steps) as img:
+        if 'exif' in steps:
+            result['exif'] = extract_exif(img)
+
+        if not set(steps) & {'thumbnail', 'watermark', 'tags'}:
+            return result
+
+        img.load()
+        pixels = _flatten(img)
+
+        if 'thumbnail' in steps:
+            result['thumbnail'] = render_thumbnail(pixels)
+        if 'tags' in steps:
+            result['tags'] = ml_input(pixels)
+        # Last, because it draws onto the shared buffer.
+        if 'watermark' in steps:
+            result['watermark'] = render_watermark(pixels, watermark_text)
+
+    return result
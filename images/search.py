@@ -0,0 +1,178 @@
+"""
+Full-text search over images.
+
+Every image has an ImageSearchDocument row holding its title, description,
+event name, tag names and photographer (username and full name). The
+signals in images.signals refresh that row whenever one of its sources
+changes, and the database indexes it (migration 0009 creates the index):
+
+    PostgreSQL  a generated tsvector column (weighted title > tags, event >
+                photographer > description) with a GIN index
+    SQLite      an external-content FTS5 table kept in sync by triggers
+
+Queries match every word of the search text as a prefix, so results
+narrow as the user types, and are ranked with ts_rank or bm25. Other
+database backends fall back to icontains over the document columns.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from tags.models import ImageTag
+from .models import Image, ImageSearchDocument
+
+DOCUMENT_TABLE = 'images_imagesearchdocument'
+
+# Words of the search text that are matched; the rest are ignored.
+MAX_TERMS = 8
+
+# Documents refreshed per query batch.
+REFRESH_BATCH_SIZE = 500
+
+_WORD = re.compile(r'[^\W_]+')
+
+# Column weights; FTS5 takes them in column order.
+_SQLITE_WEIGHTS = '10.0, 4.0, 4.0, 2.0, 1.0'
+
+
+def terms(text):
+    return _WORD.findall((text or '').lower())[:MAX_TERMS]
+
+
+def match_sql(vendor, words, table=DOCUMENT_TABLE):
+    """(sql, params) selecting the image ids whose document matches every word."""
+    if vendor == 'postgresql':
+        query = ' & '.join(f'{word}:*' for word in words)
+        return f"SELECT image_id FROM {table} WHERE vector @@ to_tsquery('simple', %s)", [query]
+
+    query = ' '.join(f'"{word}"*' for word in words)
+    return f"SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s", [query]
+
+
+def ranked_sql(vendor, words, table=DOCUMENT_TABLE):
+    """(sql, params) selecting (image id, rank) of every match, best first."""
+    if vendor == 'postgresql':
+        query = ' & '.join(f'{word}:*' for word in words)
+        return (
+            f"SELECT image_id, ts_rank(vector, to_tsquery('simple', %s)) AS search_rank FROM {table} "
+            f"WHERE vector @@ to_tsquery('simple', %s) ORDER BY search_rank DESC, image_id DESC"
+        ), [query, query]
+
+    query = ' '.join(f'"{word}"*' for word in words)
+    return (
+        f"SELECT rowid, -bm25({table}_fts, {_SQLITE_WEIGHTS}) AS search_rank FROM {table}_fts "
+        f"WHERE {table}_fts MATCH %s ORDER BY search_rank DESC, rowid DESC"
+    ), [query]
+
+
+def _fallback(queryset, words):
+    for word in words:
+        queryset = queryset.filter(
+            Q(search_document__title__icontains=word)
+            | Q(search_document__description__icontains=word)
+            | Q(search_document__event__icontains=word)
+            | Q(search_document__tags__icontains=word)
+            | Q(search_document__photographer__icontains=word)
+        )
+    return queryset
+
+
+def matching(queryset, text):
+    """Images of `queryset` whose document matches every word of `text`."""
+    words = terms(text)
+    if not words:
+        return queryset
+
+    vendor = connection.vendor
+    if vendor not in ('postgresql', 'sqlite'):
+        return _fallback(queryset, words)
+    return queryset.filter(pk__in=RawSQL(*match_sql(vendor, words)))
+
+
+def ranked(queryset, text, limit):
+    """
+    Up to `limit` images of `queryset` matching `text`, best first, each with
+    a `search_rank` attribute.
+
+    Matches are ranked by the index alone, then fetched from `queryset` a
+    window at a time, so rows the queryset filters out (private images,
+    another event) only cost another, larger window.
+    """
+    words = terms(text)
+    if not words:
+        return []
+
+    vendor = connection.vendor
+    if vendor not in ('postgresql', 'sqlite'):
+        results = list(_fallback(queryset, words).order_by('-uploaded_at', '-id')[:limit])
+        for image in results:
+            image.search_rank = 0.0
+        return results
+
+    sql, params = ranked_sql(vendor, words)
+    results = []
+    offset, window = 0, limit * 4
+    while len(results) < limit:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{sql} LIMIT %s OFFSET %s", params + [window, offset])
+            rows = cursor.fetchall()
+
+        visible = queryset.in_bulk([image_id for image_id, _ in rows])
+        for image_id, rank in rows:
+            if image_id in visible:
+                visible[image_id].search_rank = rank
+                results.append(visible[image_id])
+
+        if len(rows) < window:
+            break
+        offset += window
+        window *= 2
+
+    return results[:limit]
+
+
+def photographer_text(username, first_name, last_name):
+    return ' '.join(filter(None, (username, first_name, last_name)))
+
+
+def documents(image_ids):
+    """Yields unsaved ImageSearchDocuments built from the current rows."""
+    tag_names = {}
+    for image_id, name in ImageTag.objects.filter(image_id__in=image_ids).order_by(
+        'image_id', 'tag__name'
+    ).values_list('image_id', 'tag__name'):
+        tag_names.setdefault(image_id, []).append(name)
+
+    images = Image.objects.filter(pk__in=image_ids).values(
+        'pk', 'title', 'description', 'event__name',
+        'uploaded_by__username', 'uploaded_by__first_name', 'uploaded_by__last_name',
+    )
+    for row in images:
+        photographer = photographer_text(
+            row['uploaded_by__username'],
+            row['uploaded_by__first_name'],
+            row['uploaded_by__last_name'],
+        )
+        yield ImageSearchDocument(
+            image_id=row['pk'],
+            title=row['title'] or '',
+            description=row['description'] or '',
+            event=row['event__name'] or '',
+            tags=' '.join(tag_names.get(row['pk'], [])),
+            photographer=photographer,
+        )
+
+
+def refresh(image_ids):
+    """Rebuilds the search documents of `image_ids` with one upsert per batch."""
+    image_ids = list(image_ids)
+    for start in range(0, len(image_ids), REFRESH_BATCH_SIZE):
+        batch = image_ids[start:start + REFRESH_BATCH_SIZE]
+        ImageSearchDocument.objects.bulk_create(
+            documents(batch),
+            update_conflicts=True,
+            unique_fields=['image'],
+            update_fields=['title', 'description', 'event', 'tags', 'photographer', 'updated_at'],
+        )
@@ -1,8 +1,22 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Image
+from .models import Image, UploadJob, UploadJobFile, UploadSession
 from tags.serializers import TagSerializer
 
 
+class ImageListSerializer(serializers.ListSerializer):
+    """Loads the requesting user's reactions for the whole page in one query."""
+
+    def to_representation(self, data):
+        from django.db import models
+
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        images = list(iterable)
+        self.child.load_user_reactions(images)
+        self.child.load_pending_counters(images)
+        return super().to_representation(images)
+
+
 class ImageSerializer(serializers.ModelSerializer):
     user_liked = serializers.SerializerMethodField()
     user_favourited = serializers.SerializerMethodField()
@@ -20,7 +34,7 @@ class ImageSerializer(serializers.ModelSerializer):
             'view_count', 'like_count', 'download_count',
             'privacy', 'exif', 'uploaded_at',
             'user_liked', 'user_favourited', 'tags',
-            'user_tags',
+            'user_tags', 'duplicate_of',
         ]
         read_only_fields = [
             "view_count",
@@ -29,18 +43,76 @@ class ImageSerializer(serializers.ModelSerializer):
             "uploaded_at",
             "uploaded_by",
             "exif",
+            "duplicate_of",
         ]
+        list_serializer_class = ImageListSerializer
 
-    def get_user_liked(self, obj):
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Select/prefetch plan covering every relation this serializer reads."""
+        from django.db.models import Prefetch
+        from tags.models import Tag, ImageUserTag
+
+        return queryset.select_related('uploaded_by', 'event').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.with_image_count()),
+            Prefetch(
+                'image_user_tags',
+                queryset=ImageUserTag.objects.select_related('user', 'added_by')
+            ),
+        )
+
+    def load_user_reactions(self, images):
+        # Maps image id -> set of reaction types for the requesting user. The
+        # map lives in the shared context so nested serializers reuse it.
+        reactions = self.context.setdefault('user_reactions', {})
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            from activities.models import Reaction
-            return Reaction.objects.filter(
-                user=request.user,
-                image=obj,
-                reaction_type='LIKE'
-            ).exists()
-        return False
+        if not (request and request.user.is_authenticated):
+            return reactions
+
+        missing = [image.pk for image in images if image.pk not in reactions]
+        if not missing:
+            return reactions
+
+        from activities.models import Reaction
+
+        for image_id in missing:
+            reactions[image_id] = set()
+
+        rows = Reaction.objects.filter(
+            user=request.user,
+            image_id__in=missing,
+            reaction_type__in=['LIKE', 'FAVORITE']
+        ).values_list('image_id', 'reaction_type')
+
+        for image_id, reaction_type in rows:
+            reactions[image_id].add(reaction_type)
+
+        return reactions
+
+    def load_pending_counters(self, images):
+        # Deltas still sitting in the write-behind buffer, keyed by image id.
+        from images import counters
+
+        pending = self.context.setdefault('pending_counters', {})
+        missing = [image.pk for image in images if image.pk not in pending]
+        if missing:
+            found = counters.pending_counts(missing)
+            for image_id in missing:
+                pending[image_id] = found.get(image_id, {})
+        return pending
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for field, delta in self.load_pending_counters([instance])[instance.pk].items():
+            if field in data:
+                data[field] += delta
+        return data
+
+    def get_user_reactions(self, obj):
+        return self.load_user_reactions([obj]).get(obj.pk, set())
+
+    def get_user_liked(self, obj):
+        return 'LIKE' in self.get_user_reactions(obj)
 
     def get_user_tags(self, obj):
         tags = []
@@ -54,86 +126,140 @@ class ImageSerializer(serializers.ModelSerializer):
         return tags
 
     def get_user_favourited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            from activities.models import Reaction
-            return Reaction.objects.filter(
-                user=request.user,
-                image=obj,
-                reaction_type='FAVORITE'
-            ).exists()
-        return False
+        return 'FAVORITE' in self.get_user_reactions(obj)
 
 
 class ImageUploadSerializer(serializers.ModelSerializer):
+    # What to do if the upload turns out to be a near-duplicate; defaults to
+    # settings.DUPLICATE_PROCESSING.
+    duplicates = serializers.ChoiceField(
+        choices=['process', 'skip', 'defer'], write_only=True, required=False
+    )
+
     class Meta:
         model = Image
-        fields = ['original_image', 'event', 'privacy']
+        fields = ['id', 'original_image', 'event', 'privacy', 'duplicate_of', 'duplicates']
+        read_only_fields = ['id', 'duplicate_of']
+
+    def uploader(self):
+        # Upload jobs run outside a request and pass the user directly.
+        if 'user' in self.context:
+            return self.context['user']
+        return self.context['request'].user
+
+    def find_original(self, event, phash):
+        """
+        Looks the hash up among the event's earlier images. The index is
+        kept in the serializer context so a bulk upload builds it once and
+        later files in the batch match earlier ones; upload jobs pass in the
+        index their worker keeps across files (uploads.job_duplicate_index).
+        """
+        from images import duplicates
+
+        indexes = self.context.setdefault('duplicate_indexes', {})
+        if event.pk not in indexes:
+            indexes[event.pk] = duplicates.event_index(event.pk)
+        return duplicates.find_original(indexes[event.pk], phash)
 
     def create(self, validated_data):
-        from PIL import Image as PILImage
-        from PIL.ExifTags import TAGS
-        import os 
+        from images import exif, processing
+
+        original_image = validated_data.get('original_image')
+        event = validated_data.get('event')
+
+        # Header-only read, so the metadata lands in the INSERT below. None
+        # means the format needs Pillow and the worker's exif step.
+        try:
+            exif_fields = exif.read(original_image)
+        except Exception:
+            exif_fields = None
+        original_image.seek(0)
 
-        image_file = validated_data.get('original_image')
+        try:
+            phash = processing.perceptual_hash(original_image)
+        except Exception:
+            phash = None
+        original_image.seek(0)
+
+        duplicate_of_id = None
+        if phash is not None:
+            duplicate_of_id = self.find_original(event, phash)
 
         image_obj = Image.objects.create(
-            event = validated_data.get('event'),
-            original_image = image_file,
-            uploaded_by = self.context['request'].user,
-            privacy = validated_data.get('privacy', 'PUBLIC')
+            event = event,
+            original_image = original_image,
+            uploaded_by = self.uploader(),
+            privacy = validated_data.get('privacy', 'PUBLIC'),
+            phash = phash,
+            duplicate_of_id = duplicate_of_id,
+            **(exif_fields or {}),
         )
 
-        try:
-            img = PILImage.open(image_obj.original_image.path)
-            exif_data = img._getexif()
+        if phash is not None:
+            self.context['duplicate_indexes'][event.pk].add(
+                phash, (image_obj.id, duplicate_of_id or image_obj.id)
+            )
 
-            if exif_data is not None:
-                exif_dict = {}
+        # Thumbnail, watermark and auto-tags (and EXIF, when it could not be
+        # read above) all come from one decode of the original in the worker.
+        from images.tasks import process_image
 
-            for tag_id, value in exif_data.items():
-                tag = TAGS.get(tag_id, tag_id)
-                try:
-                    exif_dict[tag] = str(value)
-                except:
-                    exif_dict[tag] = str(value)[:100]  
+        steps = [
+            step for step in processing.ALL_STEPS
+            if step != 'exif' or exif_fields is None
+        ]
+        policy = validated_data.get('duplicates', settings.DUPLICATE_PROCESSING)
+        if duplicate_of_id is None or policy == 'process':
+            process_image.delay(image_obj.id, steps=steps)
+        else:
+            process_image.delay(
+                image_obj.id, steps=[step for step in steps if step in ('exif', 'thumbnail')]
+            )
+            if policy == 'defer':
+                process_image.apply_async(
+                    (image_obj.id, ['watermark', 'tags']),
+                    countdown=settings.DUPLICATE_DEFER_SECONDS,
+                )
 
-                image_obj.exif = exif_dict
+        return image_obj
 
-                if 'Model' in exif_dict:
-                    image_obj.camera_model = exif_dict['Model']
 
-                if 'FNumber' in exif_dict:
-                    image_obj.aperture = exif_dict['FNumber']
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'event', 'privacy', 'filename', 'size', 'received', 'checksum', 'created_at']
+        read_only_fields = ['id', 'received', 'checksum', 'created_at']
 
-                if 'ExposureTime' in exif_dict:
-                    image_obj.shutter_speed = exif_dict['ExposureTime']
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Size must be positive")
+        if value > settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Files larger than {settings.UPLOAD_MAX_SIZE} bytes are not accepted"
+            )
+        return value
 
-                if 'ISOSpeedRatings' in exif_dict:
-                    image_obj.iso = exif_dict['ISOSpeedRatings']
 
-                if 'GPSInfo' in exif_dict:
-                    gps_info = exif_dataa['GPSInfo']
-                    ##fepfkpekge COMPLETE THIS
+class UploadJobFileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadJobFile
+        fields = ['filename', 'size', 'status', 'image', 'error', 'finished_at']
 
-                if 'DateTimeOriginal' in exif_dict:
-                    from datetime import datetime
-                    try:
-                        capture_time = datetime.strptime(
-                            exif_dict['DateTimeOriginal'],
-                            '%Y:%m:%d %H:%M:%S'
-                        )
-                        image_obj.capture_time = capture_time
-                    except:
-                        pass
 
-                image_obj.save()
+class UploadJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    files = serializers.SerializerMethodField()
 
-        except Exception as e:
-                print(f"Exif extraction failed: {str(e)}")
+    class Meta:
+        model = UploadJob
+        fields = ['id', 'event', 'privacy', 'status', 'created_at', 'finished_at', 'progress', 'files']
 
-        from images.tasks import generate_thumbnail, apply_watermark
-        generate_thumbnail.delay(image_obj.id)
-        apply_watermark.delay(image_obj.id)
+    def get_progress(self, obj):
+        from images.uploads import progress
+        return progress(obj)
 
-        return image_obj
+    def get_files(self, obj):
+        # Only the detail view lists files; job lists stay small.
+        if not self.context.get('include_files'):
+            return None
+        return UploadJobFileSerializer(obj.files.all(), many=True).data
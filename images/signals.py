@@ -0,0 +1,74 @@
+import re
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from events.models import Event
+from tags.models import ImageTag, Tag
+from . import search
+from .models import Image, ImageSearchDocument
+
+# Image fields that feed the search document.
+SEARCH_FIELDS = {'title', 'description', 'event', 'uploaded_by'}
+
+
+def _refresh_later(image_id):
+    transaction.on_commit(lambda: search.refresh([image_id]))
+
+
+@receiver(post_save, sender=Image)
+def refresh_image_document(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    _refresh_later(instance.pk)
+
+
+@receiver(post_save, sender=ImageTag)
+@receiver(post_delete, sender=ImageTag)
+def refresh_tagged_document(sender, instance, **kwargs):
+    _refresh_later(instance.image_id)
+
+
+@receiver(post_save, sender=Event)
+def refresh_event_documents(sender, instance, created, **kwargs):
+    if created or not ImageSearchDocument.objects.filter(
+        image__event=instance
+    ).exclude(event=instance.name).exists():
+        return
+
+    from .tasks import refresh_search_documents
+    transaction.on_commit(lambda: refresh_search_documents.delay(event_id=instance.pk))
+
+
+@receiver(post_save, sender=User)
+def refresh_photographer_documents(sender, instance, created, update_fields=None, **kwargs):
+    # Logins save last_login only.
+    if created or (update_fields is not None and not {'username', 'first_name', 'last_name'}.intersection(update_fields)):
+        return
+
+    photographer = search.photographer_text(instance.username, instance.first_name, instance.last_name)
+    if not ImageSearchDocument.objects.filter(
+        image__uploaded_by=instance
+    ).exclude(photographer=photographer).exists():
+        return
+
+    from .tasks import refresh_search_documents
+    transaction.on_commit(lambda: refresh_search_documents.delay(user_id=instance.pk))
+
+
+@receiver(post_save, sender=Tag)
+def refresh_renamed_tag_documents(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'name' not in update_fields):
+        return
+
+    # Tag names are stored space-separated; look for the name as a whole.
+    current = rf'(^|\s){re.escape(instance.name)}(\s|$)'
+    if not ImageSearchDocument.objects.filter(
+        image__image_tags__tag=instance
+    ).exclude(tags__regex=current).exists():
+        return
+
+    from .tasks import refresh_search_documents
+    transaction.on_commit(lambda: refresh_search_documents.delay(tag_id=instance.pk))
@@ -0,0 +1,95 @@
+"""
+Optional in-memory inverted index for the most used tags.
+
+Multi-tag filters are answered in the database by one grouped subquery
+(ImageTag.objects.images_with_all). For the TAG_INDEX_HOT_TAGS most used
+tags, whose posting lists make that subquery scan the most rows, each
+process can also keep a sorted int64 array of image ids per tag and AND
+them together with NumPy instead.
+
+The index is rebuilt every TAG_INDEX_TTL seconds. Tags added since the
+build are picked up at query time from ImageTag rows above the build's
+high-water mark; removed tags can linger until the next rebuild.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from tags.models import ImageTag
+
+_lock = threading.Lock()
+_index = None
+
+
+class HotTagIndex:
+    def __init__(self, postings, watermark):
+        self.postings = postings
+        self.watermark = watermark
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls, size):
+        hot = list(
+            ImageTag.objects.order_by().values('tag').annotate(n=Count('pk'))
+            .order_by('-n').values_list('tag', flat=True)[:size]
+        )
+        watermark = ImageTag.objects.aggregate(last=Max('pk'))['last'] or 0
+
+        rows = np.array(
+            ImageTag.objects.filter(tag_id__in=hot, pk__lte=watermark)
+            .values_list('tag_id', 'image_id'),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        rows = rows[np.lexsort((rows[:, 1], rows[:, 0]))]
+
+        tag_ids, starts = np.unique(rows[:, 0], return_index=True)
+        postings = {
+            int(tag_id): image_ids
+            for tag_id, image_ids in zip(tag_ids, np.split(rows[:, 1], starts[1:]))
+        }
+        return cls(postings, watermark)
+
+    def covers(self, tag_id):
+        return tag_id in self.postings
+
+    def intersect(self, tag_groups):
+        """
+        Sorted image ids tagged from every group of hot tag ids in
+        `tag_groups`, including tags added since the index was built.
+        """
+        tag_ids = {pk for group in tag_groups for pk in group}
+        recent = {}
+        for tag_id, image_id in ImageTag.objects.filter(
+            pk__gt=self.watermark, tag_id__in=tag_ids
+        ).values_list('tag_id', 'image_id'):
+            recent.setdefault(tag_id, []).append(image_id)
+
+        lists = []
+        for group in tag_groups:
+            image_ids = [self.postings[pk] for pk in group]
+            image_ids.extend(np.asarray(recent[pk], dtype=np.int64) for pk in group if pk in recent)
+            lists.append(np.unique(np.concatenate(image_ids)) if len(image_ids) > 1 else image_ids[0])
+
+        # Smallest first keeps every intermediate result small.
+        lists.sort(key=len)
+        result = lists[0]
+        for image_ids in lists[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, image_ids, assume_unique=True)
+        return result
+
+
+def get_index():
+    """The process-wide HotTagIndex, rebuilt when older than TAG_INDEX_TTL, or None if disabled."""
+    global _index
+    if settings.TAG_INDEX_HOT_TAGS <= 0:
+        return None
+
+    with _lock:
+        if _index is None or time.monotonic() - _index.built_at > settings.TAG_INDEX_TTL:
+            _index = HotTagIndex.build(settings.TAG_INDEX_HOT_TAGS)
+        return _index
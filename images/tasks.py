@@ -1,133 +1,187 @@
-from celery import shared_task
-from PIL import Image as PILImage
-from io import BytesIO
+from celery import chord, shared_task
+from django.conf import settings
 from django.core.files.base import ContentFile
 import os
-from celery import shared_task
 from .models import Image
-from tags.models import Tag, ImageTag
-from images.ml.resnet import predict_tags
+from . import processing
+from images.ml import batching
+
 
 @shared_task
-def generate_thumbnail(image_id):
-    from images.models import Image
-    
-    try:
-        image_obj = Image.objects.get(id=image_id)
-        
-        # Open original image
-        img = PILImage.open(image_obj.original_image.path)
-        
-        # Create thumbnail (max 400x400)
-        img.thumbnail((400, 400), PILImage.Resampling.LANCZOS)
-        
-        # Convert RGBA/LA/P to RGB (for JPEG compatibility)
-        if img.mode in ('RGBA', 'LA', 'P'):
-            # Create white background
-            rgb_img = PILImage.new('RGB', img.size, (255, 255, 255))
-            rgb_img.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else None)
-            img = rgb_img
-        
-        # Save to BytesIO
-        thumb_io = BytesIO()
-        img.save(thumb_io, format='JPEG', quality=85)
-        thumb_io.seek(0)
-        
-        # Generate filename
-        original_name = os.path.basename(image_obj.original_image.name)
-        name_without_ext = os.path.splitext(original_name)[0]
-        thumb_name = f'thumb_{name_without_ext}.jpg'
-        
-        # Save to model
+def process_image(image_id, steps=None, watermark_text=processing.WATERMARK_TEXT):
+    """
+    Runs the requested processing steps off a single decode of the original.
+    Errors are raised, so Celery records the task as failed.
+    """
+    steps = tuple(steps or processing.ALL_STEPS)
+
+    image_obj = Image.objects.get(id=image_id)
+    result = processing.run(image_obj.original_image.path, steps, watermark_text)
+
+    update_fields = []
+    original_name = os.path.basename(image_obj.original_image.name)
+    name_without_ext = os.path.splitext(original_name)[0]
+
+    for field, value in result.get('exif', {}).items():
+        setattr(image_obj, field, value)
+        update_fields.append(field)
+
+    if 'thumbnail' in result:
         image_obj.thumbnail.save(
-            thumb_name,
-            ContentFile(thumb_io.read()),
-            save=True
+            f'thumb_{name_without_ext}.jpg',
+            ContentFile(result['thumbnail']),
+            save=False
         )
-        
-        return f"Thumbnail created: {thumb_name}"
-    
-    except Exception as e:
-        return f"Error: {str(e)}"
+        update_fields.append('thumbnail')
+
+    if 'watermark' in result:
+        image_obj.watermarked_image.save(
+            f'watermarked_{original_name}',
+            ContentFile(result['watermark']),
+            save=False
+        )
+        update_fields.append('watermarked_image')
+
+    if (
+        ('thumbnail' in result or 'watermark' in result)
+        and image_obj.thumbnail and image_obj.watermarked_image
+    ):
+        image_obj.rendition_version = processing.RENDITION_VERSION
+        update_fields.append('rendition_version')
+
+    if update_fields:
+        image_obj.save(update_fields=update_fields)
+
+    if 'tags' in result:
+        # Tagging is batched across uploads; the batcher gets the input
+        # from this decode instead of opening the original again.
+        batching.enqueue(image_id, result['tags'])
+
+    return {'image_id': image_id, 'steps': list(steps)}
 
 
 @shared_task
-def apply_watermark(image_id, watermark_text="Watermarked image"):
+def generate_thumbnail(image_id):
+    return process_image(image_id, steps=['thumbnail'])
+
+
+@shared_task
+def apply_watermark(image_id, watermark_text=processing.WATERMARK_TEXT):
     """Apply watermark to an image"""
-    from images.models import Image
-    from PIL import ImageDraw, ImageFont
-    
+    return process_image(image_id, steps=['watermark'], watermark_text=watermark_text)
+
+
+@shared_task
+def auto_tag_image(image_id):
+    batching.enqueue(image_id)
+
+
+@shared_task
+def auto_tag_batch():
+    return batching.drain()
+
+
+@shared_task
+def flush_image_counters():
+    from images.counters import flush
+    return flush()
+
+
+@shared_task
+def rebuild_similarity_index():
+    from images.ml import embeddings
+    return embeddings.rebuild()
+
+
+@shared_task
+def refresh_search_documents(event_id=None, user_id=None, tag_id=None):
+    """Rebuilds the search documents of every image of an event, photographer or tag."""
+    from . import search
+
+    images = Image.objects.all()
+    if event_id is not None:
+        images = images.filter(event_id=event_id)
+    if user_id is not None:
+        images = images.filter(uploaded_by_id=user_id)
+    if tag_id is not None:
+        images = images.filter(image_tags__tag_id=tag_id)
+
+    image_ids = list(images.order_by('pk').values_list('pk', flat=True))
+    search.refresh(image_ids)
+    return len(image_ids)
+
+
+@shared_task
+def expire_upload_sessions():
+    """Removes resumable uploads that have not received a chunk in a while."""
+    from datetime import timedelta
+    from django.utils import timezone
+    from .models import UploadSession
+    from .uploads import discard
+
+    cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    expired = 0
+    for session in UploadSession.objects.filter(updated_at__lt=cutoff).iterator():
+        discard(session)
+        expired += 1
+    return expired
+
+
+@shared_task
+def ingest_upload(job_file_id):
+    from django.utils import timezone
+    from .models import UploadJobFile
+    from . import uploads
+
+    # A header task that raises keeps the chord from calling
+    # finish_upload_job, so failures are recorded on the file instead.
     try:
-        image_obj = Image.objects.get(id=image_id)
-        
-        # Open original image
-        img = PILImage.open(image_obj.original_image.path)
-        
-        # Convert to RGBA if needed
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-        
-        # Create transparent overlay
-        overlay = PILImage.new('RGBA', img.size, (255, 255, 255, 0))
-        draw = ImageDraw.Draw(overlay)
-        
-        # Calculate position (bottom-right corner)
-        width, height = img.size
-        
-        # Try to use a font, fallback to default
-        try:
-            font = ImageFont.truetype("arial.ttf", 40)
-        except:
-            font = ImageFont.load_default()
-        
-        # Get text size
-        bbox = draw.textbbox((0, 0), watermark_text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # Position: 20px from bottom-right
-        x = width - text_width - 20
-        y = height - text_height - 20
-        
-        # Draw semi-transparent watermark
-        draw.text((x, y), watermark_text, fill=(255, 255, 255, 128), font=font)
-        
-        # Composite the watermark onto original
-        watermarked = PILImage.alpha_composite(img, overlay)
-        
-        # Convert back to RGB
-        watermarked = watermarked.convert('RGB')
-        
-        # Save to BytesIO
-        watermark_io = BytesIO()
-        watermarked.save(watermark_io, format='JPEG', quality=95)
-        watermark_io.seek(0)
-        
-        # Generate filename
-        original_name = os.path.basename(image_obj.original_image.name)
-        watermark_name = f'watermarked_{original_name}'
-        
-        # Save to model
-        image_obj.watermarked_image.save(
-            watermark_name,
-            ContentFile(watermark_io.read()),
-            save=True
-        )
-        
-        return f"Watermark created: {watermark_name}"
-    
+        job_file = UploadJobFile.objects.select_related('job__user').get(pk=job_file_id)
+        uploads.ingest(job_file)
+        uploads.report(job_file.job, job_file)
+        return job_file.status
     except Exception as e:
-        return f"Error: {str(e)}"
+        UploadJobFile.objects.filter(pk=job_file_id, status='PENDING').update(
+            status='FAILED', error=str(e), finished_at=timezone.now()
+        )
+        return 'FAILED'
+
 
 @shared_task
-def auto_tag_image(image_id):
-    image = Image.objects.get(id=image_id)
-    image_path = image.original_image.path
+def finish_upload_job(results, job_id):
+    """Chord callback: closes the job once every file has been ingested."""
+    from django.utils import timezone
+    from .models import UploadJob
+    from . import uploads
+
+    job = UploadJob.objects.get(pk=job_id)
+    job.status = 'DONE'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at'])
+
+    directory = os.path.join(settings.UPLOAD_JOB_DIR, str(job.id))
+    if os.path.isdir(directory) and not os.listdir(directory):
+        os.rmdir(directory)
+
+    return uploads.report(job)
+
+
+@shared_task
+def abort_upload_job(job_id):
+    """Chord error callback: fails the files still pending, then closes the job."""
+    from django.utils import timezone
+    from .models import UploadJobFile
 
-    tags = predict_tags(image_path)
+    UploadJobFile.objects.filter(job_id=job_id, status='PENDING').update(
+        status='FAILED', error='Ingestion did not finish', finished_at=timezone.now()
+    )
+    return finish_upload_job([], job_id)
 
-    for tag_name in tags:
-        tag, _ = Tag.objects.get_or_create(name=tag_name)
-        ImageTag.objects.get_or_create(image=image, tag=tag, defaults={"added_by": None})
 
-    return tags
\ No newline at end of file
+def start_upload_job(job):
+    """Ingests every file of `job` in parallel, then runs finish_upload_job."""
+    job.status = 'RUNNING'
+    job.save(update_fields=['status'])
+    file_ids = list(job.files.values_list('id', flat=True))
+    callback = finish_upload_job.s(str(job.id)).on_error(abort_upload_job.si(str(job.id)))
+    chord(ingest_upload.s(file_id) for file_id in file_ids)(callback)
@@ -1,3 +1,943 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import redis
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image as PILImage
+from PIL.TiffImagePlugin import IFDRational
+from rest_framework.test import APIClient, APITestCase
+
+from activities.models import Reaction
+from events.models import Event
+from tags.models import ImageTag, ImageUserTag, Tag
+from . import counters, duplicates, exif, processing, search, tag_index, tasks, uploads
+from .ml import batching, embeddings, resnet, server
+from .models import CounterFlush, Image, UploadSession
+
+# Most queries one gallery page may take, whatever its size: the page of
+# images with uploaded_by and event joined, tags, user tags with their users,
+# and the requesting user's reactions. Raise it only together with the
+# eager loading plan in ImageSerializer.setup_eager_loading.
+GALLERY_QUERY_BUDGET = 4
+
+
+class FakeRedis:
+    """The few hash and set commands images.counters uses, in memory."""
+
+    def __init__(self):
+        self.data = {}
+
+    def _key(self, key):
+        return key.encode() if isinstance(key, str) else key
+
+    def hincrby(self, key, member, amount=1):
+        values = self.data.setdefault(self._key(key), {})
+        member = self._key(member)
+        values[member] = str(int(values.get(member, 0)) + amount).encode()
+        return int(values[member])
+
+    def hmget(self, key, members):
+        values = self.data.get(self._key(key), {})
+        return [values.get(self._key(member)) for member in members]
+
+    def hgetall(self, key):
+        return dict(self.data.get(self._key(key), {}))
+
+    def sadd(self, key, *members):
+        self.data.setdefault(self._key(key), set()).update(self._key(member) for member in members)
+
+    def srem(self, key, *members):
+        self.data.get(self._key(key), set()).difference_update(self._key(member) for member in members)
+
+    def smembers(self, key):
+        return set(self.data.get(self._key(key), set()))
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(self._key(key), None)
+
+    def rename(self, src, dst):
+        self.data[self._key(dst)] = self.data.pop(self._key(src))
+
+    def lock(self, name, timeout=None, blocking=True):
+        return mock.Mock(**{'acquire.return_value': True})
+
+    def pipeline(self, transaction=True):
+        client, calls = self, []
+
+        class Pipeline:
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: calls.append((name, args, kwargs)) or self
+
+            def execute(self):
+                return [getattr(client, name)(*args, **kwargs) for name, args, kwargs in calls]
+
+        return Pipeline()
+
+    def take_batch(self, keys):
+        """counters._TAKE_BATCH."""
+        pending, batch, batches = keys
+        if self._key(pending) not in self.data:
+            return 0
+        self.rename(pending, batch)
+        self.sadd(batches, batch)
+        return 1
+
+
+class GalleryTestCase(TestCase):
+    """A signed-in user, one event and helpers to fill it with images."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', password='x')
+        cls.event = Event.objects.create(
+            name='Convocation',
+            start_date=timezone.now(),
+            end_date=timezone.now(),
+            created_by=cls.user,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_images(self, count, **fields):
+        fields.setdefault('privacy', 'PUBLIC')
+        fields.setdefault('uploaded_by', self.user)
+        return [
+            Image.objects.create(event=self.event, original_image=f'images/original/{n}.jpg', **fields)
+            for n in range(count)
+        ]
+
+    def decorate(self, images):
+        """Gives every image tags, tagged users and reactions, as a real gallery has."""
+        tags = [Tag.objects.create(name=name) for name in ('sunset', 'stage', 'crowd')]
+        people = [User.objects.create_user(f'person{n}', password='x') for n in range(3)]
+        for image in images:
+            for tag in tags:
+                ImageTag.objects.create(image=image, tag=tag, added_by=self.user)
+            for person in people:
+                ImageUserTag.objects.create(image=image, user=person, added_by=self.user)
+            Reaction.objects.create(user=self.user, image=image, reaction_type='LIKE')
+            Reaction.objects.create(user=self.user, image=image, reaction_type='FAVORITE')
+            ImageUserTag.objects.create(image=image, user=self.user, added_by=people[0])
+
+    def assertWithinQueryBudget(self, url, budget=GALLERY_QUERY_BUDGET):
+        queries = self.count_queries(url)
+        self.assertLessEqual(
+            queries, budget,
+            f"{url} took {queries} queries, over its budget of {budget}",
+        )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+
+class UserReactionQueryTests(GalleryTestCase):
+    def test_list_queries_do_not_grow_with_page_size(self):
+        for image in self.make_images(25):
+            Reaction.objects.create(user=self.user, image=image, reaction_type='LIKE')
+            Reaction.objects.create(user=self.user, image=image, reaction_type='FAVORITE')
+
+        small = self.count_queries('/api/images/?page_size=5')
+        large = self.count_queries('/api/images/?page_size=25')
+
+        self.assertEqual(small, large)
+
+    def test_reaction_state_is_per_image(self):
+        liked, favourited, untouched = self.make_images(3)
+        Reaction.objects.create(user=self.user, image=liked, reaction_type='LIKE')
+        Reaction.objects.create(user=self.user, image=favourited, reaction_type='FAVORITE')
+
+        response = self.client.get('/api/images/')
+
+        state = {
+            row['id']: (row['user_liked'], row['user_favourited'])
+            for row in response.data['results']
+        }
+        self.assertEqual(state, {
+            liked.pk: (True, False),
+            favourited.pk: (False, True),
+            untouched.pk: (False, False),
+        })
+
+    def test_my_actions_queries_do_not_grow_with_page_size(self):
+        for image in self.make_images(25):
+            Reaction.objects.create(user=self.user, image=image, reaction_type='FAVORITE')
+
+        for action in ('my_uploads', 'my_favorites'):
+            with self.subTest(action=action):
+                small = self.count_queries(f'/api/images/{action}/?page_size=5')
+                large = self.count_queries(f'/api/images/{action}/?page_size=25')
+                self.assertEqual(small, large)
+
+
+class GalleryQueryBudgetTests(GalleryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.images = self.make_images(25)
+        self.decorate(self.images)
+
+    def test_gallery_pages_stay_within_budget(self):
+        for url in (
+            '/api/images/?page_size=25',
+            '/api/images/my_uploads/?page_size=25',
+            '/api/images/my_favorites/?page_size=25',
+            '/api/images/my_tagged/?page_size=25',
+        ):
+            with self.subTest(url=url):
+                self.assertWithinQueryBudget(url)
+
+    def test_retrieve_stays_within_budget(self):
+        self.assertWithinQueryBudget(f'/api/images/{self.images[0].pk}/')
+
+    def test_nested_relations_are_serialized(self):
+        response = self.client.get(f'/api/images/{self.images[0].pk}/')
+
+        self.assertEqual(response.data['uploaded_by'], 'viewer')
+        self.assertEqual(sorted(tag['name'] for tag in response.data['tags']), ['crowd', 'stage', 'sunset'])
+        self.assertEqual(
+            sorted(tag['username'] for tag in response.data['user_tags']),
+            ['person0', 'person1', 'person2', 'viewer'],
+        )
+
+
+class ImageCursorPaginationTests(GalleryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.images = self.make_images(23)
+        # Mostly ties, as on a real gallery.
+        for n, image in enumerate(self.images):
+            Image.objects.filter(pk=image.pk).update(like_count=3 if n % 5 == 0 else 0, view_count=n % 2)
+
+    def walk(self, url):
+        seen = []
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, response.content)
+                seen.extend(row['id'] for row in response.data['results'])
+                url = response.data['next']
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+        return seen
+
+    def test_pages_cover_every_image_once_across_ties(self):
+        for ordering in ('uploaded_at', '-like_count', 'like_count', '-view_count'):
+            with self.subTest(ordering=ordering):
+                seen = self.walk(f'/api/images/?ordering={ordering}&page_size=4')
+
+                field = ordering.lstrip('-')
+                expected = sorted(
+                    Image.objects.values_list(field, 'id'), reverse=ordering.startswith('-')
+                )
+                self.assertEqual(seen, [pk for _, pk in expected])
+
+    def test_previous_link_returns_the_same_page(self):
+        first = self.client.get('/api/images/?ordering=-like_count&page_size=4')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(
+            [row['id'] for row in back.data['results']],
+            [row['id'] for row in first.data['results']],
+        )
+        self.assertIsNone(back.data['previous'])
+
+    def test_malformed_cursor_is_not_found(self):
+        response = self.client.get('/api/images/?cursor=cD1bIngiLCIxIl0%3D')
+        self.assertEqual(response.status_code, 404)
+
+
+class TagFilterTests(GalleryTestCase):
+    def setUp(self):
+        super().setUp()
+        tag_index._index = None
+        self.addCleanup(setattr, tag_index, '_index', None)
+
+        self.images = self.make_images(12)
+        # Two tags share a name up to case; either one counts as that name.
+        self.tags = {name: Tag.objects.create(name=name) for name in ('sunset', 'Sunset', 'stage', 'crowd')}
+        for n, image in enumerate(self.images):
+            if n % 2 == 0:
+                self.tag(image, 'sunset' if n % 4 == 0 else 'Sunset')
+            if n % 3 == 0:
+                self.tag(image, 'stage')
+            if n % 5 == 0:
+                self.tag(image, 'crowd')
+
+    def tag(self, image, name):
+        ImageTag.objects.create(image=image, tag=self.tags[name], added_by=self.user)
+
+    def filtered(self, tags):
+        response = self.client.get(f'/api/images/?tags={tags}&page_size=100')
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(row['id'] for row in response.data['results'])
+
+    def carrying(self, *names):
+        return sorted(
+            image.pk for image in self.images
+            if all(ImageTag.objects.filter(image=image, tag__name__iexact=name).exists() for name in names)
+        )
+
+    def test_only_images_with_every_tag_match(self):
+        expected = [self.images[n].pk for n in (0, 6)]
+        self.assertEqual(self.carrying('sunset', 'stage'), expected)
+
+        self.assertEqual(self.filtered('sunset,stage'), expected)
+        self.assertEqual(self.filtered('SUNSET, Stage'), expected)
+        self.assertEqual(self.filtered('sunset,stage,crowd'), [self.images[0].pk])
+        self.assertEqual(self.filtered('sunset,missing'), [])
+
+    def test_hot_tag_index_matches_the_sql_path(self):
+        queries = ('sunset', 'sunset,stage', 'Stage,CROWD', 'sunset,stage,crowd')
+        sql = {tags: self.filtered(tags) for tags in queries}
+
+        with override_settings(TAG_INDEX_HOT_TAGS=10):
+            index = tag_index.get_index()
+            self.assertTrue(all(index.covers(tag.pk) for tag in self.tags.values()))
+            self.assertEqual({tags: self.filtered(tags) for tags in queries}, sql)
+
+            # Rows added after the build come from above the watermark.
+            self.tag(self.images[1], 'stage')
+            self.tag(self.images[1], 'sunset')
+            self.assertIs(tag_index.get_index(), index)
+            hot = self.filtered('sunset,stage')
+
+        self.assertEqual(hot, self.filtered('sunset,stage'))
+        self.assertEqual(hot, self.carrying('sunset', 'stage'))
+        self.assertIn(self.images[1].pk, hot)
+
+    def test_intersect_matches_images_with_all(self):
+        index = tag_index.HotTagIndex.build(10)
+        groups = [
+            [self.tags['sunset'].pk, self.tags['Sunset'].pk],
+            [self.tags['stage'].pk],
+        ]
+        self.assertEqual(
+            index.intersect(groups).tolist(),
+            sorted(row['image'] for row in ImageTag.objects.images_with_all(groups)),
+        )
+
+
+class ViewCountTests(GalleryTestCase):
+    def test_counted_view_shows_when_redis_is_down(self):
+        image, = self.make_images(1)
+        unreachable = redis.Redis(port=1, socket_connect_timeout=0.1)
+
+        with mock.patch.object(counters, '_client', unreachable):
+            response = self.client.get(f'/api/images/{image.pk}/?count_view=1')
+
+        self.assertEqual(response.data['view_count'], 1)
+        image.refresh_from_db()
+        self.assertEqual(image.view_count, 1)
+
+
+class CounterFlushTests(GalleryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        for name, value in (('_client', self.redis), ('_take_batch', self.redis.take_batch)):
+            patcher = mock.patch.object(counters, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_flush_applies_pending_deltas_once(self):
+        image, other = self.make_images(2)
+        for _ in range(3):
+            counters.increment(image.pk, 'view_count')
+        counters.increment(other.pk, 'download_count', 2)
+        self.assertEqual(
+            counters.pending_counts([image.pk, other.pk]),
+            {image.pk: {'view_count': 3}, other.pk: {'download_count': 2}},
+        )
+
+        self.assertEqual(counters.flush(), 2)
+
+        self.assertEqual(counters.pending_counts([image.pk, other.pk]), {})
+        image.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((image.view_count, other.download_count), (3, 2))
+        self.assertEqual(counters.flush(), 0)
+
+    def test_replayed_batch_is_not_counted_twice(self):
+        image, = self.make_images(1)
+        for _ in range(3):
+            counters.increment(image.pk, 'view_count')
+
+        # A flush that committed its batch and died before deleting it.
+        batch_key = counters.BATCH_KEY.format('crashed')
+        self.redis.take_batch([counters.PENDING_KEY, batch_key, counters.BATCHES_KEY])
+        self.assertEqual(counters._apply(batch_key), 1)
+        self.assertEqual(counters.pending_counts([image.pk]), {image.pk: {'view_count': 3}})
+
+        counters.increment(image.pk, 'view_count')
+        counters.flush()
+
+        image.refresh_from_db()
+        self.assertEqual(image.view_count, 4)
+        self.assertEqual(counters.pending_counts([image.pk]), {})
+        self.assertEqual(self.redis.smembers(counters.BATCHES_KEY), set())
+        self.assertTrue(CounterFlush.objects.filter(batch=batch_key).exists())
+
+
+class SimilarityTests(GalleryTestCase):
+    def setUp(self):
+        super().setUp()
+        store = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, store)
+        # Probing every list makes the IVF search exact, so it can be
+        # compared with a brute-force scan.
+        overrides = override_settings(EMBEDDING_STORE_DIR=store, EMBEDDING_IVF_NPROBE=1000)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for name in ('_index', '_ivf_stamp'):
+            patcher = mock.patch.object(embeddings, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.rng = np.random.default_rng(0)
+        self.latest = {}
+
+    def append(self, image_ids):
+        vectors = self.rng.standard_normal((len(image_ids), embeddings.DIM))
+        embeddings.append(image_ids, vectors.astype(np.float16))
+        stored = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.latest.update(zip(image_ids, stored.astype(np.float16).astype(np.float32)))
+
+    def exact(self, image_id, k):
+        query = self.latest[image_id]
+        scores = {other: float(vector @ query) for other, vector in self.latest.items() if other != image_id}
+        return sorted(scores, key=lambda other: -scores[other])[:k]
+
+    def test_ivf_search_with_tail_matches_exact_scan(self):
+        self.append(list(range(1, 1001)))
+        self.assertEqual(embeddings.rebuild(force=True), 1000)
+        # Rows after the build: new images and a re-tagged one.
+        self.append(list(range(1001, 1101)) + [5])
+
+        index, ids, _ = embeddings.get_index()
+        self.assertIsNotNone(index.centroids)
+        self.assertEqual((index.size, len(ids)), (1000, 1101))
+
+        for image_id in (5, 17, 1050):
+            with self.subTest(image_id=image_id):
+                results = embeddings.similar(image_id, 10)
+                # Random vectors score close together; float rounding may
+                # swap neighbours, so compare the set and the order of scores.
+                self.assertEqual({match_id for match_id, _ in results}, set(self.exact(image_id, 10)))
+                self.assertNotIn(image_id, [match_id for match_id, _ in results])
+                scores = [score for _, score in results]
+                self.assertEqual(scores, sorted(scores, reverse=True))
+                for match_id, score in results:
+                    self.assertAlmostEqual(score, float(self.latest[match_id] @ self.latest[image_id]), places=3)
+
+        self.assertIsNone(embeddings.similar(5000, 10))
+
+    def test_endpoint_excludes_the_image_and_hidden_images(self):
+        images = self.make_images(6)
+        hidden, = self.make_images(1, privacy='PRIVATE', uploaded_by=None)
+        self.append([image.pk for image in images + [hidden]])
+
+        response = self.client.get(f'/api/images/{images[0].pk}/similar/?limit=10')
+
+        self.assertEqual(response.status_code, 200)
+        returned = [item['id'] for item in response.data]
+        self.assertEqual(set(returned), {image.pk for image in images[1:]})
+        similarities = [item['similarity'] for item in response.data]
+        self.assertEqual(similarities, sorted(similarities, reverse=True))
+
+
+class AutoTagTests(GalleryTestCase):
+    def tag(self, image, names):
+        with mock.patch.object(batching, 'preprocess', return_value=[object()]), \
+                mock.patch.object(resnet, 'infer', return_value=([names], [None])), \
+                mock.patch.object(embeddings, 'append'):
+            batching.tag_images([image.pk])
+
+    def test_retag_replaces_only_machine_tags(self):
+        image, = self.make_images(1)
+        self.assertIsNone(image.auto_tag_version)
+        ImageTag.objects.create(image=image, tag=Tag.objects.create(name='legacy'), source='AUTO')
+        orphaned = User.objects.create_user('gone', password='x')
+        ImageTag.objects.create(image=image, tag=Tag.objects.create(name='stage'), added_by=orphaned)
+        orphaned.delete()
+
+        self.tag(image, ['crowd'])
+        self.assertEqual(
+            set(image.image_tags.values_list('tag__name', 'source')),
+            {('stage', 'MANUAL'), ('crowd', 'AUTO')},
+        )
+
+        self.tag(image, ['sunset'])
+        self.assertEqual(
+            set(image.image_tags.values_list('tag__name', 'source')),
+            {('stage', 'MANUAL'), ('sunset', 'AUTO')},
+        )
+
+
+class ProcessImageTests(GalleryTestCase):
+    def test_tagger_reuses_the_processing_decode(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        PILImage.linear_gradient('L').convert('RGB').save(f'{media}/original.jpg')
+        image, = self.make_images(1)
+        unreachable = redis.Redis(port=1, socket_connect_timeout=0.1)
+
+        with override_settings(MEDIA_ROOT=media), \
+                mock.patch.object(batching, '_client', unreachable), \
+                mock.patch.object(batching, 'preprocess') as preprocess, \
+                mock.patch.object(resnet, 'infer', return_value=([['sunset']], [None])) as infer, \
+                mock.patch.object(embeddings, 'append'):
+            image.original_image = 'original.jpg'
+            image.save(update_fields=['original_image'])
+            tasks.process_image(image.pk, steps=['tags'])
+
+        preprocess.assert_not_called()
+        ml_input, = infer.call_args.args[0]
+        self.assertEqual(min(ml_input.size), processing.ML_INPUT_SIZE)
+        self.assertEqual(list(image.image_tags.values_list('tag__name', flat=True)), ['sunset'])
+
+
+class InferenceBatcherTests(SimpleTestCase):
+    def test_window_is_not_extended_by_later_requests(self):
+        batcher = server.InferenceBatcher(max_batch=64, window=0.3)
+        sizes = []
+
+        def infer_local(images, top_k):
+            sizes.append(len(images))
+            return [['tag']] * len(images), [None] * len(images)
+
+        with mock.patch.object(resnet, 'infer_local', side_effect=infer_local):
+            threading.Thread(target=batcher.run, daemon=True).start()
+            submitters = []
+            # One request every 0.1 s, each well inside the window of the last.
+            for _ in range(10):
+                submitter = threading.Thread(target=batcher.submit, args=([object()], 5))
+                submitter.start()
+                submitters.append(submitter)
+                time.sleep(0.1)
+            for submitter in submitters:
+                submitter.join(timeout=5)
+
+        self.assertEqual(sum(sizes), 10)
+        self.assertLess(sizes[0], 6)
+
+
+def gradient_jpeg(size=(64, 48)):
+    buffer = io.BytesIO()
+    PILImage.linear_gradient('L').resize(size).convert('RGB').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class SearchTests(GalleryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.titled, self.tagged, self.other = self.make_images(3)
+        Image.objects.filter(pk=self.titled.pk).update(title='Sunset over the lake')
+        ImageTag.objects.create(image=self.tagged, tag=Tag.objects.create(name='sunset'), added_by=self.user)
+        Image.objects.filter(pk=self.other.pk).update(title='Stage', description='after sundown')
+        search.refresh([self.titled.pk, self.tagged.pk, self.other.pk])
+
+    def test_title_match_ranks_above_tag_match(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Exercises the SQLite FTS5 index")
+
+        results = search.ranked(Image.objects.all(), 'sunse', 10)
+        self.assertEqual([image.pk for image in results], [self.titled.pk, self.tagged.pk])
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+
+        self.assertEqual(
+            set(search.matching(Image.objects.all(), 'sun').values_list('pk', flat=True)),
+            {self.titled.pk, self.tagged.pk, self.other.pk},
+        )
+        self.assertEqual(
+            list(search.matching(Image.objects.all(), 'sunset lake').values_list('pk', flat=True)),
+            [self.titled.pk],
+        )
+
+    def test_fallback_matches_the_same_images(self):
+        for text in ('sunse', 'sun', 'sunset lake', 'stage sundown', 'nothing'):
+            with self.subTest(text=text):
+                indexed = set(search.matching(Image.objects.all(), text).values_list('pk', flat=True))
+                with mock.patch.object(search, 'connection', mock.Mock(vendor='mysql')):
+                    fallback = set(search.matching(Image.objects.all(), text).values_list('pk', flat=True))
+                    ranked = {image.pk for image in search.ranked(Image.objects.all(), text, 10)}
+                self.assertEqual(fallback, indexed)
+                self.assertEqual(ranked, indexed)
+
+    def test_only_renames_refresh_tag_documents(self):
+        tag = Tag.objects.get(name='sunset')
+        with mock.patch.object(tasks.refresh_search_documents, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                tag.save()
+                tag.save(update_fields=['usage_count'])
+            delay.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                tag.name = 'dusk'
+                tag.save()
+            delay.assert_called_once_with(tag_id=tag.pk)
+
+
+class ExifReaderTests(SimpleTestCase):
+    def jpeg(self, endian, latitude_ref='S', longitude_ref='W'):
+        tags = PILImage.Exif()
+        tags.endian = endian
+        tags[0x010F] = 'Canon'
+        tags[0x0110] = 'EOS 5D Mark IV'
+        exif_ifd = tags.get_ifd(exif.EXIF_IFD)
+        exif_ifd[0x9003] = '2024:05:06 07:08:09'
+        exif_ifd[0x829D] = IFDRational(28, 10)
+        exif_ifd[0x829A] = IFDRational(1, 250)
+        exif_ifd[0x8827] = 400
+        exif_ifd[0x920A] = IFDRational(50, 1)
+        gps_ifd = tags.get_ifd(exif.GPS_IFD)
+        gps_ifd[1] = latitude_ref
+        gps_ifd[2] = (IFDRational(29, 1), IFDRational(52, 1), IFDRational(1234, 100))
+        gps_ifd[3] = longitude_ref
+        gps_ifd[4] = (IFDRational(77, 1), IFDRational(53, 1), IFDRational(5, 1))
+
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (32, 24)).save(buffer, 'JPEG', exif=tags)
+        return buffer.getvalue()
+
+    def pillow_fields(self, data):
+        return processing.extract_exif(PILImage.open(io.BytesIO(data)))
+
+    def test_matches_pillow_in_both_byte_orders(self):
+        for endian, byte_order in (('<', b'II'), ('>', b'MM')):
+            for refs in (('S', 'W'), ('N', 'E')):
+                with self.subTest(byte_order=byte_order, refs=refs):
+                    data = self.jpeg(endian, *refs)
+                    self.assertIn(b'Exif\x00\x00' + byte_order, data)
+
+                    fields = exif.read(io.BytesIO(data))
+
+                    self.assertEqual(fields, self.pillow_fields(data))
+                    self.assertEqual(fields['camera_model'], 'EOS 5D Mark IV')
+                    self.assertEqual(fields['iso'], 400)
+                    self.assertEqual(fields['capture_time'], datetime(2024, 5, 6, 7, 8, 9))
+                    sign = -1 if refs == ('S', 'W') else 1
+                    self.assertEqual(fields['gps_latitude'], sign * Decimal('29.870094'))
+                    self.assertEqual(fields['gps_longitude'], sign * Decimal('77.884722'))
+
+    def test_missing_or_truncated_exif_gives_no_fields(self):
+        self.assertEqual(exif.read(io.BytesIO(gradient_jpeg())), {})
+        self.assertIsNone(exif.read(io.BytesIO(b'\x89PNG\r\n\x1a\n')))
+
+        data = self.jpeg('<')
+        app1 = data.index(b'\xff\xe1')
+        app1_end = app1 + 2 + int.from_bytes(data[app1 + 2:app1 + 4], 'big')
+        for end in range(2, app1_end):
+            with self.subTest(end=end):
+                fields = exif.read(io.BytesIO(data[:end]))
+                self.assertIsInstance(fields, dict)
+                self.assertNotIn('gps_latitude', fields)
+
+
+class UploadSessionTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('photographer', password='x')
+        cls.user.profile.role = 'PHOTOGRAPHER'
+        cls.user.profile.save()
+        cls.event = Event.objects.create(
+            name='Convocation', start_date=timezone.now(), end_date=timezone.now(), created_by=cls.user,
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        overrides = override_settings(MEDIA_ROOT=media, UPLOAD_SESSION_DIR=f'{media}/partial')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.content = gradient_jpeg((320, 240))
+
+    def start(self):
+        response = self.client.post('/api/uploads/', {
+            'event': self.event.pk, 'privacy': 'PUBLIC', 'filename': 'photo.jpg', 'size': len(self.content),
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        return UploadSession.objects.get(pk=response.data['id'])
+
+    def put_chunk(self, session, offset, data):
+        return self.client.put(
+            f'/api/uploads/{session.pk}/chunk/?offset={offset}', data,
+            content_type='application/octet-stream',
+        )
+
+    def test_chunked_upload_resumes_and_finalizes(self):
+        session = self.start()
+        chunks = [self.content[start:start + 1000] for start in range(0, len(self.content), 1000)]
+        checksum, offset = b'', 0
+
+        for chunk in chunks[:2]:
+            response = self.put_chunk(session, offset, chunk)
+            self.assertEqual(response.status_code, 200, response.data)
+            offset += len(chunk)
+            checksum = hashlib.sha256(checksum + chunk).digest()
+            self.assertEqual(response.data, {'received': offset, 'checksum': checksum.hex()})
+
+        # A resent chunk, or one from the future, is refused.
+        for wrong in (0, offset + 1000):
+            response = self.put_chunk(session, wrong, chunks[2])
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.data['received'], offset)
+
+        # The connection drops halfway through a chunk: nothing of it is kept.
+        session.refresh_from_db()
+        self.assertEqual(uploads.append_chunk(session, io.BytesIO(chunks[2][:300]), len(chunks[2])), 0)
+        self.assertEqual(os.path.getsize(session.path), offset)
+        self.assertEqual(self.client.get(f'/api/uploads/{session.pk}/').data['received'], offset)
+
+        response = self.client.post(f'/api/uploads/{session.pk}/finalize/')
+        self.assertEqual(response.status_code, 409)
+
+        for chunk in chunks[2:]:
+            self.assertEqual(self.put_chunk(session, offset, chunk).status_code, 200)
+            offset += len(chunk)
+            checksum = hashlib.sha256(checksum + chunk).digest()
+
+        response = self.client.post(f'/api/uploads/{session.pk}/finalize/', {'checksum': '0' * 64})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['checksum'], checksum.hex())
+        self.assertTrue(os.path.exists(session.path))
+
+        response = self.client.post(f'/api/uploads/{session.pk}/finalize/', {'checksum': checksum.hex()})
+        self.assertEqual(response.status_code, 201, response.data)
+        image = Image.objects.get(pk=response.data['id'])
+        with image.original_image.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(os.path.exists(session.path))
+        self.assertFalse(UploadSession.objects.filter(pk=session.pk).exists())
+
+    def test_chunk_past_the_declared_size_is_refused(self):
+        session = self.start()
+        response = self.put_chunk(session, 0, self.content + b'x')
+        self.assertEqual(response.status_code, 400)
+
+    def test_stale_sessions_expire(self):
+        stale, fresh = self.start(), self.start()
+        for session in (stale, fresh):
+            self.assertEqual(self.put_chunk(session, 0, self.content[:100]).status_code, 200)
+        UploadSession.objects.filter(pk=stale.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL + 1)
+        )
+
+        self.assertEqual(tasks.expire_upload_sessions(), 1)
+        self.assertFalse(os.path.exists(stale.path))
+        self.assertFalse(UploadSession.objects.filter(pk=stale.pk).exists())
+        self.assertTrue(os.path.exists(fresh.path))
+
+
+class UploadJobDuplicateTests(GalleryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        overrides = override_settings(MEDIA_ROOT=self.media, UPLOAD_JOB_DIR=f'{self.media}/jobs')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        uploads._job_indexes.clear()
+
+    def jpeg(self, name):
+        buffer = io.BytesIO()
+        gradient = PILImage.linear_gradient('L').resize((64, 48)).convert('RGB')
+        gradient.save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_job_builds_the_event_index_once(self):
+        existing, = self.make_images(1, phash=-1)
+        job = uploads.stage_job(self.user, self.event, 'PUBLIC', [self.jpeg(f'{n}.jpg') for n in range(4)])
+
+        with mock.patch('images.tasks.process_image'), \
+                mock.patch.object(duplicates, 'event_index', wraps=duplicates.event_index) as event_index:
+            job_files = [uploads.ingest(job_file) for job_file in job.files.all()]
+
+        self.assertEqual(event_index.call_count, 1)
+        self.assertEqual([job_file.status for job_file in job_files], ['SUCCESS'] * 4)
+        first, *rest = [job_file.image for job_file in job_files]
+        self.assertIsNone(first.duplicate_of_id)
+        self.assertEqual({image.duplicate_of_id for image in rest}, {first.pk})
+        self.assertIn(existing.pk, uploads.job_duplicate_index(job).ids)
+
+    def test_refresh_adds_images_from_other_workers(self):
+        index = duplicates.event_index(self.event.pk)
+        other, = self.make_images(1, phash=42)
+
+        self.assertEqual(duplicates.find_original(index, 42), None)
+        index.refresh()
+        self.assertEqual(duplicates.find_original(index, 42), other.pk)
+
+
+class UploadJobTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('photographer', password='x')
+        cls.user.profile.role = 'PHOTOGRAPHER'
+        cls.user.profile.save()
+        cls.event = Event.objects.create(
+            name='Convocation', start_date=timezone.now(), end_date=timezone.now(), created_by=cls.user,
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        overrides = override_settings(MEDIA_ROOT=media, UPLOAD_JOB_DIR=f'{media}/jobs')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # The chord and its tasks run inline, as with CELERY_TASK_ALWAYS_EAGER.
+        conf = tasks.ingest_upload.app.conf
+        self.addCleanup(setattr, conf, 'task_always_eager', conf.task_always_eager)
+        conf.task_always_eager = True
+        uploads._job_indexes.clear()
+
+    def bulk_upload(self, *files):
+        with mock.patch('images.tasks.process_image'):
+            response = self.client.post('/api/images/bulk_upload/', {
+                'event': self.event.pk, 'privacy': 'PUBLIC', 'images': list(files),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 202, response.data)
+        return response.data['id']
+
+    def job(self, job_id):
+        response = self.client.get(f'/api/upload-jobs/{job_id}/')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_bulk_upload_is_accepted_and_runs_to_done(self):
+        job_id = self.bulk_upload(
+            SimpleUploadedFile('a.jpg', gradient_jpeg(), content_type='image/jpeg'),
+            SimpleUploadedFile('b.jpg', gradient_jpeg(), content_type='image/jpeg'),
+            SimpleUploadedFile('notes.jpg', b'not an image', content_type='image/jpeg'),
+        )
+
+        job = self.job(job_id)
+        self.assertEqual(job['status'], 'DONE')
+        self.assertIsNotNone(job['finished_at'])
+        self.assertEqual((job['progress']['succeeded'], job['progress']['failed']), (2, 1))
+        self.assertEqual([row['status'] for row in job['files']], ['SUCCESS', 'SUCCESS', 'FAILED'])
+        self.assertEqual(Image.objects.filter(event=self.event).count(), 2)
+        self.assertFalse(os.path.exists(os.path.join(settings.UPLOAD_JOB_DIR, job_id)))
+
+        # Other users cannot see the job.
+        self.client.force_authenticate(User.objects.create_user('other', password='x'))
+        self.assertEqual(self.client.get(f'/api/upload-jobs/{job_id}/').status_code, 404)
+
+    def test_errors_outside_ingest_still_close_the_job(self):
+        with mock.patch.object(uploads, 'ingest', side_effect=OSError('disk full')):
+            job_id = self.bulk_upload(SimpleUploadedFile('a.jpg', gradient_jpeg(), content_type='image/jpeg'))
+
+        job = self.job(job_id)
+        self.assertEqual(job['status'], 'DONE')
+        self.assertEqual(job['files'][0]['status'], 'FAILED')
+        self.assertEqual(job['files'][0]['error'], 'disk full')
+
+    def test_abort_fails_pending_files_and_closes_the_job(self):
+        upload = SimpleUploadedFile('a.jpg', gradient_jpeg(), content_type='image/jpeg')
+        job = uploads.stage_job(self.user, self.event, 'PUBLIC', [upload])
+
+        tasks.abort_upload_job(str(job.pk))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'DONE')
+        self.assertEqual(list(job.files.values_list('status', flat=True)), ['FAILED'])
+
+
+class BackfillRenditionsTests(GalleryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        overrides = override_settings(MEDIA_ROOT=self.media)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # --celery fans out through process_image.delay, run inline here.
+        conf = tasks.process_image.app.conf
+        self.addCleanup(setattr, conf, 'task_always_eager', conf.task_always_eager)
+        conf.task_always_eager = True
+        self.checkpoint = os.path.join(self.media, 'backfill.checkpoint')
+
+    def make_originals(self, *contents):
+        images = self.make_images(len(contents))
+        os.makedirs(os.path.join(self.media, 'images/original'))
+        for n, (image, content) in enumerate(zip(images, contents)):
+            with open(os.path.join(self.media, f'images/original/{n}.jpg'), 'wb') as f:
+                f.write(content)
+        return images
+
+    def backfill(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command(
+            'backfill_renditions', '--celery', '--chunk-size=1', f'--checkpoint={self.checkpoint}', *args,
+            stdout=stdout, stderr=stderr,
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def rendered(self):
+        return list(
+            Image.objects.filter(rendition_version=processing.RENDITION_VERSION)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+
+    def test_second_run_resumes_from_the_checkpoint(self):
+        images = self.make_originals(*[gradient_jpeg()] * 3)
+
+        out, _ = self.backfill('--limit=2')
+        self.assertIn('Done: 2 rendered, 0 failed', out)
+        self.assertEqual(self.rendered(), [image.pk for image in images[:2]])
+
+        out, _ = self.backfill()
+        self.assertIn(f'Resuming after image {images[1].pk}', out)
+        self.assertIn('Done: 1 rendered, 0 failed', out)
+        self.assertEqual(self.rendered(), [image.pk for image in images])
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        image = Image.objects.get(pk=images[2].pk)
+        self.assertTrue(image.thumbnail and image.watermarked_image)
+
+    def test_failures_are_reported_and_completed_images_skipped(self):
+        good, broken, other = self.make_originals(gradient_jpeg(), b'not an image', gradient_jpeg())
+
+        out, err = self.backfill()
+        self.assertIn('Done: 2 rendered, 1 failed', out)
+        self.assertIn(f'Image {broken.pk}: ', err)
+        self.assertEqual(self.rendered(), [good.pk, other.pk])
+
+        # Only the image that failed is still stale, so it is the only one retried.
+        with mock.patch.object(tasks.process_image, 'delay', wraps=tasks.process_image.delay) as delay:
+            out, err = self.backfill()
+        self.assertEqual([call.args[0] for call in delay.call_args_list], [broken.pk])
+        self.assertIn('Done: 0 rendered, 1 failed', out)
+
+
+class MapClusterTests(GalleryTestCase):
+    def test_zoom_is_capped_by_the_bbox(self):
+        for n in range(3):
+            self.make_images(1, gps_latitude=29.86 + n / 1000, gps_longitude=77.89 + n / 1000)
+
+        response = self.client.get('/api/images/map/?bbox=-180,-90,180,90&zoom=22')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(response.data['zoom'], 22)
+        self.assertEqual([cluster['count'] for cluster in response.data['clusters']], [3])
@@ -0,0 +1,224 @@
+"""
+Resumable chunked uploads.
+
+A client creates an UploadSession with the file's name and size, PUTs the
+bytes in order as chunks tagged with their offset, and finalizes the
+session once every byte has arrived. Chunks are streamed straight to a
+partial file, never buffered whole, and a dropped connection only loses
+the chunk in flight: the session reports the offset to resume from.
+
+Each chunk also extends a hash chain, checksum = sha256(previous checksum
++ chunk), so the content hash is maintained incrementally across requests
+and processes without re-reading the file. Clients can compute the same
+chain to verify the upload before finalizing.
+
+Bulk uploads are jobs: the request only stages the files under
+UPLOAD_JOB_DIR and returns an UploadJob. A Celery chord then validates and
+ingests every file in parallel (`ingest`) and closes the job, and each
+step pushes a progress event to the uploader's NotificationConsumer group.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import UploadJob, UploadJobFile
+
+READ_SIZE = 64 * 1024
+
+# Jobs whose duplicate index this process keeps between files.
+JOB_INDEX_CACHE_SIZE = 4
+
+_job_indexes = OrderedDict()
+_job_indexes_lock = threading.Lock()
+
+
+class PartialUpload(UploadedFile):
+    """
+    A staged file (a finished UploadSession or an UploadJobFile), exposed
+    like Django's temporary uploads so image validation reads it from disk
+    and FileSystemStorage moves it into place instead of copying it.
+    """
+
+    def __init__(self, upload, file):
+        super().__init__(file, name=upload.filename, size=upload.size)
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def append_chunk(session, stream, length):
+    """
+    Writes `length` bytes from `stream` at session.received. The caller must
+    hold a lock on the session row. Returns the number of bytes stored; a
+    short read (client went away) stores nothing.
+    """
+    os.makedirs(os.path.dirname(session.path), exist_ok=True)
+    digest = hashlib.sha256(bytes.fromhex(session.checksum))
+    written = 0
+
+    with open(session.path, 'r+b' if os.path.exists(session.path) else 'wb') as f:
+        # Drop whatever an interrupted chunk left behind.
+        f.seek(session.received)
+        f.truncate()
+
+        while written < length:
+            block = stream.read(min(READ_SIZE, length - written))
+            if not block:
+                break
+            f.write(block)
+            digest.update(block)
+            written += len(block)
+
+        if written != length:
+            f.truncate(session.received)
+            return 0
+
+    session.received += written
+    session.checksum = digest.hexdigest()
+    session.save(update_fields=['received', 'checksum', 'updated_at'])
+    return written
+
+
+def discard(session):
+    if os.path.exists(session.path):
+        os.remove(session.path)
+    session.delete()
+
+
+def stage_job(user, event, privacy, files, duplicates=''):
+    """Writes the request's files to disk and creates their UploadJob."""
+    job = UploadJob.objects.create(
+        user=user, event=event, privacy=privacy, duplicates=duplicates or ''
+    )
+    directory = os.path.join(settings.UPLOAD_JOB_DIR, str(job.id))
+    os.makedirs(directory, exist_ok=True)
+
+    job_files = []
+    for index, upload in enumerate(files):
+        path = os.path.join(directory, f'{index}.part')
+        if hasattr(upload, 'temporary_file_path'):
+            file_move_safe(upload.temporary_file_path(), path)
+        else:
+            with open(path, 'wb') as f:
+                for chunk in upload.chunks():
+                    f.write(chunk)
+        job_files.append(UploadJobFile(
+            job=job, filename=upload.name[:255], path=path, size=upload.size
+        ))
+
+    UploadJobFile.objects.bulk_create(job_files)
+    return job
+
+
+def job_duplicate_index(job):
+    """
+    The duplicate index of the job's event, built the first time this
+    process ingests a file of the job and only topped up with the images
+    added since for every later file.
+    """
+    from . import duplicates
+
+    with _job_indexes_lock:
+        index = _job_indexes.get(job.pk)
+        if index is None:
+            index = _job_indexes[job.pk] = duplicates.event_index(job.event_id)
+            while len(_job_indexes) > JOB_INDEX_CACHE_SIZE:
+                _job_indexes.popitem(last=False)
+        else:
+            _job_indexes.move_to_end(job.pk)
+            index.refresh()
+        return index
+
+
+def ingest(job_file):
+    """
+    Validates one staged file and creates its Image through
+    ImageUploadSerializer, which queues the processing pipeline.
+    """
+    from .serializers import ImageUploadSerializer
+
+    job = job_file.job
+    data = {'event': job.event_id, 'privacy': job.privacy}
+    if job.duplicates:
+        data['duplicates'] = job.duplicates
+
+    try:
+        with open(job_file.path, 'rb') as f:
+            data['original_image'] = PartialUpload(job_file, f)
+            serializer = ImageUploadSerializer(data=data, context={
+                'user': job.user,
+                'duplicate_indexes': {job.event_id: job_duplicate_index(job)},
+            })
+            if serializer.is_valid():
+                job_file.image = serializer.save()
+                job_file.status = 'SUCCESS'
+            else:
+                job_file.status = 'FAILED'
+                job_file.error = '; '.join(
+                    str(message) for messages in serializer.errors.values() for message in messages
+                )
+    except Exception as e:
+        job_file.status = 'FAILED'
+        job_file.error = str(e)
+
+    if os.path.exists(job_file.path):
+        os.remove(job_file.path)
+
+    job_file.finished_at = timezone.now()
+    job_file.save(update_fields=['status', 'image', 'error', 'finished_at'])
+    return job_file
+
+
+def progress(job):
+    """Counts and throughput for a job, as sent to clients."""
+    totals = job.files.aggregate(
+        total=Count('id'),
+        succeeded=Count('id', filter=Q(status='SUCCESS')),
+        failed=Count('id', filter=Q(status='FAILED')),
+        done_bytes=Sum('size', filter=~Q(status='PENDING')),
+    )
+    end = job.finished_at or timezone.now()
+    elapsed = max((end - job.created_at).total_seconds(), 1e-6)
+    done = totals['succeeded'] + totals['failed']
+
+    return {
+        'job': str(job.id),
+        'status': job.status,
+        'total': totals['total'],
+        'succeeded': totals['succeeded'],
+        'failed': totals['failed'],
+        'elapsed': round(elapsed, 3),
+        'files_per_second': round(done / elapsed, 3),
+        'bytes_per_second': round((totals['done_bytes'] or 0) / elapsed),
+    }
+
+
+def report(job, job_file=None):
+    """Pushes the job's progress to the uploader's websocket group."""
+    payload = progress(job)
+    if job_file is not None:
+        payload['file'] = {
+            'filename': job_file.filename,
+            'status': job_file.status,
+            'image': job_file.image_id,
+            'error': job_file.error,
+        }
+
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            f'user_{job.user_id}',
+            {'type': 'upload_progress', 'progress': payload},
+        )
+    except Exception:
+        # Progress is best effort; the status endpoint has the same data.
+        pass
+    return payload
@@ -1,35 +1,43 @@
+from django.conf import settings
 from django.shortcuts import render
-from django.db.models import F, Q
-from rest_framework import viewsets, permissions, status, filters
+from django.db.models import Q
+from rest_framework import mixins, viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from rest_framework.pagination import PageNumberPagination
-from django.db import models
+from django.db import models, transaction
 from django_filters.rest_framework import DjangoFilterBackend
-from .serializers import ImageSerializer, ImageUploadSerializer
-from .models import Image
+from .serializers import (
+    ImageSerializer, ImageUploadSerializer, UploadJobSerializer, UploadSessionSerializer,
+)
+from .models import Image, UploadJob, UploadSession
 from .permissions import CanUploadImage, CanModifyImage
-from .filters import ImageFilter
-from activities.models import Reaction
+from .filters import ImageFilter, ImageSearchFilter
+from .pagination import ImageCursorPagination
+from . import counters, search, uploads
+from .tasks import start_upload_job
+from activities.reactions import toggle_reaction
+from activities.notifications import notify_user
 from tags.models import Tag, ImageTag, ImageUserTag
 from tags.serializers import TagSerializer
 from django.contrib.auth.models import User
-from images.tasks import auto_tag_image
 
 
 class ImageViewSet(viewsets.ModelViewSet):
     queryset = Image.objects.all()
     serializer_class = ImageSerializer
     parser_classes = [JSONParser, MultiPartParser, FormParser]
-    pagination_class = PageNumberPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = ImageCursorPagination
+    filter_backends = [DjangoFilterBackend, ImageSearchFilter, filters.OrderingFilter]
     filterset_class = ImageFilter
-    search_fields = ['uploaded_by__username', 'event__name']
     ordering_fields = ['uploaded_at', 'like_count', 'view_count'] 
     ordering = ['uploaded_at']
 
+    # Read-only actions that serialize images and benefit from the eager
+    # loading plan. Write actions skip it so they never see stale prefetches.
+    gallery_actions = ['list', 'retrieve', 'my_favorites', 'my_tagged', 'my_uploads', 'search']
+
     def get_queryset(self):
         queryset = super().get_queryset()
         user = self.request.user
@@ -41,6 +49,9 @@ class ImageViewSet(viewsets.ModelViewSet):
         else:
             queryset = queryset.filter(privacy='PUBLIC')
         
+        if self.action in self.gallery_actions:
+            queryset = ImageSerializer.setup_eager_loading(queryset)
+
         return queryset
 
     def get_permissions(self):
@@ -56,11 +67,11 @@ class ImageViewSet(viewsets.ModelViewSet):
 
 
     def retrieve(self, request, *args, **kwargs):
-        from django.db.models import F
         instance = self.get_object()
         if request.query_params.get("count_view") == "1":
-            Image.objects.filter(pk=instance.pk).update(view_count=F('view_count') + 1)
-            instance.refresh_from_db()
+            if not counters.increment(instance.pk, 'view_count'):
+                # Written through to the row, after `instance` was loaded.
+                instance.view_count += 1
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
@@ -68,78 +79,34 @@ class ImageViewSet(viewsets.ModelViewSet):
     def like(self, request, pk=None):
         image = self.get_object()
 
-        existing = Reaction.objects.filter(
-            user=request.user,
-            image=image,
-            reaction_type='LIKE'
-        ).first()
-
-        if existing:
-            existing.delete()
-            image.like_count = F('like_count') - 1
-            image.save(update_fields=['like_count'])
-            image.refresh_from_db()
-            return Response({
-                'liked': False,
-                'like_count': image.like_count
-            })
-        else:
-            Reaction.objects.create(
-                user=request.user,
-                image=image,
-                reaction_type='LIKE'
-            )
-            image.like_count = F('like_count') + 1
-            image.save(update_fields=['like_count'])
-            image.refresh_from_db()
-            try:
-                from activities.notifications import notify_user
-                if image.uploaded_by and image.uploaded_by != request.user:
-                    notify_user(image.uploaded_by, request.user, f"liked your photo", image=image)
-            except Exception:
-                pass
-            return Response({
-                'liked': True,
-                'like_count': image.like_count
-            })
+        with transaction.atomic():
+            liked, like_count = toggle_reaction(request.user, image, 'LIKE')
+            if liked and image.uploaded_by_id and image.uploaded_by_id != request.user.id:
+                notify_user(image.uploaded_by, request.user, f"liked your photo", image=image)
+
+        return Response({
+            'liked': liked,
+            'like_count': like_count
+        })
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def favorite(self, request, pk=None):
         image = self.get_object()
+        favorited, _ = toggle_reaction(request.user, image, 'FAVORITE')
 
-        existing = Reaction.objects.filter(
-            user=request.user,
-            image=image,
-            reaction_type='FAVORITE'
-        ).first()
-
-        if existing:
-            existing.delete()
-            return Response({
-                'favorited': False,
-                'message': 'Removed from favorites'
-            })
-        else:
-            Reaction.objects.create(
-                user=request.user,
-                image=image,
-                reaction_type='FAVORITE'
-            )
-            return Response({
-                'favorited': True,
-                'message': 'Added to favorites'
-            })
+        return Response({
+            'favorited': favorited,
+            'message': 'Added to favorites' if favorited else 'Removed from favorites'
+        })
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_favorites(self, request):
-        favorite_reactions = Reaction.objects.filter(
-            user=request.user,
-            reaction_type='FAVORITE'
-        ).select_related('image')
-        
-        favorited_images = [reaction.image for reaction in favorite_reactions]
-        serializer = self.get_serializer(favorited_images, many=True)
-        return Response(serializer.data)
+        favorited_images = self.queryset.filter(
+            reactions__user=request.user,
+            reactions__reaction_type='FAVORITE'
+        )
+        favorited_images = ImageSerializer.setup_eager_loading(favorited_images)
+        return self.paginated_response(favorited_images)
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_tagged(self, request):
@@ -147,13 +114,23 @@ class ImageViewSet(viewsets.ModelViewSet):
         tagged_images = self.queryset.filter(
             image_user_tags__user=request.user
         ).distinct()
-        serializer = self.get_serializer(tagged_images, many=True)
-        return Response(serializer.data)
+        tagged_images = ImageSerializer.setup_eager_loading(tagged_images)
+        return self.paginated_response(tagged_images)
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_uploads(self, request):
-        my_images = self.queryset.filter(uploaded_by=request.user)
-        serializer = self.get_serializer(my_images, many=True)
+        my_images = ImageSerializer.setup_eager_loading(
+            self.queryset.filter(uploaded_by=request.user)
+        )
+        return self.paginated_response(my_images)
+
+    def paginated_response(self, queryset):
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=['get', 'post'], permission_classes=[IsAuthenticated])
@@ -178,18 +155,12 @@ class ImageViewSet(viewsets.ModelViewSet):
 
             serializer = CommentSerializer(data=request.data)
             if serializer.is_valid():
-                serializer.save(user=request.user, image=image)
-
-                # Notify the image owner about the new comment
-                try:
-                    from activities.notifications import notify_user
-                    if image.uploaded_by and image.uploaded_by != request.user:
-                        # serializer.data doesn't include created comment instance, get last comment
-                        from activities.models import Comment as CommentModel
-                        latest_comment = CommentModel.objects.filter(image=image).order_by('-created_at').first()
-                        notify_user(image.uploaded_by, request.user, f"commented on your photo", image=image, comment=latest_comment)
-                except Exception:
-                    pass
+                with transaction.atomic():
+                    comment = serializer.save(user=request.user, image=image)
+
+                    # Notify the image owner about the new comment
+                    if image.uploaded_by_id and image.uploaded_by_id != request.user.id:
+                        notify_user(image.uploaded_by, request.user, f"commented on your photo", image=image, comment=comment)
 
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -201,6 +172,7 @@ class ImageViewSet(viewsets.ModelViewSet):
         files = request.FILES.getlist('images')
         event_id = request.data.get('event')
         privacy = request.data.get('privacy', 'PUBLIC')
+        duplicates = request.data.get('duplicates')
 
         if not files:
             return Response(
@@ -208,57 +180,128 @@ class ImageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        uploaded_images = []
-        errors = []
-
-        for image_file in files:
-            try:
-                serializer = ImageUploadSerializer(
-                    data={
-                        'original_image': image_file,
-                        'event': event_id,
-                        'privacy': privacy
-                    },
-                    context={'request': request}
-                )
+        from events.models import Event
 
-                if serializer.is_valid():
-                    image_obj = serializer.save()
-                    auto_tag_image.delay(image_obj.id)
-                    uploaded_images.append({
-                        'id': image_obj.id,
-                        'filename': image_file.name,
-                        'status': 'success'
-                    })
-                else:
-                    errors.append({
-                        'filename': image_file.name,
-                        'errors': serializer.errors
-                    })
-
-            except Exception as e:
-                errors.append({
-                    'filename': image_file.name,
-                    'error': str(e)
-                })
+        event = Event.objects.filter(pk=event_id).first() if str(event_id).isdigit() else None
+        if event is None:
+            return Response({'error': 'A valid event is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if privacy not in dict(Image.PRIV_CHOICES):
+            return Response({'error': 'Invalid privacy'}, status=status.HTTP_400_BAD_REQUEST)
+        if duplicates and duplicates not in ('process', 'skip', 'defer'):
+            return Response({'error': 'Invalid duplicates option'}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({
-            'uploaded': len(uploaded_images),
-            'failed': len(errors),
-            'images': uploaded_images,
-            'errors': errors
-        }, status=status.HTTP_201_CREATED if uploaded_images else status.HTTP_400_BAD_REQUEST)
+        # Only stage the files here; validation, EXIF and processing run in
+        # parallel in Celery. Progress arrives over the notifications socket.
+        job = uploads.stage_job(request.user, event, privacy, files, duplicates)
+        start_upload_job(job)
+
+        return Response(
+            UploadJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED
+        )
 
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def download(self, request, pk=None):
         image = self.get_object()
-    
-        image.download_count = F('download_count') + 1
-        image.save(update_fields=['download_count'])
-        
+        counters.increment(image.pk, 'download_count')
+
         from django.shortcuts import redirect
         return redirect(image.original_image.url)
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def map(self, request):
+        from django.core.files.storage import default_storage
+        from . import geo
+
+        bbox = geo.parse_bbox(request.query_params.get('bbox'))
+        if bbox is None:
+            return Response(
+                {'error': 'bbox must be west,south,east,north in degrees'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            zoom = max(0, min(int(request.query_params.get('zoom', 0)), geo.MAX_ZOOM))
+        except ValueError:
+            return Response({'error': 'zoom must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        # Too fine a grid for the box would send every image on its own.
+        zoom = geo.fit_zoom(bbox, zoom)
+
+        images = Image.objects.visible_to(request.user)
+        event_id = request.query_params.get('event')
+        if event_id:
+            images = images.filter(event_id=event_id)
+
+        clusters = geo.clusters(images, bbox, zoom)
+
+        thumbnails = dict(
+            Image.objects.filter(pk__in=[cluster['image'] for cluster in clusters])
+            .values_list('id', 'thumbnail')
+        )
+        for cluster in clusters:
+            thumbnail = thumbnails.get(cluster['image'])
+            cluster['thumbnail'] = (
+                request.build_absolute_uri(default_storage.url(thumbnail)) if thumbnail else None
+            )
+
+        return Response({
+            'zoom': zoom,
+            'cell_size': geo.cell_size(zoom),
+            'clusters': clusters,
+        })
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def similar(self, request, pk=None):
+        from images.ml import embeddings
+
+        image = self.get_object()
+
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 12)), 50))
+        except ValueError:
+            limit = 12
+
+        # Oversample so enough matches survive the privacy filter below.
+        matches = embeddings.similar(image.pk, limit * 4)
+        if matches is None:
+            return Response(
+                {'error': 'This image has not been analysed yet'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        scores = dict(matches)
+        visible = ImageSerializer.setup_eager_loading(
+            self.get_queryset().filter(pk__in=scores)
+        ).in_bulk()
+        similar_images = [visible[image_id] for image_id in scores if image_id in visible][:limit]
+
+        serializer = self.get_serializer(similar_images, many=True)
+        for item, similar_image in zip(serializer.data, similar_images):
+            item['similarity'] = round(scores[similar_image.pk], 4)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '')
+        if not search.terms(query):
+            return Response([])
+
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 50))
+        except ValueError:
+            limit = 20
+
+        queryset = self.get_queryset()
+        event_id = request.query_params.get('event')
+        if event_id:
+            queryset = queryset.filter(event_id=event_id)
+
+        results = search.ranked(queryset, query, limit)
+
+        serializer = self.get_serializer(results, many=True)
+        for item, image in zip(serializer.data, results):
+            item['rank'] = round(image.search_rank, 4)
+        return Response(serializer.data)
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def add_tag(self, request, pk=None):
         image = self.get_object()
@@ -282,14 +325,24 @@ class ImageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        tag, created = Tag.objects.get_or_create(name=tag_name)
-        
-        image_tag, tag_created = ImageTag.objects.get_or_create(
-            image=image,
-            tag=tag,
-            defaults={'added_by': request.user}
-        )
-        
+        with transaction.atomic():
+            tag, created = Tag.objects.get_or_create(name=tag_name)
+
+            image_tag, tag_created = ImageTag.objects.get_or_create(
+                image=image,
+                tag=tag,
+                defaults={'added_by': request.user}
+            )
+            if not tag_created and image_tag.source == 'AUTO':
+                # Confirmed by a person, so the next re-tag keeps it.
+                image_tag.source = 'MANUAL'
+                image_tag.added_by = request.user
+                image_tag.save(update_fields=['source', 'added_by'])
+
+            # Notify uploader that a tag was added
+            if tag_created and image.uploaded_by_id and image.uploaded_by_id != request.user.id:
+                notify_user(image.uploaded_by, request.user, f"tagged the photo with '{tag.name}'", image=image)
+
         if not tag_created:
             return Response(
                 {'message': 'Tag already exists on this image'},
@@ -297,13 +350,6 @@ class ImageViewSet(viewsets.ModelViewSet):
             )
         
         serializer = self.get_serializer(image)
-        # Notify uploader that a tag was added
-        try:
-            from activities.notifications import notify_user
-            if image.uploaded_by and image.uploaded_by != request.user:
-                notify_user(image.uploaded_by, request.user, f"tagged the photo with '{tag.name}'", image=image)
-        except Exception:
-            pass
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     @action(detail=True, methods=['delete'], permission_classes=[IsAuthenticated])
@@ -364,24 +410,21 @@ class ImageViewSet(viewsets.ModelViewSet):
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        image_user_tag, created = ImageUserTag.objects.get_or_create(
-            image=image,
-            user=target_user,
-            defaults={'added_by': request.user}
-        )
+        with transaction.atomic():
+            image_user_tag, created = ImageUserTag.objects.get_or_create(
+                image=image,
+                user=target_user,
+                defaults={'added_by': request.user}
+            )
+
+            # Notify the tagged user
+            if created and target_user != request.user:
+                notify_user(target_user, request.user, f"tagged you in a photo", image=image)
 
         if not created:
             return Response({'message': 'User already tagged on this image'}, status=status.HTTP_200_OK)
 
         serializer = self.get_serializer(image)
-        # Notify the tagged user
-        try:
-            from activities.notifications import notify_user
-            if target_user != request.user:
-                notify_user(target_user, request.user, f"tagged you in a photo", image=image)
-        except Exception:
-            pass
-
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['delete'], permission_classes=[IsAuthenticated])
@@ -411,3 +454,111 @@ class ImageViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_200_OK)
         except ImageUserTag.DoesNotExist:
             return Response({'error': 'User not tagged on this image'}, status=status.HTTP_404_NOT_FOUND)
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable uploads: POST to create a session, PUT each chunk to
+    `chunk/?offset=N`, GET the session to find where to resume, then POST
+    `finalize/`. See images.uploads.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated, CanUploadImage]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
+
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        session = self.get_object()
+
+        try:
+            offset = int(request.query_params['offset'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'offset and Content-Length are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if length <= 0 or length > settings.UPLOAD_CHUNK_MAX_SIZE:
+            return Response(
+                {'error': f'Chunks must be 1 to {settings.UPLOAD_CHUNK_MAX_SIZE} bytes'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(pk=session.pk)
+
+            if offset != session.received:
+                return Response(
+                    {'error': 'Unexpected offset', 'received': session.received},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if offset + length > session.size:
+                return Response(
+                    {'error': 'Chunk extends past the declared size'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if not uploads.append_chunk(session, request.stream, length):
+                return Response(
+                    {'error': 'Incomplete chunk', 'received': session.received},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        return Response({'received': session.received, 'checksum': session.checksum})
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        session = self.get_object()
+
+        if session.received != session.size:
+            return Response(
+                {'error': 'Upload is incomplete', 'received': session.received},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        checksum = request.data.get('checksum')
+        if checksum and checksum != session.checksum:
+            return Response(
+                {'error': 'Checksum mismatch', 'checksum': session.checksum},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        data = {'event': session.event_id, 'privacy': session.privacy}
+        if request.data.get('duplicates'):
+            data['duplicates'] = request.data['duplicates']
+
+        with open(session.path, 'rb') as f:
+            data['original_image'] = uploads.PartialUpload(session, f)
+            serializer = ImageUploadSerializer(data=data, context={'request': request})
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            serializer.save()
+
+        uploads.discard(session)
+        return Response(
+            dict(serializer.data, checksum=session.checksum),
+            status=status.HTTP_201_CREATED
+        )
+
+
+class UploadJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status of the caller's bulk upload jobs, with per-file results."""
+    serializer_class = UploadJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadJob.objects.filter(user=self.request.user).order_by('-created_at')
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        return Response(UploadJobSerializer(job, context={'include_files': True}).data)
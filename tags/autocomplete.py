@@ -0,0 +1,137 @@
+"""
+In-memory prefix index for tag autocomplete.
+
+Every tag is indexed under its full lowercased name and under each later
+word ("new york" also under "york"), in one sorted list of keys. A prefix
+lookup is two bisections into that list plus a top-N by usage count over
+the matching range. One- and two-letter prefixes, whose ranges are the
+widest, have their top MAX_LIMIT tags precomputed.
+
+Each process builds its own index with the usage count of every tag and
+rebuilds it every TAG_AUTOCOMPLETE_TTL seconds. New tags are inserted
+as they are created in this process, and tags created elsewhere are pulled
+in at most TAG_AUTOCOMPLETE_POLL seconds later from rows above the build's
+high-water mark.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Tag
+
+# Prefixes up to this length have their results precomputed.
+SHORT_PREFIX = 2
+
+# Most results a lookup returns.
+MAX_LIMIT = 25
+
+_WORD_START = re.compile(r'(?<=[\s\-_/])\w')
+
+_lock = threading.Lock()
+_index = None
+
+
+def _keys(name):
+    name = name.lower()
+    yield name
+    for match in _WORD_START.finditer(name):
+        yield name[match.start():]
+
+
+class PrefixIndex:
+    def __init__(self, rows):
+        """`rows` are (tag id, name, usage count)."""
+        self.tags = {}
+        entries = []
+        for tag_id, name, count in rows:
+            self.tags[tag_id] = [name, count]
+            entries.extend((key, tag_id) for key in _keys(name))
+        entries.sort()
+
+        self.keys = [key for key, _ in entries]
+        self.tag_ids = [tag_id for _, tag_id in entries]
+        self.watermark = max(self.tags, default=0)
+        self.built_at = self.polled_at = time.monotonic()
+
+        short = {}
+        for key, tag_id in entries:
+            for length in range(1, min(len(key), SHORT_PREFIX) + 1):
+                short.setdefault(key[:length], set()).add(tag_id)
+        self._short = {
+            prefix: heapq.nsmallest(MAX_LIMIT, tag_ids, key=self._rank)
+            for prefix, tag_ids in short.items()
+        }
+
+    def _rank(self, tag_id):
+        name, count = self.tags[tag_id]
+        return -count, name
+
+    @classmethod
+    def build(cls):
+        return cls(Tag.objects.order_by().values_list('pk', 'name', 'usage_count'))
+
+    def add(self, tag_id, name, count=0):
+        if tag_id in self.tags:
+            return
+        self.tags[tag_id] = [name, count]
+        for key in _keys(name):
+            position = bisect.bisect_left(self.keys, key)
+            self.keys.insert(position, key)
+            self.tag_ids.insert(position, tag_id)
+            for length in range(1, min(len(key), SHORT_PREFIX) + 1):
+                top = self._short.setdefault(key[:length], [])
+                if tag_id not in top:
+                    top.append(tag_id)
+                    top.sort(key=self._rank)
+                    del top[MAX_LIMIT:]
+
+    def lookup(self, prefix, limit):
+        """Up to `limit` (tag id, name, usage count) starting with `prefix`, most used first."""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+
+        limit = min(limit, MAX_LIMIT)
+
+        if len(prefix) <= SHORT_PREFIX:
+            top = self._short.get(prefix, [])[:limit]
+        else:
+            start = bisect.bisect_left(self.keys, prefix)
+            end = bisect.bisect_left(self.keys, prefix + '\uffff', start)
+            top = heapq.nsmallest(limit, set(self.tag_ids[start:end]), key=self._rank)
+
+        return [(tag_id, *self.tags[tag_id]) for tag_id in top]
+
+
+def get_index():
+    """The process-wide PrefixIndex, rebuilt or topped up as configured."""
+    global _index
+    with _lock:
+        now = time.monotonic()
+        if _index is None or now - _index.built_at > settings.TAG_AUTOCOMPLETE_TTL:
+            _index = PrefixIndex.build()
+        elif now - _index.polled_at > settings.TAG_AUTOCOMPLETE_POLL:
+            # The watermark only moves here: a tag added locally may have a
+            # higher id than one another process has not committed yet.
+            for tag_id, name in Tag.objects.filter(pk__gt=_index.watermark).order_by('pk').values_list('pk', 'name'):
+                _index.add(tag_id, name)
+                _index.watermark = tag_id
+            _index.polled_at = now
+        return _index
+
+
+def lookup(prefix, limit=10):
+    index = get_index()
+    with _lock:
+        return index.lookup(prefix, limit)
+
+
+def tag_created(tag):
+    """Adds a tag created in this process without waiting for the next poll."""
+    with _lock:
+        if _index is not None:
+            _index.add(tag.pk, tag.name)
@@ -0,0 +1,135 @@
+"""
+Tag usage counts and the popular-tags leaderboard.
+
+Tag.usage_count is adjusted by `record` in the same transaction that adds
+or removes ImageTag rows: per row by the signals in tags.signals, and per
+batch by ImageTagQuerySet.bulk_create, which sends no signals.
+
+Once that transaction commits, the same deltas are applied with ZINCRBY
+to Redis sorted sets: one for all tags and one per event. A top-N read is
+then a single ZREVRANGE. A sorted set is seeded from the database the
+first time it is read, and again TAG_LEADERBOARD_TTL seconds later, which
+bounds any drift from deltas that raced a seed. While Redis is
+unreachable, reads go to the database instead.
+"""
+import logging
+from collections import Counter
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from images.models import Image
+from .models import ImageTag, Tag
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_KEY = 'tag_leaderboard:global'
+EVENT_KEY = 'tag_leaderboard:event:{}'
+
+# Deltas only apply to leaderboards that have been seeded; an unseeded one
+# is rebuilt from the database on its next read.
+_APPLY_DELTAS = """
+if redis.call('exists', KEYS[2]) == 1 then
+    for i = 1, #ARGV, 2 do
+        redis.call('zincrby', KEYS[1], ARGV[i + 1], ARGV[i])
+    end
+end
+"""
+
+_client = None
+_apply_deltas = None
+
+
+def get_client():
+    global _client, _apply_deltas
+    if _client is None:
+        _client = redis.Redis.from_url(settings.TAG_LEADERBOARD_REDIS_URL)
+        _apply_deltas = _client.register_script(_APPLY_DELTAS)
+    return _client
+
+
+def _key(event_id):
+    return GLOBAL_KEY if event_id is None else EVENT_KEY.format(event_id)
+
+
+def record(pairs, sign):
+    """
+    Counts the (image id, tag id) pairs in `pairs` as added (sign=1) or
+    removed (sign=-1). Call it inside the transaction that wrote the rows.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return
+
+    per_tag = Counter(tag_id for _, tag_id in pairs)
+    by_delta = {}
+    for tag_id, count in per_tag.items():
+        by_delta.setdefault(sign * count, []).append(tag_id)
+    for delta, tag_ids in by_delta.items():
+        Tag.objects.filter(pk__in=tag_ids).update(usage_count=Greatest(F('usage_count') + delta, 0))
+
+    events = dict(
+        Image.objects.filter(pk__in={image_id for image_id, _ in pairs}).values_list('pk', 'event_id')
+    )
+    per_event = Counter((events[image_id], tag_id) for image_id, tag_id in pairs if image_id in events)
+
+    transaction.on_commit(lambda: _push(per_tag, per_event, sign))
+
+
+def _push(per_tag, per_event, sign):
+    by_event = {}
+    for (event_id, tag_id), count in per_event.items():
+        by_event.setdefault(event_id, {})[tag_id] = count
+
+    try:
+        get_client()
+        pipe = _client.pipeline(transaction=False)
+        for event_id, counts in [(None, per_tag), *by_event.items()]:
+            key = _key(event_id)
+            args = [value for tag_id, count in counts.items() for value in (tag_id, sign * count)]
+            _apply_deltas(keys=[key, f'{key}:seeded'], args=args, client=pipe)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Tag leaderboard unavailable, deltas dropped: {str(e)}")
+
+
+def _counts_from_db(event_id):
+    if event_id is None:
+        return Tag.objects.filter(usage_count__gt=0).values_list('pk', 'usage_count')
+    return ImageTag.objects.filter(image__event_id=event_id).order_by().values('tag').annotate(
+        n=Count('pk')
+    ).values_list('tag', 'n')
+
+
+def _seed(client, event_id):
+    key = _key(event_id)
+    counts = {tag_id: count for tag_id, count in _counts_from_db(event_id)}
+
+    pipe = client.pipeline()
+    pipe.delete(key)
+    if counts:
+        pipe.zadd(key, counts)
+        pipe.expire(key, settings.TAG_LEADERBOARD_TTL)
+    pipe.set(f'{key}:seeded', 1, ex=settings.TAG_LEADERBOARD_TTL)
+    pipe.execute()
+
+
+def top(limit, event_id=None):
+    """The `limit` most used tags, overall or within one event, as [(tag id, count)]."""
+    try:
+        client = get_client()
+        key = _key(event_id)
+        if not client.exists(f'{key}:seeded'):
+            _seed(client, event_id)
+        rows = client.zrevrange(key, 0, limit - 1, withscores=True)
+        return [(int(tag_id), int(count)) for tag_id, count in rows if count > 0]
+    except redis.RedisError as e:
+        logger.warning(f"Tag leaderboard unavailable, reading from the database: {str(e)}")
+
+    if event_id is None:
+        rows = Tag.objects.filter(usage_count__gt=0).order_by('-usage_count', 'id')
+        return list(rows.values_list('pk', 'usage_count')[:limit])
+    return list(_counts_from_db(event_id).order_by('-n', 'tag')[:limit])
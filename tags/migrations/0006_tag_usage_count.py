@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 00:42
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_usage(apps, schema_editor):
+    Tag = apps.get_model('tags', 'Tag')
+    ImageTag = apps.get_model('tags', 'ImageTag')
+    counts = ImageTag.objects.filter(
+        tag=models.OuterRef('pk')
+    ).order_by().values('tag').annotate(c=models.Count('pk')).values('c')
+    Tag.objects.update(usage_count=Coalesce(models.Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tags', '0005_tag_name_lower_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-usage_count', 'id'], name='tag_usage_idx'),
+        ),
+        migrations.RunPython(count_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+def mark_auto_tags(apps, schema_editor):
+    # The auto-tagger used to be recognised by a NULL added_by. Tags whose
+    # author has since been deleted look the same and are marked too.
+    ImageTag = apps.get_model('tags', 'ImageTag')
+    ImageTag.objects.filter(added_by__isnull=True).update(source='AUTO')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tags', '0006_tag_usage_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagetag',
+            name='source',
+            field=models.CharField(choices=[('MANUAL', 'Manual'), ('AUTO', 'Auto-tagger')], default='MANUAL', max_length=10),
+        ),
+        migrations.RunPython(mark_auto_tags, migrations.RunPython.noop),
+    ]
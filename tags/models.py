@@ -1,21 +1,147 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
 
+
+class TagQuerySet(models.QuerySet):
+    def with_image_count(self):
+        # Denormalized; see Tag.usage_count.
+        return self.annotate(image_count=models.F('usage_count'))
+
+    def resolve(self, names):
+        """Returns {name: Tag} for `names`, creating missing tags in bulk."""
+        names = set(names)
+        tags = {tag.name: tag for tag in self.filter(name__in=names)}
+
+        missing = names - tags.keys()
+        if missing:
+            self.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+            tags.update((tag.name, tag) for tag in self.filter(name__in=missing))
+
+        return tags
+
+    def ids_by_name(self, names):
+        """
+        Returns {name: [tag ids]} for the lowercased `names` that match a tag
+        case-insensitively, through the lowercase name index.
+        """
+        ids = {}
+        rows = self.annotate(normalized=Lower('name')).filter(
+            normalized__in=set(names)
+        ).values_list('normalized', 'pk')
+        for name, pk in rows:
+            ids.setdefault(name, []).append(pk)
+        return ids
+
+
+class ImageTagQuerySet(models.QuerySet):
+    def images_with_all(self, tag_groups):
+        """
+        Image ids tagged with at least one tag from every group in
+        `tag_groups` (lists of tag ids), as one GROUP BY ... HAVING COUNT
+        subquery instead of a join per group.
+        """
+        tag_groups = [list(group) for group in tag_groups]
+        tag_ids = [pk for group in tag_groups for pk in group]
+
+        if all(len(group) == 1 for group in tag_groups):
+            # (image, tag) is unique, so each matching row is a distinct tag.
+            matched = models.Count('tag')
+        else:
+            # Several tags share a name up to case; count groups, not tags.
+            matched = models.Count(
+                models.Case(*(
+                    models.When(tag_id__in=group, then=models.Value(index))
+                    for index, group in enumerate(tag_groups)
+                )),
+                distinct=True,
+            )
+
+        return self.filter(tag_id__in=tag_ids).order_by().values('image').annotate(
+            matched=matched
+        ).filter(matched=len(tag_groups)).values('image')
+
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False, **kwargs):
+        # bulk_create sends no post_save, so usage counts are adjusted here
+        # for the rows that are actually inserted.
+        from .leaderboard import record
+
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            if ignore_conflicts:
+                inserted = self._insert_ignoring_conflicts(objs, batch_size or 500)
+            else:
+                # A conflict raises, so every row is new.
+                objs = super().bulk_create(objs, batch_size=batch_size, **kwargs)
+                inserted = [(obj.image_id, obj.tag_id) for obj in objs]
+            record(inserted, 1)
+        return objs
+
+    def _insert_ignoring_conflicts(self, objs, batch_size):
+        """
+        INSERT ... ON CONFLICT DO NOTHING RETURNING, so the (image id, tag id)
+        pairs that come back are exactly the rows this call inserted, even
+        when a concurrent insert of the same pair wins.
+        """
+        connection = connections[self.db]
+        meta = self.model._meta
+        fields = [field for field in meta.local_concrete_fields if not field.primary_key]
+        quote = connection.ops.quote_name
+
+        columns = ', '.join(quote(field.column) for field in fields)
+        row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+
+        inserted = []
+        with connection.cursor() as cursor:
+            for start in range(0, len(objs), batch_size):
+                batch = objs[start:start + batch_size]
+                params = [
+                    field.get_db_prep_save(field.pre_save(obj, add=True), connection)
+                    for obj in batch
+                    for field in fields
+                ]
+                cursor.execute(
+                    f"INSERT INTO {quote(meta.db_table)} ({columns}) VALUES {', '.join([row] * len(batch))} "
+                    f"ON CONFLICT ({quote('image_id')}, {quote('tag_id')}) DO NOTHING "
+                    f"RETURNING {quote('image_id')}, {quote('tag_id')}",
+                    params,
+                )
+                inserted.extend(cursor.fetchall())
+        return inserted
+
+
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Number of ImageTag rows, kept in step by tags.leaderboard.record.
+    usage_count = models.PositiveIntegerField(default=0)
+
+    objects = TagQuerySet.as_manager()
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(Lower('name'), name='tag_name_lower_idx'),
+            models.Index(fields=['-usage_count', 'id'], name='tag_usage_idx'),
+        ]
     
     def __str__(self):
         return self.name
 
 class ImageTag(models.Model):
+    SOURCE_CHOICES = [
+        ('MANUAL', 'Manual'),
+        ('AUTO', 'Auto-tagger'),
+    ]
+
     image = models.ForeignKey('images.Image', on_delete=models.CASCADE, related_name='image_tags')
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='image_tags')
     added_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     added_at = models.DateTimeField(auto_now_add=True)
+    # AUTO rows belong to the auto-tagger and are replaced on every re-tag.
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='MANUAL')
+
+    objects = ImageTagQuerySet.as_manager()
     
     class Meta:
         unique_together = ('image', 'tag')
@@ -21,7 +21,9 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'created_at', 'image_count']
     
     def get_image_count(self, obj):
-        return obj.images.count()
+        if hasattr(obj, 'image_count'):
+            return obj.image_count
+        return obj.usage_count
 
 class ImageTagSerializer(serializers.ModelSerializer):
     tag = TagSerializer(read_only=True)
@@ -0,0 +1,23 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import autocomplete, leaderboard
+from .models import ImageTag, Tag
+
+
+@receiver(post_save, sender=Tag)
+def index_new_tag(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: autocomplete.tag_created(instance))
+
+
+@receiver(post_save, sender=ImageTag)
+def count_added_tag(sender, instance, created, **kwargs):
+    if created:
+        leaderboard.record([(instance.image_id, instance.tag_id)], 1)
+
+
+@receiver(post_delete, sender=ImageTag)
+def count_removed_tag(sender, instance, **kwargs):
+    leaderboard.record([(instance.image_id, instance.tag_id)], -1)
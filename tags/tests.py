@@ -1,3 +1,253 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from django.utils import timezone
+
+from events.models import Event
+from images.models import Image
+from images.tests import FakeRedis
+from . import autocomplete, leaderboard
+from .models import ImageTag, Tag
+
+
+class UsageCountMixin:
+    def make_images(self, count):
+        owner = User.objects.create_user('owner', password='x')
+        event = Event.objects.create(
+            name='Convocation', start_date=timezone.now(), end_date=timezone.now(), created_by=owner,
+        )
+        return [
+            Image.objects.create(event=event, original_image=f'images/original/{n}.jpg')
+            for n in range(count)
+        ]
+
+    def assertUsageCountsExact(self):
+        for tag in Tag.objects.all():
+            self.assertEqual(tag.usage_count, ImageTag.objects.filter(tag=tag).count(), tag.name)
+
+
+class BulkCreateUsageCountTests(UsageCountMixin, TestCase):
+    def test_counts_only_inserted_rows(self):
+        images = self.make_images(3)
+        tag = Tag.objects.create(name='sunset')
+        ImageTag.objects.create(image=images[0], tag=tag)
+
+        ImageTag.objects.bulk_create(
+            [ImageTag(image=image, tag=tag) for image in images + images],
+            ignore_conflicts=True,
+        )
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.usage_count, 3)
+        self.assertUsageCountsExact()
+
+    def test_counts_without_ignore_conflicts(self):
+        images = self.make_images(2)
+        tag = Tag.objects.create(name='stage')
+
+        ImageTag.objects.bulk_create([ImageTag(image=image, tag=tag) for image in images])
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.usage_count, 2)
+
+
+class ConcurrentBulkCreateTests(UsageCountMixin, TransactionTestCase):
+    callers = 6
+
+    def test_racing_inserts_of_the_same_pairs_count_once(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("SQLite's shared in-memory test database rejects concurrent writers")
+
+        images = self.make_images(4)
+        tags = [Tag.objects.create(name=name) for name in ('sunset', 'stage')]
+        start = threading.Barrier(self.callers)
+        errors = []
+
+        def insert():
+            try:
+                start.wait()
+                ImageTag.objects.bulk_create(
+                    [ImageTag(image=image, tag=tag) for image in images for tag in tags],
+                    ignore_conflicts=True,
+                )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=insert) for _ in range(self.callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(ImageTag.objects.count(), 8)
+        self.assertUsageCountsExact()
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', password='x')
+        for name, count in (
+            ('sunset', 40), ('sunrise', 90), ('sun', 5), ('summer', 60),
+            ('new york', 70), ('stage', 100),
+        ):
+            Tag.objects.create(name=name, usage_count=count)
+
+    def setUp(self):
+        autocomplete._index = None
+        self.addCleanup(setattr, autocomplete, '_index', None)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def names(self, query, limit=None):
+        params = {'q': query} if limit is None else {'q': query, 'limit': limit}
+        response = self.client.get('/api/tags/autocomplete/', params)
+        self.assertEqual(response.status_code, 200)
+        return [tag['name'] for tag in response.data]
+
+    def test_prefixes_rank_by_usage(self):
+        # One- and two-letter prefixes come from the precomputed lists.
+        self.assertEqual(self.names('s'), ['stage', 'sunrise', 'summer', 'sunset', 'sun'])
+        self.assertEqual(self.names('Su'), ['sunrise', 'summer', 'sunset', 'sun'])
+        self.assertEqual(self.names('sun'), ['sunrise', 'sunset', 'sun'])
+        self.assertEqual(self.names('suns'), ['sunset'])
+        # Later words of a name are keys too.
+        self.assertEqual(self.names('yo'), ['new york'])
+        self.assertEqual(self.names(''), [])
+
+    def test_limit_is_clamped(self):
+        for n in range(autocomplete.MAX_LIMIT + 5):
+            Tag.objects.create(name=f'tag{n:02}', usage_count=n)
+
+        self.assertEqual(len(self.names('ta', limit=1000)), autocomplete.MAX_LIMIT)
+        self.assertEqual(len(self.names('tag', limit=1000)), autocomplete.MAX_LIMIT)
+        self.assertEqual(self.names('tag', limit=0), ['tag29'])
+        self.assertEqual(len(self.names('tag', limit='many')), 10)
+
+    def test_new_tags_show_up_without_a_rebuild(self):
+        self.assertEqual(self.names('sunb'), [])
+        index = autocomplete.get_index()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(name='sunburst')
+
+        self.assertIs(autocomplete.get_index(), index)
+        self.assertEqual(self.names('sunb'), ['sunburst'])
+        self.assertIn(tag.pk, [tag_id for tag_id, _, _ in autocomplete.lookup('su', 10)])
+
+
+class FakeLeaderboardRedis(FakeRedis):
+    """FakeRedis plus the sorted set commands and script tags.leaderboard uses."""
+
+    def exists(self, key):
+        return int(self._key(key) in self.data)
+
+    def set(self, key, value, ex=None):
+        self.data[self._key(key)] = value
+
+    def expire(self, key, seconds):
+        pass
+
+    def zadd(self, key, mapping):
+        scores = self.data.setdefault(self._key(key), {})
+        scores.update((self._key(str(member)), float(score)) for member, score in mapping.items())
+
+    def zincrby(self, key, amount, member):
+        scores = self.data.setdefault(self._key(key), {})
+        member = self._key(str(member))
+        scores[member] = scores.get(member, 0.0) + amount
+        return scores[member]
+
+    def zrevrange(self, key, start, end, withscores=False):
+        # Ties come in reverse member order, as from Redis.
+        rows = sorted(self.data.get(self._key(key), {}).items(), key=lambda row: (row[1], row[0]), reverse=True)
+        rows = rows[start:end + 1]
+        return rows if withscores else [member for member, _ in rows]
+
+    def apply_deltas(self, keys, args):
+        """leaderboard._APPLY_DELTAS."""
+        key, seeded = keys
+        if self.exists(seeded):
+            for member, amount in zip(args[::2], args[1::2]):
+                self.zincrby(key, amount, member)
+
+    def register_script(self, script):
+        return lambda keys, args, client=None: (client or self).apply_deltas(keys, args)
+
+
+class PopularTagsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', password='x')
+        cls.events = [
+            Event.objects.create(
+                name=name, start_date=timezone.now(), end_date=timezone.now(), created_by=cls.user,
+            )
+            for name in ('Convocation', 'Fest')
+        ]
+        cls.images = {
+            f'{prefix}{n}': Image.objects.create(event=event, original_image=f'images/original/{prefix}{n}.jpg')
+            for prefix, event in zip('ab', cls.events)
+            for n in range(3)
+        }
+        cls.tags = {name: Tag.objects.create(name=name) for name in ('sunset', 'stage', 'crowd')}
+        # Overall sunset leads; within the first event, stage does.
+        for name, images in (
+            ('sunset', ('a0', 'b0', 'b1', 'b2')),
+            ('stage', ('a0', 'a1', 'a2')),
+            ('crowd', ('b0',)),
+        ):
+            for image in images:
+                ImageTag.objects.create(image=cls.images[image], tag=cls.tags[name])
+
+    def setUp(self):
+        self.redis = FakeLeaderboardRedis()
+        for name, value in (('_client', self.redis), ('_apply_deltas', self.redis.register_script(None))):
+            patcher = mock.patch.object(leaderboard, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def popular(self, **params):
+        response = self.client.get('/api/tags/popular/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(tag['name'], tag['image_count']) for tag in response.data]
+
+    def test_popular_overall_and_per_event(self):
+        self.assertEqual(self.popular(), [('sunset', 4), ('stage', 3), ('crowd', 1)])
+        self.assertEqual(self.popular(limit=1), [('sunset', 4)])
+        self.assertEqual(self.popular(event=self.events[0].pk), [('stage', 3), ('sunset', 1)])
+        self.assertEqual(self.popular(event=self.events[1].pk), [('sunset', 3), ('crowd', 1)])
+
+        response = self.client.get('/api/tags/popular/', {'event': 'fest'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_popular_reads_the_database_while_redis_is_down(self):
+        with mock.patch.object(self.redis, 'exists', side_effect=leaderboard.redis.ConnectionError):
+            self.assertEqual(self.popular(), [('sunset', 4), ('stage', 3), ('crowd', 1)])
+            self.assertEqual(self.popular(event=self.events[0].pk), [('stage', 3), ('sunset', 1)])
+
+    def test_removing_a_tag_lowers_both_counts(self):
+        event = self.events[0].pk
+        self.assertEqual(leaderboard.top(3)[0], (self.tags['sunset'].pk, 4))
+        self.assertEqual(leaderboard.top(3, event)[0], (self.tags['stage'].pk, 3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ImageTag.objects.get(tag=self.tags['stage'], image=self.images['a0']).delete()
+            ImageTag.objects.get(tag=self.tags['sunset'], image=self.images['b0']).delete()
+
+        self.assertEqual(Tag.objects.get(name='stage').usage_count, 2)
+        self.assertEqual(Tag.objects.get(name='sunset').usage_count, 3)
+        # Read from the seeded sorted sets, not re-seeded from the database.
+        self.assertTrue(self.redis.exists(f'{leaderboard.GLOBAL_KEY}:seeded'))
+        self.assertEqual(self.popular(), [('sunset', 3), ('stage', 2), ('crowd', 1)])
+        self.assertEqual(self.popular(event=event), [('stage', 2), ('sunset', 1)])
+        self.assertEqual(self.popular(event=self.events[1].pk), [('sunset', 2), ('crowd', 1)])
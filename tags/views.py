@@ -1,6 +1,7 @@
-from rest_framework import viewsets, permissions
+from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from . import autocomplete, leaderboard
 from .models import Tag, ImageTag
 from .serializers import TagSerializer
 
@@ -11,11 +12,27 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['get'])
     def popular(self, request):
-        from django.db.models import Count
-        
-        popular_tags = Tag.objects.annotate(
-            usage_count=Count('images')
-        ).order_by('-usage_count')[:20]
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+        except ValueError:
+            limit = 20
+
+        event_id = request.query_params.get('event')
+        if event_id:
+            try:
+                event_id = int(event_id)
+            except ValueError:
+                return Response({'error': 'event must be an id'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            event_id = None
+
+        ranking = leaderboard.top(limit, event_id)
+        tags = Tag.objects.in_bulk([tag_id for tag_id, _ in ranking])
+        popular_tags = []
+        for tag_id, count in ranking:
+            if tag_id in tags:
+                tags[tag_id].image_count = count
+                popular_tags.append(tags[tag_id])
         
         serializer = self.get_serializer(popular_tags, many=True)
         return Response(serializer.data)
@@ -30,4 +47,17 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
             tags = Tag.objects.all()[:10]
         
         serializer = self.get_serializer(tags, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), autocomplete.MAX_LIMIT))
+        except ValueError:
+            limit = 10
+
+        matches = autocomplete.lookup(request.query_params.get('q', ''), limit)
+        return Response([
+            {'id': tag_id, 'name': name, 'image_count': count}
+            for tag_id, name, count in matches
+        ])
\ No newline at end of file